@@ -0,0 +1,117 @@
+""" Runs the full pipeline (scripts 1-8) for many schools at once without any prompts.
+
+Each school is run in its own work directory (batch/<school name> by default) so the pickles and json files that the
+scripts pass to each other don't collide, and several schools are run in parallel. A school that fails doesn't stop the
+others: its remaining scripts are skipped, and the log of every script is kept in the school's work directory along
+with status.json, which records the outcome of each script. The status of the whole batch is saved to
+batch/batch_status.json.
+
+Usage:
+    python OA_0_BatchDriver.py              Runs every school in MainURLs.xlsx
+    python OA_0_BatchDriver.py 0 3 CSU      Runs the schools with these IDs or names
+
+The checks in scripts 4 and 6 are answered by decision_policy.json in the school's work directory (see
+decisionpolicy.py), and the answers are saved to decision_review.json there for review.
+
+The number of schools run at once defaults to 4 and can be changed with the OA_BATCH_WORKERS environment variable.
+The final dataframes are saved to Output_dataframes/<school name> as usual.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import subprocess
+import json
+import time
+import sys
+import os
+import pandas as pd
+from tabulate import tabulate
+
+scriptdir = os.path.dirname(os.path.abspath(__file__))
+mainurls_path = os.path.join(scriptdir, 'MainURLs.xlsx')
+output_dir = os.path.join(scriptdir, 'Output_dataframes')
+batch_dir = os.environ.get('OA_BATCH_DIR', os.path.join(scriptdir, 'batch'))
+batch_workers = int(os.environ.get('OA_BATCH_WORKERS', 4))
+
+# Scripts in the order they're run (script 6 is run again on the general education tables from script 7)
+stages = ['OA_1_MainSites_Scraper.py', 'OA_2_CourseDescriptIon_Scraper.py', 'OA_3_DegreePage_Scraper.py',
+          'OA_4_CourseDescription_Organizer.py', 'OA_5_CourseDescription_Parser.py', 'OA_6_Degree_Organizer.py',
+          'OA_7_Geneds.py', 'OA_6_Degree_Organizer.py', 'OA_8_Degree_Integrator.py']
+
+
+def save_status(path, status):
+    """Writes a status dictionary to a json file"""
+    with open(path + '.tmp', 'w') as outfile:
+        json.dump(status, outfile, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def run_school(schoolid, schoolname):
+    """Runs every script for one school in its own work directory.
+
+    :param schoolid: The school's ID (its position in MainURLs.xlsx)
+    :param schoolname: The school's name
+    :return: Dictionary with the school's status
+    """
+    workdir = os.path.join(batch_dir, schoolname)
+    os.makedirs(workdir, exist_ok=True)
+    env = dict(os.environ, OA_SCHOOL=str(schoolid), OA_MAINURLS=mainurls_path, OA_OUTPUT_DIR=output_dir)
+    env.setdefault('OA_CACHE_MODE', 'revalidate')
+    env.setdefault('OA_CACHE_DIR', os.path.join(workdir, 'page_cache'))
+    env.setdefault('OA_BROWSERS', str(max(1, (os.cpu_count() or 1) // batch_workers)))
+    if os.path.isfile(os.path.join(workdir, 'decision_review.json')):     # Start a new review of this run's decisions
+        os.remove(os.path.join(workdir, 'decision_review.json'))
+    status = {'id': schoolid, 'school': schoolname, 'status': 'running', 'stages': []}
+    for stagei, script in enumerate(stages):
+        logpath = os.path.join(workdir, str(stagei + 1) + '_' + script[:-3] + '.log')
+        stage = {'script': script, 'log': logpath, 'started': time.time()}
+        status['stages'].append(stage)
+        save_status(os.path.join(workdir, 'status.json'), status)
+        with open(logpath, 'w') as logfile:
+            returncode = subprocess.run([sys.executable, os.path.join(scriptdir, script)], cwd=workdir, env=env,
+                                        stdin=subprocess.DEVNULL, stdout=logfile, stderr=subprocess.STDOUT).returncode
+        stage['seconds'] = round(time.time() - stage['started'], 1)
+        stage['returncode'] = returncode
+        if returncode != 0:
+            status['status'] = 'failed'
+            status['failedscript'] = script
+            break
+    else:
+        status['status'] = 'done'
+    save_status(os.path.join(workdir, 'status.json'), status)
+    return status
+
+
+def select_schools(selection):
+    """Returns a dictionary of the IDs and names of the selected schools (all of them if nothing is selected)"""
+    mainurlsdf = pd.read_excel(mainurls_path)
+    schools = mainurlsdf.loc[::2, 'School'].reset_index(drop=True)
+    if not selection:
+        return schools.to_dict()
+    selected = {}
+    for item in selection:
+        if item.isdigit() and int(item) in schools.index:
+            selected[int(item)] = schools[int(item)]
+        elif item in schools.values:
+            selected[schools[schools.eq(item)].index[0]] = item
+        else:
+            raise Exception(item + ' is not a school ID or name in MainURLs.xlsx')
+    return selected
+
+
+if __name__ == '__main__':
+    schools = select_schools(sys.argv[1:])
+    os.makedirs(batch_dir, exist_ok=True)
+    os.makedirs(output_dir, exist_ok=True)
+    batchstatus = []
+    with ProcessPoolExecutor(max_workers=batch_workers) as executor:
+        futures = {executor.submit(run_school, schoolid, schoolname): schoolname
+                   for schoolid, schoolname in schools.items()}
+        for future, schoolname in futures.items():
+            try:
+                batchstatus.append(future.result())
+            except Exception as e:
+                batchstatus.append({'school': schoolname, 'status': 'failed', 'error': repr(e)})
+    save_status(os.path.join(batch_dir, 'batch_status.json'), batchstatus)
+
+    print(tabulate([[x['school'], x['status'], x.get('failedscript', '')] for x in batchstatus],
+                   headers=['school', 'status', 'failed script']))
@@ -0,0 +1,192 @@
+""" Runs scripts 2, 4 and 5 a batch of departments at a time, so the first courses are parsed within minutes.
+
+Run separately, script 4 can't start until script 2 has scraped every department and script 5 waits for all of script
+4, although each department's courses are organized and parsed independently except for a few school-wide decisions
+(see catalogprofile.py). This driver downloads the course description pages and, every OA_STREAM_BATCH departments (10
+by default), hands the batch's elements to scripts 4 and 5, which run in the batch's own work directory
+(stream/batch_<n>) while the next pages are downloading. Up to OA_STREAM_WORKERS batches (2 by default) are processed at
+once.
+
+The organizing decisions of script 4 are made from the first batch and saved by the driver to the school's profile
+(catalog_profile.json), and every later batch reuses them. Script 5 has to parse every batch with the whole school's
+course code patterns and department codes, so that requisites naming another batch's courses are parsed. When an
+earlier run saved them to the profile, each batch is parsed as soon as it's organized. Otherwise (or when the courses
+don't match the saved ones) they're taken from every organized course once all the batches are organized, saved to the
+profile, and every batch is parsed with them. Either way, the batches are parsed with the same course codes script 5
+finds when it's run on the whole school. The y/n checks of each batch are answered by the school's decision policy (see
+decisionpolicy.py) and recorded in the batch's work directory.
+
+When every batch is done, their outputs are merged into coursedescriptions.pkl, organizedcoursedescriptions.pkl,
+courses.pkl and the course code pattern files, the same files scripts 2, 4 and 5 save, so script 3 and scripts 6-8 are
+run as usual.
+
+Usage (in the school's work directory, after script 1):
+    python OA_0_StreamDriver.py
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import shutil
+import json
+import time
+import sys
+import os
+import pandas as pd
+from crawlmanifest import load_manifest, save_manifest
+from crawljournal import finish_journal
+from coursepage import scrape_pages, courseblocks_dataframe
+from catalogprofile import profile_path, pages_fingerprint, sites_fingerprint, load_profile, save_profile, \
+    partial_decisions, course_code_patterns, department_codes, listed_cdept_pattern
+from decisionpolicy import policy_path
+
+scriptdir = os.path.dirname(os.path.abspath(__file__))
+stream_dir = os.environ.get('OA_STREAM_DIR', 'stream')
+batch_size = int(os.environ.get('OA_STREAM_BATCH', 10))          # Departments per batch
+stream_workers = int(os.environ.get('OA_STREAM_WORKERS', 2))     # Batches processed at once
+
+organizer_script = 'OA_4_CourseDescription_Organizer.py'
+parser_script = 'OA_5_CourseDescription_Parser.py'
+
+
+def page_batches(scraped):
+    """Groups the scraped pages into lists of batch_size (position, rows) tuples"""
+    batch = []
+    for page in scraped:
+        batch.append(page)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def run_script(batchi, script):
+    """Runs script 4 or 5 in a batch's work directory (with the school's profile and decision policy)"""
+    workdir = os.path.abspath(os.path.join(stream_dir, 'batch_' + str(batchi)))
+    env = dict(os.environ, OA_PROFILE=os.path.abspath(profile_path), OA_PARTIAL='1', OA_OUTPUT_DIR=workdir,
+               OA_POLICY=os.path.abspath(policy_path))
+    logpath = os.path.join(workdir, script[:-3] + '.log')
+    with open(logpath, 'w') as logfile:
+        returncode = subprocess.run([sys.executable, os.path.join(scriptdir, script)], cwd=workdir, env=env,
+                                    stdin=subprocess.DEVNULL, stdout=logfile, stderr=subprocess.STDOUT).returncode
+    if returncode != 0:
+        raise Exception('Batch ' + str(batchi) + ' failed in ' + script + ' (see ' + logpath + ')')
+    return workdir
+
+
+def parse_batch(batchi, start):
+    """Parses one organized batch with script 5, using the whole school's course codes saved in the profile.
+
+    :param batchi: The batch's number
+    :param start: Time the driver started
+    :return: Dataframe of the batch's parsed courses (script 5)
+    """
+    coursesdf = pd.read_pickle(os.path.join(run_script(batchi, parser_script), 'courses.pkl'))
+    print('Batch ' + str(batchi) + ': ' + str(len(coursesdf)) + ' courses parsed after ' +
+          str(round(time.time() - start)) + ' s')
+    return coursesdf
+
+
+def run_batch(batchi, blocksdf, firstbatch, parse, start):
+    """Organizes one batch of departments with script 4 in its own work directory, and parses it with script 5 if the
+    whole school's course codes are already in the profile.
+
+    :param batchi: The batch's number
+    :param blocksdf: Course description elements of the batch's departments (the same dataframe script 2 saves)
+    :param firstbatch: Future of the first batch, whose decisions every other batch reuses (None for the first batch)
+    :param parse: Whether to parse the batch too
+    :param start: Time the driver started
+    :return: Dataframes of the batch's organized courses (script 4) and parsed courses (script 5, None if not parsed)
+    """
+    if firstbatch is not None:
+        firstbatch.result()
+    workdir = os.path.abspath(os.path.join(stream_dir, 'batch_' + str(batchi)))
+    if os.path.isdir(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    blocksdf.to_pickle(os.path.join(workdir, 'coursedescriptions.pkl'))
+    shutil.copy('schoolname.json', workdir)
+    shutil.copy('coursedescriptionsites.pkl', workdir)      # Batches reuse the decisions saved for the whole school
+    organizeddf = pd.read_pickle(os.path.join(run_script(batchi, organizer_script), 'organizedcoursedescriptions.pkl'))
+    # Only the first batch's decisions are saved for the whole school (the batches can't write the profile themselves)
+    if firstbatch is None and partial_decisions(workdir, 'organizer'):
+        save_profile('organizer', None, partial_decisions(workdir, 'organizer'),
+                     sites_fingerprint('coursedescriptionsites.pkl'))
+    if not parse:
+        print('Batch ' + str(batchi) + ': ' + str(len(organizeddf)) + ' courses from ' + str(blocksdf.link.nunique()) +
+              ' departments organized after ' + str(round(time.time() - start)) + ' s')
+        return organizeddf, None
+    return organizeddf, parse_batch(batchi, start)
+
+
+if __name__ == '__main__':
+    start = time.time()
+    sitesdf = pd.read_pickle('coursedescriptionsites.pkl')
+    os.makedirs(stream_dir, exist_ok=True)
+
+    # Manifest of the pages scraped in the previous run (only used in incremental mode, see crawlmanifest.py)
+    manifest = load_manifest('coursedescriptions.pkl')
+    previousdf = pd.read_pickle('coursedescriptions.pkl') if manifest else None
+    newmanifest = {}
+
+    # The whole school's course codes saved by an earlier run (batches are only parsed as they arrive with these)
+    sites = sites_fingerprint('coursedescriptionsites.pkl')
+    parserlayout = load_profile('parser', None, sites, partial=True)
+
+    # Extract each page as soon as it's downloaded, and hand every batch_size pages to scripts 4 and 5
+    pages = {}          # Column lists of the rows of each page (by its position in coursedescriptionsites.pkl)
+    futures = []
+    with ThreadPoolExecutor(max_workers=stream_workers) as executor:
+        for batch in page_batches(scrape_pages(sitesdf, manifest, previousdf, newmanifest)):
+            pages.update(batch)
+            blocksdf = courseblocks_dataframe(pagecolumns for _, pagecolumns in batch)
+            if blocksdf.empty:      # Pages without any courses
+                continue
+            futures.append(executor.submit(run_batch, len(futures), blocksdf, futures[0] if futures else None,
+                                           bool(parserlayout), start))
+        results = [future.result() for future in futures]
+    if not results:
+        raise Exception('None of the course description pages contain any courses')
+
+    # Merge the batches into the outputs of scripts 2, 4 and 5
+    courseblocks_df = courseblocks_dataframe(pages[i] for i in sorted(pages))
+    courseblocks_df.to_pickle('coursedescriptions.pkl')
+    save_manifest('coursedescriptions.pkl', newmanifest)
+    finish_journal('coursedescriptions.pkl')
+    organizeddf = pd.concat([x[0] for x in results], ignore_index=True)
+    organizeddf.to_pickle('organizedcoursedescriptions.pkl')
+
+    # Take the course code patterns and department codes from every course, the same ones script 5 finds for the whole
+    # school, and parse every batch again if they weren't the ones in the profile
+    cdept_pattern, cnum_pattern = course_code_patterns(organizeddf)
+    departments = department_codes(organizeddf)
+    parserdecisions = {'cdept_pattern': cdept_pattern, 'cnum_pattern': cnum_pattern, 'departments': departments}
+    save_profile('parser', pages_fingerprint('coursedescriptions.pkl'), parserdecisions, sites)
+    if parserdecisions == parserlayout:
+        coursesdfs = [x[1] for x in results]
+    else:
+        if parserlayout:
+            print('The course codes saved in ' + profile_path + " don't match every course, parsing every batch again")
+        with ThreadPoolExecutor(max_workers=stream_workers) as executor:
+            coursesdfs = list(executor.map(parse_batch, range(len(results)), [start]*len(results)))
+    coursesdf = pd.concat(coursesdfs, ignore_index=True)
+    coursesdf.to_pickle('courses.pkl')
+    with open('schoolname.json') as infile:
+        schoolname = json.load(infile)
+    schooldirectory = os.path.join(os.environ.get('OA_OUTPUT_DIR', 'Output_dataframes'), schoolname)
+    if os.path.isdir(schooldirectory):
+        shutil.rmtree(schooldirectory)
+    os.mkdir(schooldirectory)
+    coursesdf.to_pickle(schooldirectory + '/courses.pkl')
+
+    # Save the ccode patterns for later scripts
+    with open('cnum_pattern.json', 'w') as outfile:
+        json.dump(cnum_pattern, outfile)
+    with open('cdept_pattern.json', 'w') as outfile:
+        json.dump(listed_cdept_pattern(departments, cdept_pattern), outfile)
+
+    parsed = coursesdf['requisites (parsed & unambiguous only)'].ne('')
+    print(str(len(coursesdf)) + ' total courses in ' + str(len(results)) + ' batches (' +
+          str(round(time.time() - start)) + ' s)')
+    print(str(sum(parsed)) + ' with parsed requisites')
+    print(str(sum(coursesdf['requisites (ambiguous)'].ne(''))) + ' requirements are ambiguous')
@@ -0,0 +1,187 @@
+""" Projects how well new schools will parse from a random sample of their pages, without a full crawl.
+
+For each school, script 1 finds the course description and degree pages as usual (using the catalog's sitemap unless
+OA_DISCOVERY is set), and then OA_TRIAGE_PERCENT percent of each (10 by default, at least OA_TRIAGE_MIN_PAGES pages) are
+chosen at random and run through scripts 2-8 in the school's triage work directory (triage/<school name>). The parse
+rates printed at the end of scripts 5 and 8 are projected to the whole school with 95% confidence intervals:
+
+    non-trivial parsed      Courses with non-trivial requisites that were fully parsed (script 5)
+    ambiguous               Courses whose requirements are ambiguous (script 5), projected to the whole school
+    degree reqs parsed      Degree requirements that were parsed (script 8)
+
+Pages are sampled whole, so the intervals treat each department (courses) or degree page (requirements) as one sampled
+unit. The projected runtime scales the time of each script by the share of the pages it was run on (script 1 is
+already run in full). The decisions the scripts make are saved for review like in the batch driver, the dataframes are
+saved to the work directory's Output_dataframes folder and script 8 doesn't push them to the SQL database. The report
+of each school is saved to its triage_report.json and the whole batch's to triage/triage_report.json.
+
+Usage:
+    python OA_0_TriageDriver.py              Triages every school in MainURLs.xlsx
+    python OA_0_TriageDriver.py 0 3 CSU      Triages the schools with these IDs or names
+
+OA_TRIAGE_SEED picks a different sample (0 by default) and OA_BATCH_WORKERS sets the number of schools run at once.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import subprocess
+import time
+import sys
+import os
+import numpy as np
+import pandas as pd
+from tabulate import tabulate
+from OA_0_BatchDriver import scriptdir, mainurls_path, batch_workers, stages, save_status, select_schools
+
+triage_dir = os.environ.get('OA_TRIAGE_DIR', os.path.join(scriptdir, 'triage'))
+triage_percent = float(os.environ.get('OA_TRIAGE_PERCENT', 10))
+triage_min_pages = int(os.environ.get('OA_TRIAGE_MIN_PAGES', 5))
+triage_seed = int(os.environ.get('OA_TRIAGE_SEED', 0))
+
+# The pages that each script's runtime scales with (script 1 isn't sampled)
+scales_with = {'OA_2_CourseDescriptIon_Scraper.py': 'coursedescriptionsites.pkl',
+               'OA_4_CourseDescription_Organizer.py': 'coursedescriptionsites.pkl',
+               'OA_5_CourseDescription_Parser.py': 'coursedescriptionsites.pkl',
+               'OA_3_DegreePage_Scraper.py': 'degreesites.pkl', 'OA_6_Degree_Organizer.py': 'degreesites.pkl',
+               'OA_7_Geneds.py': 'degreesites.pkl', 'OA_8_Degree_Integrator.py': 'degreesites.pkl'}
+
+
+def sample_pages(sites_pickle):
+    """Replaces the pages found by script 1 with a random sample of them (the full list is kept in *_all.pkl).
+
+    :param sites_pickle: Filename of the pickle of pages (coursedescriptionsites.pkl or degreesites.pkl)
+    :return: Fraction of the pages that were sampled
+    """
+    sitesdf = pd.read_pickle(sites_pickle)
+    sitesdf.to_pickle(sites_pickle[:-4] + '_all.pkl')
+    n = min(len(sitesdf), max(triage_min_pages, round(len(sitesdf) * triage_percent / 100)))
+    sitesdf.sample(n=n, random_state=triage_seed).sort_index().to_pickle(sites_pickle)
+    return n / len(sitesdf) if len(sitesdf) else 1
+
+
+def ratio_estimate(x, y, fraction):
+    """Returns the projected percentage sum(y)/sum(x) with its 95% confidence interval, from a sample of clusters.
+
+    The variance is the linearized variance of a ratio estimator under cluster sampling, with the finite population
+    correction for the sampled fraction.
+
+    :param x: Series of the denominator's total in each sampled cluster
+    :param y: Series of the numerator's total in each sampled cluster
+    :param fraction: Fraction of the clusters that were sampled
+    :return: Estimate, lower bound, upper bound (percentages, None if there's nothing to estimate)
+    """
+    if x.sum() == 0:
+        return None, None, None
+    ratio = y.sum() / x.sum()
+    if len(x) < 2:
+        return round(100 * ratio, 1), None, None
+    se = np.sqrt((1 - fraction) * ((y - ratio * x) ** 2).sum() / (len(x) - 1) / len(x)) / x.mean()
+    return round(100 * ratio, 1), round(100 * max(0, ratio - 1.96 * se), 1), round(100 * min(1, ratio + 1.96 * se), 1)
+
+
+def total_estimate(y, fraction):
+    """Returns the projected total of y for the whole school with its 95% confidence interval (see ratio_estimate)"""
+    total = y.sum() / fraction
+    if len(y) < 2:
+        return round(total), None, None
+    se = np.sqrt((1 - fraction) * y.var() / len(y)) * len(y) / fraction
+    return round(total), round(max(y.sum(), total - 1.96 * se)), round(total + 1.96 * se)
+
+
+def project(workdir, fractions, seconds):
+    """Projects the parse rates and runtime of the whole school from the sample's results.
+
+    :param workdir: The school's triage work directory
+    :param fractions: Dictionary of the fraction of each sites pickle's pages that were sampled
+    :param seconds: List of each script's name and runtime in the order they were run
+    :return: Dictionary of projections (estimate, lower bound, upper bound)
+    """
+    report = {'projected seconds': round(sum(s / fractions.get(scales_with.get(script), 1)
+                                             for script, s in seconds))}
+    coursestats_path = os.path.join(workdir, 'courseparsestats.pkl')
+    if os.path.isfile(coursestats_path):
+        clusters = pd.read_pickle(coursestats_path).groupby('dept').sum()
+        fraction = fractions['coursedescriptionsites.pkl']
+        report['non-trivial parsed %'] = ratio_estimate(clusters.nontrivial, clusters.parsed, fraction)
+        report['ambiguous'] = total_estimate(clusters.ambiguous, fraction)
+    degreestats_path = os.path.join(workdir, 'degreeparsestats.pkl')
+    if os.path.isfile(degreestats_path):
+        degreestats = pd.read_pickle(degreestats_path).assign(requirements=1)
+        clusters = degreestats.groupby('link')[['requirements', 'unknown']].sum()
+        report['degree reqs parsed %'] = ratio_estimate(clusters.requirements,
+                                                        clusters.requirements - clusters.unknown,
+                                                        fractions['degreesites.pkl'])
+    return report
+
+
+def triage_school(schoolid, schoolname):
+    """Runs script 1 and then scripts 2-8 on a sample of one school's pages in its triage work directory.
+
+    :param schoolid: The school's ID (its position in MainURLs.xlsx)
+    :param schoolname: The school's name
+    :return: Dictionary with the school's status and projections
+    """
+    workdir = os.path.abspath(os.path.join(triage_dir, schoolname))
+    os.makedirs(os.path.join(workdir, 'Output_dataframes'), exist_ok=True)
+    for stats_pickle in ['courseparsestats.pkl', 'degreeparsestats.pkl']:       # From an earlier triage
+        if os.path.isfile(os.path.join(workdir, stats_pickle)):
+            os.remove(os.path.join(workdir, stats_pickle))
+    env = dict(os.environ, OA_SCHOOL=str(schoolid), OA_MAINURLS=mainurls_path, OA_PUSH_SQL='0',
+               OA_PARSE_STATS='1', OA_OUTPUT_DIR=os.path.join(workdir, 'Output_dataframes'))
+    env.setdefault('OA_DISCOVERY', 'sitemap')
+    env.setdefault('OA_CACHE_MODE', 'revalidate')
+    env.setdefault('OA_CACHE_DIR', os.path.join(workdir, 'page_cache'))
+    env.setdefault('OA_BROWSERS', str(max(1, (os.cpu_count() or 1) // batch_workers)))
+    status = {'id': schoolid, 'school': schoolname, 'status': 'running'}
+    fractions = {}
+    seconds = []
+    for stagei, script in enumerate(stages):
+        logpath = os.path.join(workdir, str(stagei + 1) + '_' + script[:-3] + '.log')
+        started = time.time()
+        with open(logpath, 'w') as logfile:
+            returncode = subprocess.run([sys.executable, os.path.join(scriptdir, script)], cwd=workdir, env=env,
+                                        stdin=subprocess.DEVNULL, stdout=logfile, stderr=subprocess.STDOUT).returncode
+        seconds.append((script, time.time() - started))
+        if returncode != 0:
+            status['status'] = 'failed'
+            status['failedscript'] = script
+            break
+        if stagei == 0:     # Sample the pages script 1 found
+            for sites_pickle in ['coursedescriptionsites.pkl', 'degreesites.pkl']:
+                fractions[sites_pickle] = sample_pages(os.path.join(workdir, sites_pickle))
+            status['sampled'] = {name: round(fraction, 3) for name, fraction in fractions.items()}
+    else:
+        status['status'] = 'done'
+    if fractions:
+        status.update(project(workdir, fractions, seconds))
+    save_status(os.path.join(workdir, 'triage_report.json'), status)
+    return status
+
+
+def interval(projection):
+    """Formats an (estimate, lower bound, upper bound) projection for the printed report"""
+    if projection is None or projection[0] is None:
+        return ''
+    if projection[1] is None:
+        return str(projection[0])
+    return str(projection[0]) + ' (' + str(projection[1]) + '-' + str(projection[2]) + ')'
+
+
+if __name__ == '__main__':
+    schools = select_schools(sys.argv[1:])
+    os.makedirs(triage_dir, exist_ok=True)
+    triagestatus = []
+    with ProcessPoolExecutor(max_workers=batch_workers) as executor:
+        futures = {executor.submit(triage_school, schoolid, schoolname): schoolname
+                   for schoolid, schoolname in schools.items()}
+        for future, schoolname in futures.items():
+            try:
+                triagestatus.append(future.result())
+            except Exception as e:
+                triagestatus.append({'school': schoolname, 'status': 'failed', 'error': repr(e)})
+    save_status(os.path.join(triage_dir, 'triage_report.json'), triagestatus)
+
+    print(tabulate([[x['school'], x['status'], x.get('failedscript', ''), interval(x.get('non-trivial parsed %')),
+                     interval(x.get('ambiguous')), interval(x.get('degree reqs parsed %')),
+                     x.get('projected seconds', '')] for x in triagestatus],
+                   headers=['school', 'status', 'failed script', 'non-trivial parsed %', 'ambiguous',
+                            'degree reqs parsed %', 'projected s']))
@@ -7,42 +7,146 @@ their online catalogs.
 The purpose of this first script is to generate a list of all the possible URLs that contain course descriptions and
 degree requirements.
 
-The script inputs an excel file containing a list of example URLs from each school's catalog. The user is prompted to
-select which school to run the script for. This will generate a dataframe containing the URLs and basic information
-about each individual page (such as school, department, & degree). You may need to change the sleep timer, time.sleep(),
-to up to 5 seconds depending on your internet connection speed.
+The script inputs an excel file containing a list of example URLs from each school's catalog. The school to run the
+script for is given by its ID in the OA_SCHOOL environment variable (e.g. by the batch driver), or else the user is
+prompted to select it. This will generate a dataframe containing the URLs and basic information
+about each individual page (such as school, department, & degree). The directory structure is crawled breadth-first:
+all the pages in a directory level are downloaded concurrently (see pagefetcher.py) and each page's html is parsed
+once to find its links. Alternatively, the pages can be found using the catalog's sitemap (see sitemap.py) without
+downloading any directory pages, in which case each directory is named after its URL instead of its link title.
+
+Every page that is visited is saved to the page cache (see pagecache.py) so later scripts can reuse it.
 
 After running this script, run script 2.
 
-Chrome browser is required as a dependency.
+Pages are downloaded without a browser where possible. Chrome browser is still required as a dependency for catalogs
+whose pages can't be downloaded without one.
 """
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from webdriver_manager.chrome import ChromeDriverManager
-import time
+from pagefetcher import get_page_sources
+from sitemap import get_sitemap_urls
+from sitemap import match_structure
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup as bs
 import pandas as pd
 import unicodedata
+import copy
+import re
 import json
+import os
 from tabulate import tabulate
 
+# Set OA_DISCOVERY=sitemap to find pages using the catalog's sitemap instead of crawling its directories
+discovery = os.environ.get('OA_DISCOVERY', 'crawl')
+if discovery not in ['crawl', 'sitemap']:
+    raise Exception('OA_DISCOVERY must be crawl or sitemap')
+
 # Retrieve URLs
-mainurlsdf = pd.read_excel('MainURLs.xlsx')
+mainurlsdf = pd.read_excel(os.environ.get('OA_MAINURLS', 'MainURLs.xlsx'))
 schools = mainurlsdf.loc[::2, 'School'].reset_index(drop=True)
 schoolsdf = pd.DataFrame(schools)
 schoolsdf.index.name = 'ID'
 
 print(schoolsdf)
-print('Enter the ID for the school you want to scrape:')
-schoolid = None
-while schoolid not in schoolsdf.index:
-    schoolid = int(input())
+if os.environ.get('OA_SCHOOL'):         # Chosen by the batch driver (see OA_0_BatchDriver.py)
+    schoolid = int(os.environ['OA_SCHOOL'])
+    if schoolid not in schoolsdf.index:
+        raise Exception('OA_SCHOOL must be one of the IDs listed above')
+else:
+    print('Enter the ID for the school you want to scrape:')
+    schoolid = None
+    while schoolid not in schoolsdf.index:
+        schoolid = int(input())
 schoolname = schoolsdf.School[schoolid]
 
 coursedescription_urls = mainurlsdf.loc[schoolid*2:schoolid*2+1, 'Course description URLs'].reset_index(drop=True)
 degreerequirement_urls = mainurlsdf.loc[schoolid*2:schoolid*2+1, 'Degree requirement URLs'].reset_index(drop=True)
 
 
+def is_hidden(tag):
+    """Checks whether an element is hidden from view (display:none or visibility:hidden style, hidden, or
+    aria-hidden)"""
+    return tag.has_attr('hidden') or tag.get('aria-hidden') == 'true' or \
+        bool(re.search(r'display\s*:\s*none|visibility\s*:\s*hidden', tag.get('style', ''), re.IGNORECASE))
+
+
+def visible_text(tag):
+    """Returns the text of an element without its hidden elements (like the text Chrome shows)"""
+    if is_hidden(tag):
+        return ''
+    if tag.find(is_hidden) is None:
+        return tag.get_text()
+    tag = copy.copy(tag)
+    for hidden in tag.find_all(is_hidden):
+        hidden.decompose()
+    return tag.get_text()
+
+
+def get_child_links(url, sitehtml):
+    """Returns a list of (link, title) pairs for every link on a page that points to a direct child of the page's URL
+
+    :param url: URL of the page
+    :param sitehtml: The page's html
+    :return: List of tuples
+    """
+    soup = bs(sitehtml, features='lxml')
+    childlinks = []
+    for link in soup.find_all('a', href=True):
+        linkurl = urljoin(url + '/', link['href']).strip('/')      # Resolve relative links
+        if ('@' in linkurl) or ('#' in linkurl) or ('.pdf' in linkurl):
+            continue
+        if '/' not in linkurl:
+            continue
+        if linkurl.rindex('/') == len(url):   # If linkurl is child of parent dir, not a grandchild --> append
+            linktitle = ' '.join(visible_text(link).split())
+            linktitle = unicodedata.normalize('NFKC', linktitle).encode('ascii', 'ignore').decode('utf-8')
+            childlinks.append((linkurl, linktitle))
+    return childlinks
+
+
+def crawl_directories(parentdirectories, directorynames):
+    """Finds every page that matches the shared directories by crawling them breadth-first.
+
+    Each level's pages are downloaded concurrently, and links are deduplicated as they're discovered: the first link to
+    a URL gives it its title. That's the row the old dedup kept too (it took the argmax of the link's length, which is
+    the same for every row of a link, so it always picked the first row), but pages used to be visited in set order, so
+    which link came first could change from run to run. Pages are now visited in the order they're found.
+
+    :param parentdirectories: List of the shared directories
+    :param directorynames: List of the property (column) names of each directory level
+    :return: Dictionary of each link and its properties
+    """
+    frontier = ['']
+    sitelinks = {}
+    for diri, directory in enumerate(parentdirectories):
+        urllist = [url + directory for url in frontier]
+        frontier = []
+        for url, sitehtml in zip(urllist, get_page_sources(urllist, '<a ', 'a')):
+            for linkurl, linktitle in get_child_links(url, sitehtml):
+                if linkurl not in sitelinks:
+                    sitelinks[linkurl] = {"link": linkurl, directorynames[diri]: linktitle}
+                    frontier.append(linkurl)
+    return sitelinks
+
+
+def read_sitemap(parentdirectories, directorynames):
+    """Finds every page that matches the shared directories using the catalog's sitemap (see sitemap.py).
+
+    The links are taken straight from the sitemap, so none of the directory pages are downloaded. The sitemap doesn't
+    have their link titles, so each directory is named after its URL instead (e.g. 'computer-science' becomes
+    'Computer Science').
+
+    :param parentdirectories: List of the shared directories
+    :param directorynames: List of the property (column) names of each directory level
+    :return: Dictionary of each link and its properties (empty if the sitemap has no matching pages)
+    """
+    sitelinks = {}
+    for link, names in match_structure(get_sitemap_urls(parentdirectories[0]), parentdirectories).items():
+        sitelinks[link] = {"link": link}
+        for directoryname, name in zip(directorynames, names):
+            sitelinks[link][directoryname] = name.replace('-', ' ').title()
+    return sitelinks
+
+
 def get_sibling_urls(urls, pickle_name):
     """Generates a dataframe containing all the pages within a site that match the input URLs' directory structure.
 
@@ -85,48 +189,16 @@ def get_sibling_urls(urls, pickle_name):
         raise Exception('check url format')
 
     # Extract list of all sites that match the structure of the example URL's
-    nextdirectoryurllist = ['']
-    sitelinks = []
-    # Loop through each shared directory, finding matching URL's
-    for diri, directory in enumerate(parentdirectories):
-        urllist = list(set(nextdirectoryurllist))
-        nextdirectoryurllist = []
-        for url in urllist:
-            url = url + directory
-            driver.get(url)
-            driver.execute_script(
-                "window.scrollTo(0, document.body.scrollHeight);var lenOfPage=document.body.scrollHeight;return lenOfPage;")
-            time.sleep(.3)      # increase this to 5 seconds if selenium is throwing exceptions
-            # Get a list of all elements with a link starting with the matching parent URL
-            # hrefstart_index = parentdirectories[0].rindex('.edu')+4
-            # hrefstart = url[hrefstart_index:]
-            # alllinks = driver.find_elements(By.XPATH, '//a[contains(@href,"' + hrefstart + '")]')
-            alllinks = driver.find_elements(By.XPATH, '//a')       # Slower backup option to get all unfiltered links
-
-            for link in alllinks:
-                rawlink = link.get_attribute("href")
-                if not rawlink:
-                    continue
-                linkurl = rawlink.strip('/')
-                if ('@' in linkurl) or ('#' in linkurl) or ('.pdf' in linkurl):
-                    continue
-                if '/' not in linkurl:
-                    continue
-                if linkurl.rindex('/') == len(url):   # If linkurl is child of parent dir, not a grandchild --> append
-                    linktitle = link.text.strip(' \n')
-                    linktitle = unicodedata.normalize('NFKC', linktitle).encode('ascii', 'ignore').decode('utf-8')
-                    if not linktitle:
-                        linktitle = link.get_attribute('innerText').strip(' \n')
-                        linktitle = unicodedata.normalize('NFKC', linktitle).encode('ascii', 'ignore').decode('utf-8')
-                    sitelinks.append({"link": linkurl, directorynames[diri]: linktitle})
-                    nextdirectoryurllist.append(linkurl)
+    sitelinks = {}
+    if discovery == 'sitemap':
+        sitelinks = read_sitemap(parentdirectories, directorynames)
+        if not sitelinks:
+            print('No pages in the sitemap match ' + urls[0] + ', crawling the directories instead')
+    if not sitelinks:
+        sitelinks = crawl_directories(parentdirectories, directorynames)
 
     # Save all links and properties to a dataframe
-    linksdf = pd.DataFrame(sitelinks)
-    # Remove duplicates and keep the longest titles
-    linksdf['linklength'] = linksdf.link.str.len()
-    linksdf = linksdf.groupby(linksdf.link, as_index=False).apply(lambda x: x.iloc[x.linklength.argmax()])
-    linksdf.drop(columns='linklength', inplace=True)
+    linksdf = pd.DataFrame(list(sitelinks.values()))
     # Broadcast all properties except degree (sites without a degree name need to be removed)
     linksdf.loc[:, directorynames[:-1]] = linksdf.sort_values('link').loc[:, directorynames[:-1]].ffill()
     linksdf = linksdf.dropna(subset=[directorynames[-1]])
@@ -142,10 +214,5 @@ def get_sibling_urls(urls, pickle_name):
     linksdf.to_pickle(pickle_name)
 
 
-s = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=s)
-
 get_sibling_urls(coursedescription_urls, 'coursedescriptionsites.pkl')
 get_sibling_urls(degreerequirement_urls, 'degreesites.pkl')
-
-driver.close()
@@ -6,63 +6,39 @@ This includes the course code, credits, title, requisites, registration informat
 The input is one of the dataframes generated in the first script of this series and the output is a dataframe containg
 all of the relevant html elements.
 
-Chrome browser is required as a dependency.
+Pages are downloaded concurrently without a browser (see pagefetcher.py). Chrome browser is still required as a
+dependency for catalogs whose pages can't be downloaded without one.
 """
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-import time
 import pandas as pd
 from tabulate import tabulate
-from bs4 import BeautifulSoup as bs
-import unicodedata
-import html2text
-h2t = html2text.HTML2Text()
-h2t.ignore_links = True
-h2t.ignore_emphasis = True
-h2t.body_width = 0
+from crawlmanifest import load_manifest, save_manifest
+from crawljournal import finish_journal
+from coursepage import scrape_pages, courseblocks_dataframe
 
 
 # Read dataframe from script 1
 sitesdf = pd.read_pickle('coursedescriptionsites.pkl')
-courseblocks_df = pd.DataFrame()
 
-s = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=s)
+# Rows of each page are appended to their own column lists and only made into a dataframe at the end (concatenating a
+# growing dataframe for every course block copies all the previous rows each time)
+pages = {}
 
-# Loop through each course description page (each page contains an entire department's courses)
-for site in sitesdf.itertuples():
-    url = site.link
-    driver.get(url)
-    driver.execute_script(
-        "window.scrollTo(0, document.body.scrollHeight);var lenOfPage=document.body.scrollHeight;return lenOfPage;")
-    time.sleep(.3)
-    sitehtml = driver.page_source
-    soup = bs(sitehtml, "html.parser")
-    # Courseblock is the html container for each individual course description
-    courseblocks = soup.find_all('div', {'class': 'courseblock'})
-    for blocki, block in enumerate(courseblocks):
-        rowsdf = pd.DataFrame()
-        # Elements contains every html element within courseblock
-        elements = pd.Series(list(block.children))
-        elements = elements[elements != '\n']
-        # An html break followed by bold text is likely a header (TODO test if splitting at every break & \n is valid)
-        rowsdf['html'] = elements.apply(str).str.split('<br/><strong>').apply(pd.Series).stack().reset_index(drop=True)
-        rowsdf = rowsdf.dropna()
-        rowsdf['plaintext'] = rowsdf.html.apply(lambda x: unicodedata.normalize('NFKC', h2t.handle(x)).strip('\n'))
-        rowsdf = rowsdf.loc[rowsdf.plaintext != '']
-        rowsdf = rowsdf.dropna().reset_index(drop=True)
-        # Assign unique ID for each course within a page and their associated elements
-        rowsdf['blockid'] = blocki
-        rowsdf['department'] = site.department
-        courseblocks_df = pd.concat([courseblocks_df, rowsdf])
-driver.close()
+# Manifest of the pages scraped in the previous run (only used in incremental mode, see crawlmanifest.py)
+manifest = load_manifest('coursedescriptions.pkl')
+previousdf = pd.read_pickle('coursedescriptions.pkl') if manifest else None
+newmanifest = {}
+
+# Extract and journal each course description page as soon as it's downloaded, after the pages finished by an earlier
+# run that crashed (see coursepage.py)
+for i, pagecolumns in scrape_pages(sitesdf, manifest, previousdf, newmanifest):
+    pages[sitesdf.link.iloc[i]] = pagecolumns
 
 # Block index resets for every block, blockid resets for every department, while df.index doesn't reset
-courseblocks_df['blockindex'] = courseblocks_df.index
-courseblocks_df.index = courseblocks_df.groupby(['department', 'blockid'], sort=False).ngroup()
+courseblocks_df = courseblocks_dataframe(pages[link] for link in sitesdf.link if link in pages)
 
 # Save and print first 100 entries
 courseblocks_df.to_pickle('coursedescriptions.pkl')
+save_manifest('coursedescriptions.pkl', newmanifest)
+finish_journal('coursedescriptions.pkl')
 print(tabulate(courseblocks_df[['plaintext', 'department']].head(100), headers='keys', tablefmt='psql'))
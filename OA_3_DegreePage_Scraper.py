@@ -13,231 +13,142 @@ Note: Within the html of these catalogs each important element typically has a u
 have the class 'sc_plangrid', generic tables that contain courses are 'sc_courselist', footnotes containing superscript
 definitions are 'sc_footnotes'. Within the tables, credits have the table header 'Units', course codes are 'Code', etc.
 
-Chrome browser is required as a dependency.
+Pages are downloaded concurrently without a browser (see pagefetcher.py), and each page's elements are extracted by a
+pool of worker processes as soon as it arrives (see degreepage.py). The number of worker processes defaults to the
+number of cores and can be changed with the OA_WORKERS environment variable. Chrome browser is still required as a
+dependency for catalogs whose pages can't be downloaded without one.
 """
 
 from verticalprinter import v
 from random import sample
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-import time
-import re
+from pagefetcher import iter_page_sources
+from crawlmanifest import load_manifest, is_unchanged, record, save_manifest
+from crawljournal import load_journal, append_journal, quarantine, finish_journal
+from degreepage import extract_page
+from tableextractor import extract_tables
+import multiprocessing.pool
+import threading
+import queue
+import os
 import pandas as pd
-from bs4 import BeautifulSoup as bs
-import unicodedata
 
 # Open dataframe from script 1
 urldf = pd.read_pickle('degreesites.pkl')
 
-# Set regex definitions
-htmltext_re = re.compile(r'(?<=>)[^<]+')
-sscript_pattern = r'(?<=_SUPERSCRIPT_).+?(?=_)'     # sscript is abbreviation for superscript
-tablerowhtml_re = re.compile(r'<tr.+?</tr>', flags=re.DOTALL)
-tablerowclass_pattern = '(?:class=")([^ "]*)'
-
-s = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=s)
-htmldf = pd.DataFrame()
-for pagei, page in urldf.iterrows():
-    url = page.link
-    driver.get(url)
-    driver.execute_script(
-        "window.scrollTo(0, document.body.scrollHeight);var lenOfPage=document.body.scrollHeight;return lenOfPage;")
-    time.sleep(.3)
-    sitehtml = driver.page_source
-
-    # Replace html superscripts with plain text code so they don't lose their superscript designation when decoded
-    for superscript in re.findall(r'(?<=<sup>)[^<]+', sitehtml):
-        if ',' in superscript:  # For comma separated lists of superscripts
-            replacements = ' _SUPERSCRIPT_' + '_ _SUPERSCRIPT_'.join(re.findall(r'[^ ,]+', superscript)) + '_'
-            sitehtml = re.sub(r'<sup>.+?</sup>', replacements, sitehtml, count=1)
-        elif ' ' in superscript:  # For space separated lists of superscripts (this is rare)
-            replacements = ' _SUPERSCRIPT_' + '_ _SUPERSCRIPT_'.join(re.findall(r'[^ ]+', superscript)) + '_'
-            sitehtml = re.sub(r'<sup>.+?</sup>', replacements, sitehtml, count=1)
-        else:
-            sitehtml = re.sub(r'<sup>.+?</sup>', (' _SUPERSCRIPT_' + superscript + '_'), sitehtml, count=1)
-
-    # Remove invisible superscripts (these are errors from the webdeveloper)
-    sitehtml = re.sub(r'_SUPERSCRIPT_ *_', '', sitehtml)
-
-    soup = bs(sitehtml, features='lxml')
-
-    siblings = []
-    tabnumber = []
-    # Extract elements from main page content then loop through each sub-element
-    pagecontent = soup.find_all(None, {'class': 'page_content tab_content'})
-    if not pagecontent:       # Not a page with sub-pages on tabs
-        pagecontent = soup.find_all(None, {'class': 'page_content'})
-    # Drill down from page -> tabs -> children -> grandchildren -> greatgrandchildren and append elements
-    for tabi, tabpage in enumerate(pagecontent):
-        for child in tabpage.children:
-            if child.name == 'div':         # TODO: Generalize to n-levels
-                for grandchild in child.children:
-                    if grandchild.name == 'div':
-                        for ggchild in grandchild.children:
-                            if str(ggchild) != '\n':
-                                siblings.append(str(ggchild))       # Save each html element
-                                tabnumber.append(tabi)              # Save the tab number too
-                    elif str(grandchild) != '\n':
-                        siblings.append(str(grandchild))
-                        tabnumber.append(tabi)
-            elif str(child) != '\n':
-                siblings.append(str(child))
-                tabnumber.append(tabi)
-    if not siblings:
+workers = int(os.environ.get('OA_WORKERS', os.cpu_count() or 1))      # Processes extracting pages in parallel
+queue_size = 64                 # Maximum number of downloaded pages waiting to be extracted
+
+# Manifest of the pages scraped in the previous run (only used in incremental mode, see crawlmanifest.py)
+manifest = load_manifest('scrapeddegreetables.pkl')
+newmanifest = {}
+keptpages = {}          # Links (and their page numbers) of pages that haven't changed since they were last scraped
+pagedfs = {}            # Dataframe of the elements of each extracted page (by its position in degreesites.pkl)
+
+# Pages finished by an earlier run that crashed are taken from its journal (see crawljournal.py)
+journal = load_journal('scrapeddegreetables.pkl')
+remaining = []          # Positions of the pages that still need to be scraped
+for i, (pagei, link) in enumerate(urldf.link.items()):
+    if link not in journal:
+        remaining.append(i)
         continue
-
-    # Save elements to a dataframe
-    siblingsdf = pd.DataFrame({'tabnumber': tabnumber, 'html': siblings})
-
-    # Extract html class (use html class name for tables and html tagname for all other elements)  todo: clarify naming
-    siblingsdf['htmlclass'] = siblingsdf.html.str.extract('(?<=<)(.+?)(?=( |>))')[0]
-    tableclass = siblingsdf.html.str.extract('(?:class=")(.+?)(?:")', expand=False).str.split().str[0]
-    siblingsdf.loc[siblingsdf.htmlclass.eq('table'), 'htmlclass'] = tableclass
-    siblingsdf = siblingsdf[siblingsdf.htmlclass.ne('hr/')]
-    siblingsdf = siblingsdf[siblingsdf.htmlclass.notna()]
-
-    # Extract header importance
-    siblingsdf['h'] = siblingsdf.htmlclass.str.extract(r'(?<=h)([1-6])(?=\Z)')
-    siblingsdf.loc[siblingsdf.htmlclass.eq('pre'), 'h'] = 7         # Preformatted text is sometimes table header
-    siblingsdf.loc[:, 'h'].fillna('8', inplace=True)                # Anything above 7 is not a header
-    siblingsdf.loc[:, 'h'] = pd.to_numeric(siblingsdf.loc[:, 'h'])
-    siblingsdf['string'] = siblingsdf.html.apply(lambda x: ''.join(htmltext_re.findall(x)))
-
-    # Assign corresponding headers to each element heirarchicaly and save as headertext
-    siblingsdf['headertext'] = ''
-    for h in range(1, 8):
-        if h in siblingsdf.h.values:
-            for starti in siblingsdf.h[siblingsdf.h == h].index:
-                if ~(siblingsdf.h.loc[starti + 1:] <= h).any():
-                    stopi = max(siblingsdf.index)
-                else:
-                    stopi = siblingsdf.loc[starti + 1:, 'h'][siblingsdf.h.loc[starti + 1:] <= h].index[0] - 1
-                siblingsdf.loc[starti:stopi, 'headertext'] = siblingsdf.headertext + siblingsdf.string[starti] + ' : '
-    siblingsdf.headertext = siblingsdf.headertext.str.strip(' : ')
-
-    # Delete header elements (their text is saved in headertext)
-    siblingsdf = siblingsdf.loc[siblingsdf.h.eq(8)].reset_index(drop=True)
-    siblingsdf.drop(columns="h", inplace=True)
-
-    # Change htmlclass for elemnents to 'sc_footnotes' if they contain superscript definition   todo: clarify naming
-    siblingsdf.loc[siblingsdf.string.str.match('_SUPERSCRIPT_'), 'htmlclass'] = 'sc_footnotes'
-
-    # Merge adjacent text blocks with matching headers (but don't merge for tables)
-    dontmerge = siblingsdf.html.str.match('<table ')
-    groupedbyheader = (
-                siblingsdf.headertext.ne(siblingsdf.headertext.shift()) | dontmerge | dontmerge.shift(1)).cumsum()
-    siblingsdf = siblingsdf.groupby(groupedbyheader, as_index=False).agg(
-        {'tabnumber': 'first', 'html': ' /n '.join, 'htmlclass': 'first', 'string': ' ; '.join, 'headertext': 'first'})
-
-    # Get headers of siblings that precede tables (may contain degree name)
-    siblingsdf.loc[
-        ~siblingsdf.htmlclass.isin(['sc_plangrid', 'sc_courselist']), 'siblingheaders'] = siblingsdf.headertext
-    tablegroups = siblingsdf[::-1].siblingheaders.isna().cumsum()[::-1]
-    siblingsdf.siblingheaders = siblingsdf.siblingheaders.groupby(tablegroups).transform(lambda x: ' : '.join(x[:-1]))
-
-    # Assign superscript definitions to the tables that reference them
-    siblingsdf.loc[siblingsdf.htmlclass.eq('sc_footnotes'), 'sscripts'] = siblingsdf.string
-    siblingsdf.loc[siblingsdf.html.str.match('<p> _SUPERSCRIPT_'), 'sscripts'] = siblingsdf.string
-    siblingsdf.sscripts = siblingsdf.sscripts.bfill()     # Sometimes definitions are listed under a later element
-    siblingsdf.sscripts = siblingsdf.sscripts.ffill()     # or before the element
-    has_sscripts = siblingsdf.html.str.contains(sscript_pattern) | siblingsdf.headertext.str.contains(sscript_pattern)
-    needs_sstable = has_sscripts & siblingsdf.htmlclass.ne('sc_footnotes')
-    # if (siblingsdf.sscripts.isna() & siblingsdf.htmlclass.isin(['sc_courselist', 'sc_plangrid']) & needs_sstable).any():
-    #     print('There is a table that contains superscripts but does not have superscript definitions. Ignore? (y/n)')
-    #     if input() != 'y':
-    #         raise Exception('Terminated by User')
-
-    # Remove definitions if the table doesn't have any superscripts
-    siblingsdf.loc[~needs_sstable & siblingsdf.htmlclass.isin(['sc_courselist', 'sc_plangrid']), 'sscripts'] = ''
-    siblingsdf = siblingsdf[siblingsdf.htmlclass.ne('sc_footnotes')]
-    if siblingsdf.empty:
+    pagedf, newmanifest[link] = journal[link]
+    pagedfs[i] = pagedf if pagedf is None else pagedf.assign(pagenumber=pagei)
+
+
+def download_pages(pagequeue):
+    """Downloads the degree pages and puts each one on the queue as it arrives (followed by None when done)"""
+    try:
+        for position, sitehtml, error in iter_page_sources(urldf.link.iloc[remaining], 'page_content',
+                                                           '.page_content'):
+            pagequeue.put((remaining[position], sitehtml, error))
+    except Exception as e:
+        pagequeue.put(e)
+    pagequeue.put(None)
+
+
+def finish_page(i, result):
+    """Journals the elements of an extracted page, or quarantines the page if extracting it raised an exception"""
+    link = urldf.link.iloc[i]
+    try:
+        pagedfs[i] = result.get()
+    except Exception as e:
+        quarantine('scrapeddegreetables.pkl', link, e)
+        del newmanifest[link]
+        return
+    append_journal('scrapeddegreetables.pkl', link, (pagedfs[i], newmanifest[link]))
+
+
+# Download the pages in a background thread while worker processes extract each page's elements as soon as it arrives
+# (otherwise pages are extracted in a thread). Workers are forked, since spawned workers would re-run this script, and
+# the pool forks all of them when it's created, before the download thread exists (forking a process that has threads
+# isn't safe, and ProcessPoolExecutor only starts its workers as they're needed before Python 3.11.1)
+if 'fork' in multiprocessing.get_all_start_methods():
+    pool = multiprocessing.get_context('fork').Pool(workers)
+else:
+    pool = multiprocessing.pool.ThreadPool(1)
+pagequeue = queue.Queue(maxsize=queue_size)
+downloader = threading.Thread(target=download_pages, args=(pagequeue,), daemon=True)
+downloader.start()
+extracted = {}         # Pages that are being extracted (by position)
+while True:
+    pageposition = pagequeue.get()
+    if pageposition is None:
+        break
+    if isinstance(pageposition, Exception):
+        raise pageposition
+    i, sitehtml, error = pageposition
+    pagei, page = urldf.index[i], urldf.iloc[i]
+    if error is not None:       # The page couldn't be rendered or isn't in the page cache (offline mode)
+        quarantine('scrapeddegreetables.pkl', page.link, error)
+        continue
+    record(newmanifest, page.link, sitehtml)
+    if is_unchanged(manifest, page.link, sitehtml):
+        keptpages[page.link] = pagei
         continue
-    siblingsdf = siblingsdf.reset_index(drop=True)
-
-    # Assign all the page-wide properties
-    siblingsdf = siblingsdf.assign(link=url)
-    siblingsdf = siblingsdf.assign(pagenumber=pagei)
-    siblingsdf.loc[:, ['program', 'degree', 'school']] = pd.concat([page] * siblingsdf.index.size,
-                                                                   axis=1, ignore_index=True).T
-    # Extract the page title (it's usually the degree name)
-    if soup.find(None, {'id': 'page-title'}) is None:
-        if soup.find(None, {'class': 'page-title'}) is None:
-            siblingsdf['pagetitle'] = soup.find(None, {'class': 'page-header'}).text
-        else:
-            siblingsdf['pagetitle'] = soup.find(None, {'class': 'page-title'}).text
-    else:
-        siblingsdf['pagetitle'] = soup.find(None, {'id': 'page-title'}).text
-
-    # Concatenate the df's for all pages
-    htmldf = pd.concat([htmldf, siblingsdf])
-driver.close()
-
-# Extract just the tables that contain degree requirements
-isdegreetable = htmldf.htmlclass.eq('sc_courselist') | htmldf.htmlclass.eq('sc_plangrid')
-tables = htmldf.loc[isdegreetable, ['degree', 'headertext', 'siblingheaders', 'sscripts', 'tabnumber', 'pagenumber',
-                                    'html', 'htmlclass', 'link', 'pagetitle']].reset_index(drop=True)
-
-
-# At this point the tables are still just html
-# Convert each individual html table to a dataframe, which is then nested as a single element in tablesseries
-tablesseries = tables.html.apply(lambda x: pd.read_html(x)[0])
-tablesseries.rename('tables', inplace=True)
-tablesseries = tablesseries.apply(lambda x: x.fillna(''))
-
-# Remove unicode junk
-tablesseries = tablesseries.apply(lambda x: x.applymap(lambda y: unicodedata.normalize('NFKC', str(y).strip(' \n')).
-                                                       encode('ascii', 'ignore').decode('utf-8')))
-# Mark current rows as not being a table header, then move column index to row and mark those as table headers
-tablesseries = tablesseries.apply(lambda x: x.assign(headerflag=False))
-
-# Todo: Use existing html column headers instead of assigning them
-# # Get rid of non-standard tables (like courseplans with multiple courses/semsters sharing a row)
-# columnheaders = tablesseries.apply(lambda x: x.columns)
-# hascode = columnheaders.apply(lambda x: 'Code' in x)
-# hastitle = columnheaders.apply(lambda x: 'Title' in x)
-# hascredits = columnheaders.apply(lambda x: 'Units' in x) | columnheaders.apply(lambda x: 'Credits' in x)
-# tablesseries = tablesseries[hascode & hastitle & hascredits]
-# tables = tables[hascode & hastitle & hascredits]
-
-tablesseries = tablesseries.apply(lambda x: x.T.reset_index().T.reset_index(drop=True))
-# Assign column names
-# 'coregroup' is an optional column sometimes present in course tables (represents gen ed groups)
-tablesseries.apply(lambda x: x.columns)
-tablesseries.apply(lambda x: x.insert(2, "coregroup", '') if len(x.columns) == 4 else None)
-tablesseries.apply(lambda x: x.set_axis(['code', 'title', 'coregroup', 'credits', 'headerflag'], axis=1, inplace=True))
-# Move column indexes to rows and mark with headerflag
-tablesseries = tablesseries.apply(lambda x: x.assign(headerflag=x.headerflag.ne(False)))
-
-
-# Make new df containing each individual table and their table-wide info
-tabledf = pd.concat([tablesseries, tables], axis=1)
-tabledf = tabledf.assign(id=list(range(len(tables))))
-# Broadcast table info from other rows of tabledf into the nested dataframes in the first column
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(degree=x.degree), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(pagetitle=x.pagetitle), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(headertext=x.headertext), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(siblingheaders=x.siblingheaders), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(tabnumber=x.tabnumber), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(pagenumber=x.pagenumber), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(superscripts=x.sscripts), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(htmlclass=x.htmlclass), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(link=x.link), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(id=x.id), axis=1)
-
-# Convert entire table html into html of individual rows              *Accomodates for missing table headers*
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(
-    html=[''] * (len(x.tables) - len(tablerowhtml_re.findall(x.html))) + tablerowhtml_re.findall(x.html)), axis=1)
-tabledf.tables = tabledf.apply(lambda x: x.tables.assign(rowclass=x.tables.html.str.extract(tablerowclass_pattern)),
-                               axis=1)
-
-# Explode series containing dataframes into one big dataframe
-df = pd.concat(tabledf.tables.to_list())
-
-# Delete blank rows
-df = df.loc[df.html.str.contains(r'(?<=>)[^<]+'), :]
-df.reset_index(drop=True, inplace=True)
+    extracted[i] = pool.apply_async(extract_page, (sitehtml, page.link, pagei, page))
+    for j in [j for j, result in extracted.items() if result.ready()]:
+        finish_page(j, extracted.pop(j))
+downloader.join()
+for j, result in extracted.items():
+    finish_page(j, result)
+pool.close()
+pool.join()
+
+# Concatenate the df's for all pages in page order
+htmldf = pd.concat([pd.DataFrame()] + [pagedfs[i] for i in sorted(pagedfs) if pagedfs[i] is not None])
+
+# Convert the tables of every page that was scraped (unchanged pages are carried forward below)
+if htmldf.empty:
+    df = pd.DataFrame()
+else:
+    # Extract just the tables that contain degree requirements
+    isdegreetable = htmldf.htmlclass.eq('sc_courselist') | htmldf.htmlclass.eq('sc_plangrid')
+    tables = htmldf.loc[isdegreetable, ['degree', 'headertext', 'siblingheaders', 'sscripts', 'tabnumber', 'pagenumber',
+                                        'html', 'htmlclass', 'link', 'pagetitle']].reset_index(drop=True)
+
+    # Convert the tables straight into one long dataframe with a row for each table row (see tableextractor.py)
+    df = extract_tables(tables.html.to_list(), {
+        'degree': tables.degree.to_list(), 'pagetitle': tables.pagetitle.to_list(),
+        'headertext': tables.headertext.to_list(), 'siblingheaders': tables.siblingheaders.to_list(),
+        'tabnumber': tables.tabnumber.to_list(), 'pagenumber': tables.pagenumber.to_list(),
+        'superscripts': tables.sscripts.to_list(), 'htmlclass': tables.htmlclass.to_list(),
+        'link': tables.link.to_list(), 'id': list(range(len(tables)))})   # id is a unique number for each table
+
+    # Delete blank rows
+    df = df.loc[df.html.str.contains(r'(?<=>)[^<]+'), :]
+    df.reset_index(drop=True, inplace=True)
+
+# Carry forward the rows of unchanged pages from the last run and renumber the tables in page order
+if keptpages:
+    previousdf = pd.read_pickle('scrapeddegreetables.pkl')
+    keptdf = previousdf.loc[previousdf.link.isin(list(keptpages))]
+    keptdf = keptdf.assign(pagenumber=keptdf.link.map(keptpages))
+    df = pd.concat([df, keptdf]).sort_values(['pagenumber', 'id'], kind='mergesort')
+    df['id'] = df.groupby(['pagenumber', 'id'], sort=False).ngroup()
+    df.reset_index(drop=True, inplace=True)
 
 df.to_pickle('degreetables.pkl')
-v(df.loc[sorted(sample(df.index.to_list(), k=20))])         # print a randomized selection
+df.to_pickle('scrapeddegreetables.pkl')     # Script 7 overwrites degreetables.pkl, so keep a copy for incremental runs
+save_manifest('scrapeddegreetables.pkl', newmanifest)
+finish_journal('scrapeddegreetables.pkl')
+v(df.loc[sorted(sample(df.index.to_list(), k=min(20, len(df))))])       # print a randomized selection
@@ -9,15 +9,19 @@ the course description).
 The program takes the html elements generated in script 2 of this series and outputs a dataframe containing all the
 relevant course info (one course per row).
 
+The y/n checks along the way are answered by the school's decision policy when there's one (see decisionpolicy.py).
+
 3rd party modules needed include pandas and tabulate.
 """
 
 import re
 import pandas as pd
 from verticalprinter import v
-from listtopattern import listtopatternraw
+from listtopattern import listtopatternraw, compiled
 from tabulate import tabulate
 from random import sample
+from decisionpolicy import decide
+from catalogprofile import input_fingerprint, sites_fingerprint, load_profile, save_profile, redetect
 import warnings
 warnings.filterwarnings("ignore", 'This pattern has match groups')
 
@@ -50,12 +54,39 @@ coursecode_pattern = r'([A-Z][A-Z]?[A-Z]?[A-Z]?[A-Z]?[A-Z]?[A-Z]?[A-Z]?)[- ]?([0
 ccredits_parenthesis_pattern = r'(?:\()([0-9][0-9]?\.?[0-9]? ?-? ?[0-9]?[0-9]?\.?[0-9]?)(?:\))'
 ccredits_colon_pattern = r'(?:credits?|units?|hours?):? ?(?:var|varies|variable)? ?\[?([0-9][0-9]?\.?[0-9]? ?-? ?[0-9]?[0-9]?\.?[0-9]?)\]?'
 ccredits_nocolon_pattern = r'(?:var|varies|variable)? ?\[?([0-9][0-9]?\.?[0-9]? ?-? ?[0-9]?[0-9]?\.?[0-9]?)\]? (?:credits?|units?|(?:semester )?h(?:ou)?rs?)'
+ccredits_colon_re = compiled(ccredits_colon_pattern, re.IGNORECASE)
+ccredits_nocolon_re = compiled(ccredits_nocolon_pattern, re.IGNORECASE)
 ID_pattern = r'\A([^(/.|:)]+:)'
+# Every ID's keywords/phrases in one alternation, each in a group named after the ID (the first ID that matches wins)
+header_re = compiled('|'.join('(?P<' + name + '>' + listtopatternraw(ID) + ')' for name, ID in zip(ID_names, ID_list)),
+                     re.IGNORECASE)
+ID_res = {name: compiled(listtopatternraw(ID), re.IGNORECASE) for name, ID in zip(ID_names, ID_list)}
 
 # Open dataframe from script 2
 blocksdf = pd.read_pickle('coursedescriptions.pkl')
 coursesdf = pd.DataFrame(columns=['dept', 'number', 'credits', 'title', 'description'])
 
+# School-wide decisions saved by an earlier run of the same catalog (see catalogprofile.py). Each one is checked against
+# this input with the same condition that detects it, and when one fails the decisions are detected again
+fingerprint = input_fingerprint(blocksdf.link, blocksdf.html)
+sites = sites_fingerprint('coursedescriptionsites.pkl')
+layout = load_profile('organizer', fingerprint, sites)
+
+
+def checked(layout, decision, detected):
+    """Checks a saved decision against the same decision detected from this input.
+
+    :param layout: The saved decisions that are still used
+    :param decision: Name of the decision
+    :param detected: The decision detected from this input
+    :return: The saved decisions that are still used (none if this one doesn't match, so the rest are detected again
+        too, see catalogprofile.redetect) and the decision to use
+    """
+    if decision in layout and layout[decision] != detected:
+        layout = redetect('organizer', decision)
+    return layout, layout.get(decision, detected)
+
+
 # Split up any lines that have \n    Todo: Accomplish this in script 2 instead
 blocksdf.plaintext = blocksdf.plaintext.apply(lambda x: x.split('\n'))
 blocksdf = blocksdf.explode('plaintext')
@@ -77,28 +108,39 @@ else:
     raise Exception('the coursecode is not the first item on the firstlines')
 
 # Extract credits (ensure 80% of firstlines contain credits)        Todo: Clean up and generalize
-if sum(firstlines.str.contains(ccredits_colon_pattern, flags=re.IGNORECASE, regex=True)) > .8*len(firstlines):
-    coursesdf['credits'] = firstlines.str.extract(ccredits_colon_pattern, flags=re.IGNORECASE)
-    firstlines = firstlines.str.replace(ccredits_colon_pattern, '', regex=True, flags=re.IGNORECASE, n=1)
-elif sum(firstlines.str.contains(ccredits_nocolon_pattern, flags=re.IGNORECASE, regex=True)) > .8*len(firstlines):
-    coursesdf['credits'] = firstlines.str.extract(ccredits_nocolon_pattern, flags=re.IGNORECASE)
-    firstlines = firstlines.str.replace(ccredits_nocolon_pattern, '', regex=True, flags=re.IGNORECASE, n=1)
-elif sum(firstlines.str.contains(ccredits_parenthesis_pattern)) > .8:
+# (the first layout that's found is used, and a saved layout is detected again if it isn't found)
+credits_re = compiled(listtopatternraw(creditsID), re.IGNORECASE)
+colon_count = sum(firstlines.str.contains(ccredits_colon_re))
+nocolon_count = sum(firstlines.str.contains(ccredits_nocolon_re))
+parenthesis_count = sum(firstlines.str.contains(ccredits_parenthesis_pattern))
+line_count = sum(blocksdf.plaintext.str.match(credits_re))          # Credits are on their own line
+creditsfound = {'colon': colon_count > .8*len(firstlines), 'nocolon': nocolon_count > .8*len(firstlines),
+                'parenthesis': parenthesis_count > .8, 'line': line_count >= .8*len(firstlines)}
+if 'credits' in layout and not creditsfound[layout['credits']]:
+    layout = redetect('organizer', 'credits')
+creditslayout = layout.get('credits', next((x for x in creditsfound if creditsfound[x]), 'line'))
+if creditslayout == 'colon':
+    coursesdf['credits'] = firstlines.str.extract(ccredits_colon_re)
+    firstlines = firstlines.str.replace(ccredits_colon_re, '', regex=True, n=1)
+elif creditslayout == 'nocolon':
+    coursesdf['credits'] = firstlines.str.extract(ccredits_nocolon_re)
+    firstlines = firstlines.str.replace(ccredits_nocolon_re, '', regex=True, n=1)
+elif creditslayout == 'parenthesis':
     coursesdf['credits'] = firstlines.str.extract(ccredits_parenthesis_pattern)
     firstlines = firstlines.str.replace(ccredits_parenthesis_pattern, '', regex=True, n=1)
 else:
-    matchinglines = blocksdf.loc[blocksdf.plaintext.str.match(listtopatternraw(creditsID), flags=re.IGNORECASE),
-                                 'plaintext']
-    if sum(matchinglines.notna()) < .8*len(firstlines):
+    if not creditsfound['line']:
         raise Exception('cant find the credits on firstline')
-    coursesdf['credits'] = matchinglines.str.replace(listtopatternraw(creditsID), '', regex=True, flags=re.IGNORECASE)
-    blocksdf = blocksdf.loc[~blocksdf.plaintext.str.match(listtopatternraw(creditsID), flags=re.IGNORECASE)]
+    matchinglines = blocksdf.loc[blocksdf.plaintext.str.match(credits_re), 'plaintext']
+    coursesdf['credits'] = matchinglines.str.replace(credits_re, '', regex=True)
+    blocksdf = blocksdf.loc[~blocksdf.plaintext.str.match(credits_re)]
 
 coursesdf.credits = coursesdf.credits.str.strip(' .')
 firstlines = firstlines.str.strip(' .')
 
 # If all the courses have something else at the end in parentheses, assume it's irrelevant (like a breakdown of credits)
-if firstlines.str.contains(r'\)\Z').all():
+layout, strip_title_suffix = checked(layout, 'strip_title_suffix', bool(firstlines.str.contains(r'\)\Z').all()))
+if strip_title_suffix:
     firstlines = firstlines.str.replace(r'\([^()]*?\)\Z', '', regex=True)
 
 # If a small percentage of the remaining firstlines contain parenthesis and colons, then assume it's the course title
@@ -107,9 +149,9 @@ has_colon = firstlines.str.contains(r':')
 if (has_parentheses.sum() < .1*len(firstlines)) & (has_colon.sum() < .3*len(firstlines)):
     coursesdf['title'] = firstlines
 else:
-    print(list(set(firstlines.str.extract(r'(\([^()]*\))', expand=False).to_list())))
-    print('Can we delete these parentheses? (y/n)')         # Print all parentheses items to verify
-    if input() == 'y':
+    parentheses = list(set(firstlines.str.extract(r'(\([^()]*\))', expand=False).to_list()))
+    print(parentheses)         # Print all parentheses items to verify
+    if decide('delete_parentheses', 'Can we delete these parentheses?', parentheses):
         firstlines.str.replace(r'(\([^()]*\))', '', regex=True)
     else:
         raise Exception('terminated by user')
@@ -117,27 +159,34 @@ else:
 blocksdf = blocksdf.loc[blocksdf.blockindex != 0]
 
 # Extract all the other info
-if blocksdf.iloc[-1].name + 1 == len(blocksdf):         # If there is only 1 block per course, everything is in it
+layout, oneblock = checked(layout, 'oneblock', bool(blocksdf.iloc[-1].name + 1 == len(blocksdf)))
+if oneblock:         # If there is only 1 block per course, everything is in it
     for i, ID in enumerate(ID_list):    # Look for matches in the middle of the paragraph Todo: Apply this in all cases
-        middle_pattern = listtopatternraw(ID) + r'([^\n]*?)(\.(?![A-Za-z0-9])|\n|\Z)'
-        matchingstring = blocksdf.plaintext.str.extract(middle_pattern, flags=re.IGNORECASE).iloc[:, 2].str.strip(' .')
+        middle_re = compiled(listtopatternraw(ID) + r'([^\n]*?)(\.(?![A-Za-z0-9])|\n|\Z)', re.IGNORECASE)
+        matchingstring = blocksdf.plaintext.str.extract(middle_re).iloc[:, 2].str.strip(' .')
         coursesdf[ID_names[i]] = matchingstring
-        blocksdf.plaintext = blocksdf.plaintext.str.replace(middle_pattern, '', regex=True, flags=re.IGNORECASE)
+        blocksdf.plaintext = blocksdf.plaintext.str.replace(middle_re, '', regex=True)
 else:
-    for i, ID in enumerate(ID_list):            # Look for matches at the start of each line
-        matchinglines = blocksdf.loc[blocksdf.plaintext.str.match(listtopatternraw(ID), flags=re.IGNORECASE),
-                                     'plaintext']
-        # Fix duplicated entries (e.g. two lines that say 'Prerequisites:' but one is blank)
-        lengthsdf = pd.concat([matchinglines, matchinglines.apply(len)], axis=1)
-        lengthsdf.columns = ['lines', 'length']
-        if not lengthsdf.empty:     # Keep entry with longest string length  Todo: Ensure deleted is redundant or blank
-            matchinglines = lengthsdf.groupby(lengthsdf.index).apply(lambda x: x.lines.iloc[x.length.argmax()])
-        coursesdf[ID_names[i]] = matchinglines.str.replace(listtopatternraw(ID), '', regex=True,
-                                                           flags=re.IGNORECASE).str.strip(' .')
-        blocksdf = blocksdf.loc[~blocksdf.plaintext.str.match(listtopatternraw(ID), flags=re.IGNORECASE)]
+    # Tag each line with the first ID that matches at its start, in a single scan of the lines
+    matches = [header_re.match(line) for line in blocksdf.plaintext]
+    linesdf = pd.DataFrame({'course': blocksdf.index, 'ID': [m.lastgroup if m else None for m in matches],
+                            'line': blocksdf.plaintext.to_numpy()})
+    blocksdf = blocksdf.loc[linesdf.ID.isna().to_numpy()]
+    linesdf = linesdf.dropna(subset=['ID'])
+    # Fix duplicated entries (e.g. two lines that say 'Prerequisites:' but one is blank) by keeping the entry with the
+    # longest string length (the first one if they tie)     Todo: Ensure deleted is redundant or blank
+    linesdf['length'] = -linesdf.line.str.len()
+    linesdf = linesdf.sort_values('length', kind='stable').drop_duplicates(['course', 'ID'])
+    # Remove the keywords/phrases and spread the entries out into a column for each ID
+    linesdf['entry'] = [ID_res[ID].sub('', line).strip(' .') for ID, line in zip(linesdf.ID, linesdf.line)]
+    entries = linesdf.pivot(index='course', columns='ID', values='entry').reindex(columns=ID_names)
+    for name in ID_names:
+        coursesdf[name] = entries[name]
 
 # Locate the plaintext description
-if coursesdf.description.isna().all():    # If descriptions is empty it must be in the remaining block
+layout, unlabelled_descriptions = checked(layout, 'unlabelled_descriptions',
+                                          bool(coursesdf.description.isna().all()))
+if unlabelled_descriptions:    # If descriptions is empty it must be in the remaining block
     # Assume course description is the first block; unparsed is after
     unparsed = blocksdf.groupby(blocksdf.index).apply(lambda x: x[1:] if len(x) != 1 else None)
     coursesdf['description'] = blocksdf.plaintext.groupby(blocksdf.index).apply(lambda x: x.iloc[0])
@@ -147,15 +196,14 @@ else:
 if not unparsed.empty:
     # Verify first lines of remaining blocks are just plain text descriptions
     kvalue = min(400, len(blocksdf.index.to_list()))
-    v(blocksdf.plaintext.groupby(blocksdf.index).first()[sorted(sample(blocksdf.index.to_list(), k=kvalue))])
-    print('Do all these look like just descriptions? (y/n)')
-    if input() != 'y':
+    firstblocks = blocksdf.plaintext.groupby(blocksdf.index).first()[sorted(sample(blocksdf.index.to_list(), k=kvalue))]
+    v(firstblocks)
+    if not decide('descriptions_ok', 'Do all these look like just descriptions?', firstblocks):
         raise Exception('Terminated by user')
 
     # Verify remaining blocks can be merged with plain text description
     v(sorted(unparsed.plaintext.unique()))
-    print('Move these unparsed items to the description? (y/n)')
-    if input() == 'y':
+    if decide('move_unparsed', 'Move these unparsed items to the description?', sorted(unparsed.plaintext.unique())):
         hasextras = blocksdf.groupby(blocksdf.index).apply(any)
         extrasjoined = blocksdf.plaintext.groupby(blocksdf.index).agg(lambda x: '. '.join(x))
         coursesdf.loc[hasextras.index, 'description'] = coursesdf.description + '. ' + extrasjoined
@@ -163,7 +211,10 @@ if not unparsed.empty:
         raise Exception('Terminated by user')
 
 # If prereqs, coreqs and requisites are all blank, look in the plain text description   Todo: Do this earlier in script
-if coursesdf.requisites.isna().all() & coursesdf.prerequisites.isna().all():
+layout, requisites_in_description = checked(layout, 'requisites_in_description',
+                                            bool(coursesdf.requisites.isna().all() &
+                                                 coursesdf.prerequisites.isna().all()))
+if requisites_in_description:
     coursesdf.prerequisites = coursesdf.description.str.extract('Prerequisites?: ([^.]+)', expand=False)
     coursesdf.description = coursesdf.description.str.replace('Prerequisites?: ([^.]+)', '', regex=True)
     coursesdf.corequisites = coursesdf.description.str.extract('Corequisites?: ([^.]+)', expand=False)
@@ -174,9 +225,9 @@ if coursesdf.requisites.isna().all() & coursesdf.prerequisites.isna().all():
 # Verify remaining instances of ID keywords/phrases are irrelevant
 potentialIDs = blocksdf.plaintext.str.extract(ID_pattern).loc[:, 0].dropna().reset_index(drop=True)
 if potentialIDs.groupby(potentialIDs).count().max() > .005*len(coursesdf):
-    v(potentialIDs.groupby(potentialIDs).count().sort_values().tail(50))
-    print('Ignore these? (y/n)')
-    if input() != 'y':
+    idcounts = potentialIDs.groupby(potentialIDs).count().sort_values().tail(50)
+    v(idcounts)
+    if not decide('ignore_ids', 'Ignore these?', [name + ' (' + str(count) + ')' for name, count in idcounts.items()]):
         raise Exception('Terminated by user')
 
 # Clean up
@@ -190,13 +241,23 @@ has_newlines = coursesdf.coursegroups.str.contains('\n')
 has_semicolons = coursesdf.coursegroups.str.contains(';')
 has_commas = coursesdf.coursegroups.str.contains(',')
 delimiterdict = {'\n': sum(has_newlines), ';': sum(has_semicolons), ',': sum(has_commas)}
-delimiter = max(delimiterdict, key=delimiterdict.get)
+delimiter = layout.get('coursegroups_delimiter', max(delimiterdict, key=delimiterdict.get))
 coursesdf.coursegroups = coursesdf.coursegroups.apply(lambda groups: [x.strip() for x in groups.split(delimiter)])
 
 # Check if prerequisites is requisites based on whether coreqs is empty
-if coursesdf.requisites.eq('').all() & coursesdf.corequisites.eq('').all():
+layout, prerequisites_are_requisites = checked(layout, 'prerequisites_are_requisites',
+                                               bool(coursesdf.requisites.eq('').all() &
+                                                    coursesdf.corequisites.eq('').all()))
+if prerequisites_are_requisites:
     coursesdf['requisites'] = coursesdf.prerequisites
     coursesdf['prerequisites'] = ''
 
+# Save the school-wide decisions to the school's profile so later runs organize it the same way (see catalogprofile.py)
+if not layout:
+    save_profile('organizer', fingerprint, sites=sites, decisions={
+        'credits': creditslayout, 'strip_title_suffix': bool(strip_title_suffix), 'oneblock': oneblock,
+        'unlabelled_descriptions': unlabelled_descriptions, 'requisites_in_description': requisites_in_description,
+        'coursegroups_delimiter': delimiter, 'prerequisites_are_requisites': prerequisites_are_requisites})
+
 print(tabulate(coursesdf.head(300), headers='keys', tablefmt='psql'))
 coursesdf.to_pickle('organizedcoursedescriptions.pkl')
@@ -33,6 +33,12 @@ import pandas as pd
 import numpy as np
 from listtopattern import listtopattern
 from listtopattern import listtononcapture
+from listtopattern import listtotrie
+from listtopattern import compiled
+from fixedpoint import rewrite_until_stable
+from requisiteparser import serialize_requisites
+from catalogprofile import pages_fingerprint, sites_fingerprint, load_profile, save_profile, redetect, \
+    course_code_patterns, department_codes, listed_cdept_pattern
 from tabulate import tabulate
 import json
 import warnings
@@ -50,15 +56,22 @@ alllist = df.coursegroups.apply(pd.Series).stack().reset_index(drop=True)
 coursegroups = alllist.unique()
 coursegroups.sort()
 
-# Determine the coursecode structure
-cdeptrange = (df.dept.apply(len).min(), df.dept.apply(len).max())
-course_numbers = df.number.str.extract('([0-9]+)', expand=False).fillna('')
-cnumrange = (course_numbers.apply(len).min(), course_numbers.apply(len).max())
-course_letters = df.number.str.extract('([A-Z]+)', expand=False).fillna('')  # Optional letters that follow course num.
-cletrange = (course_letters.apply(len).min(), course_letters.apply(len).max())
-# Redefine course code patterns to reflect structure
-cdept_pattern = '[A-Z]'*cdeptrange[0] + '[A-Z]?'*(cdeptrange[1]-cdeptrange[0])
-cnum_pattern = '[0-9]'*cnumrange[0] + '[0-9]?'*(cnumrange[1]-cnumrange[0]) + '[A-Z]'*cletrange[0] + '[A-Z]?'*(cletrange[1]-cletrange[0])
+# Determine the coursecode structure and list the department codes (or reuse the ones in the school's profile if every
+# course code fits them, see catalogprofile.py). Each batch of the streaming driver is given the whole school's
+departments = department_codes(df)
+fingerprint = pages_fingerprint('coursedescriptions.pkl')
+sites = sites_fingerprint('coursedescriptionsites.pkl')
+layout = load_profile('parser', fingerprint, sites)
+if layout and not (df.dept.str.fullmatch(layout['cdept_pattern']).all() &
+                   df.number.str.fullmatch(layout['cnum_pattern']).all() &
+                   set(departments).issubset(layout['departments'])):
+    layout = redetect('parser', 'course code')
+if layout:
+    cdept_pattern, cnum_pattern, departments = layout['cdept_pattern'], layout['cnum_pattern'], layout['departments']
+else:
+    cdept_pattern, cnum_pattern = course_code_patterns(df)
+    save_profile('parser', fingerprint, {'cdept_pattern': cdept_pattern, 'cnum_pattern': cnum_pattern,
+                                         'departments': departments}, sites)
 
 # Remove delimiters between dept and num
 df = df.replace('(' + cdept_pattern + ') ?-? ?(' + cnum_pattern + ')', r'\1\2', regex=True)
@@ -67,7 +80,7 @@ ccode_pattern = cdept_pattern + cnum_pattern
 # Move prereqs and coreqs to requisites   Todo: Rewrite script so coreqs and prereqs are processed separately
 df.reqs = df.apply(lambda x: (x.prerequisites + '. ' + x.reqs).strip('. ') if x.prerequisites else x.reqs, axis=1)
 # Ensure coreqs are tagged with the word coreqs
-df.corequisites = df.corequisites.str.replace('corequisites?', '', regex=True, flags=re.IGNORECASE)
+df.corequisites = df.corequisites.str.replace(compiled('corequisites?', re.IGNORECASE), '', regex=True)
 coreqsnamed = df.corequisites.str.replace('(' + ccode_pattern + ')', r'corequisite \1', regex=True)
 # Ensure coreq tag is always at the start (without duplicating it), even if there's no ccodes
 coreqsnamed = coreqsnamed.str.replace(r'\A\(corequisite\)?', 'corequisite', regex=True)
@@ -91,12 +104,12 @@ misplacedids = ['equisite:', 'REQUISITE:', 'equisites:', 'REQUISITES:', ' ourses
                 'COURSE:']
 reqcolon_desc = df.desc.apply(lambda x: [sentence + '.' for sentence in x.split('.') if
                                          any(substring in sentence for substring in misplacedids)]).str.join('')
-misplaced_req_pattern = r'([^.]*?requisite(?:[- ,.;\(\[]+)' + ccode_pattern + r'[^.]*\.)'
-reqccode_desc = df.desc.str.findall(misplaced_req_pattern, flags=re.IGNORECASE).str.join('').str.strip()
+misplaced_req_pattern = compiled(r'([^.]*?requisite(?:[- ,.;\(\[]+)' + ccode_pattern + r'[^.]*\.)', re.IGNORECASE)
+reqccode_desc = df.desc.str.findall(misplaced_req_pattern).str.join('').str.strip()
 df.reqs = df.reqs.str.strip('.').str.cat(reqcolon_desc, '. ').str.strip('. ') + '.'
 df.reqs = df.reqs.str.strip('.').str.cat(reqccode_desc, '. ').str.strip('. ') + '.'
 df.loc[df.reqs == '.', 'reqs'] = ''
-df.reqs = df.reqs.str.replace(r'(\A|\.) ?none.? ?(\.|\Z)', '', regex=True, flags=re.IGNORECASE)
+df.reqs = df.reqs.str.replace(compiled(r'(\A|\.) ?none.? ?(\.|\Z)', re.IGNORECASE), '', regex=True)
 reqscopy = df.reqs.copy()
 
 # Fix important word misspellings & variations
@@ -111,18 +124,19 @@ grade_words = ['grade?', 'minimum grade?', 'minimum grade of', '_P_requisite min
 restricted_words = ['restricted', 'excluded']
 
 # Replace variations with standardized or encoded forms
-df.replace('(?i)' + listtopattern(preco_words), '_B_requisite', regex=True, inplace=True)
-df.replace('(?i)' + listtopattern(prereq_words), '_P_requisite', regex=True, inplace=True)
-df.replace('(?i)' + listtopattern(coreq_words), '_C_requisite', regex=True, inplace=True)
-df.replace('(?i)' + listtopattern(recommended_words), 'recommended', regex=True, inplace=True)
-df.replace('(?i)' + listtopattern(min_words) + r' ', 'minimum ', regex=True, inplace=True)
-df.replace('(?i)' + listtopattern(max_words) + r' ', 'maximum ', regex=True, inplace=True)
-df.replace('(?i)' + listtopattern(grade_words) + """ (?="?'?[A-D][-+]?'?"?)""", 'grade ', regex=True, inplace=True)
-df.replace('(?i)' + listtopattern(restricted_words) + ' ', 'restricted ', regex=True, inplace=True)
+df.replace(compiled('(?i)' + listtopattern(preco_words)), '_B_requisite', regex=True, inplace=True)
+df.replace(compiled('(?i)' + listtopattern(prereq_words)), '_P_requisite', regex=True, inplace=True)
+df.replace(compiled('(?i)' + listtopattern(coreq_words)), '_C_requisite', regex=True, inplace=True)
+df.replace(compiled('(?i)' + listtopattern(recommended_words)), 'recommended', regex=True, inplace=True)
+df.replace(compiled('(?i)' + listtopattern(min_words) + r' '), 'minimum ', regex=True, inplace=True)
+df.replace(compiled('(?i)' + listtopattern(max_words) + r' '), 'maximum ', regex=True, inplace=True)
+df.replace(compiled('(?i)' + listtopattern(grade_words) + """ (?="?'?[A-D][-+]?'?"?)"""), 'grade ', regex=True,
+           inplace=True)
+df.replace(compiled('(?i)' + listtopattern(restricted_words) + ' '), 'restricted ', regex=True, inplace=True)
 
 # Fix outros with non-sensical punctuation (might be misinterpreted later)    Todo: Remove this (too school specific)
 bad_precooutros = [', may be taken concurrently']
-df.reqs = df.reqs.str.replace(listtopattern(bad_precooutros), ' (may be taken concurrently)', regex=True)
+df.reqs = df.reqs.str.replace(compiled(listtopattern(bad_precooutros)), ' (may be taken concurrently)', regex=True)
 
 # Visualize what's leftover in descriptions that contain prereq or coreq
 # df.desc.str.extractall(r'([^.]*?(?:P_requisite|C_requisite)[^.]*\.)', flags=re.IGNORECASE).loc[:,0].unique()
@@ -133,27 +147,33 @@ words_notneeded = ['completed', 'department enforced?', '(with )?(consent|permis
                    'requisites?:?', 'enforced', '(may )?requires?', 'requires? a', 'requires enrollment in',
                    'of the following:?', 'of', '(this )?courses?', 'either', 'a', 'will be required',
                    '((is|are) )?required', 'requirements?', 'all', 'both']
-df.reqs = df.reqs.str.replace(listtopattern(words_notneeded), '', regex=True, flags=re.IGNORECASE)
-df.reqs = df.reqs.str.replace('department _P_requisite', ' _P_requisite', regex=True, flags=re.IGNORECASE)
-df.reqs = df.reqs.str.replace('(requisite)(?: :|:)?', r'\1', regex=True, flags=re.IGNORECASE)
+df.reqs = df.reqs.str.replace(compiled(listtopattern(words_notneeded), re.IGNORECASE), '', regex=True)
+df.reqs = df.reqs.str.replace(compiled('department _P_requisite', re.IGNORECASE), ' _P_requisite', regex=True)
+df.reqs = df.reqs.str.replace(compiled('(requisite)(?: :|:)?', re.IGNORECASE), r'\1', regex=True)
 df.reqs = df.reqs.str.replace(r'\(s\)', '', regex=True)
 df.reqs = df.reqs.str.replace('(?:or (or)|(and) and)', r'\1', regex=True)
 df.reqs = df.reqs.str.replace(r'\A ?\. ?\Z', '', regex=True)
 df.reqs = df.reqs.str.replace('  +', ' ', regex=True)
 
 # Replace parentheses that start with the word 'or' [eg. '(or xxxxx xxxx)' with 'or xxxxx xxxx']
-df.reqs = df.reqs.str.replace(r'\((or [^()]+)\)', r'\1', regex=True, flags=re.IGNORECASE)
+df.reqs = df.reqs.str.replace(compiled(r'\((or [^()]+)\)', re.IGNORECASE), r'\1', regex=True)
 
 # Replace implied course codes and departments (eg. MATH241 or 243  -->  MATH241 or MATH243)
-deptslash_pattern = '(?<!rade) (' + cdept_pattern + r'),? ?(?:/|or),? ?(' + cdept_pattern + ') ?-? ?(' + cnum_pattern + ')'
-numslash_pattern = '(' + cdept_pattern + ') ?-? ?(' + cnum_pattern + r'),? ?(?:/|or),? ?(' + cnum_pattern + ')'
-ccodeslash_pattern = '(' + ccode_pattern + r') ?/ ?(?=' + ccode_pattern + ')'
-oldreqs = pd.Series(['']*len(df.reqs))
-while (oldreqs != df.reqs).any():
-    oldreqs = df.reqs.copy()
-    df.reqs = df.reqs.str.replace(deptslash_pattern, r'\1\3 or \2\3', regex=True)
-    df.reqs = df.reqs.str.replace(numslash_pattern, r'\1\2 or \1\3', regex=True)
-    df.reqs = df.reqs.str.replace(ccodeslash_pattern, r'\1 or ', regex=True)
+deptslash_pattern = compiled('(?<!rade) (' + cdept_pattern + r'),? ?(?:/|or),? ?(' + cdept_pattern + ') ?-? ?(' +
+                             cnum_pattern + ')')
+numslash_pattern = compiled('(' + cdept_pattern + ') ?-? ?(' + cnum_pattern + r'),? ?(?:/|or),? ?(' + cnum_pattern +
+                            ')')
+ccodeslash_pattern = compiled('(' + ccode_pattern + r') ?/ ?(?=' + ccode_pattern + ')')
+
+
+def implied_ccodes(reqs):
+    """Fills in one implied department or course number in each of the requisites"""
+    reqs = reqs.str.replace(deptslash_pattern, r'\1\3 or \2\3', regex=True)
+    reqs = reqs.str.replace(numslash_pattern, r'\1\2 or \1\3', regex=True)
+    return reqs.str.replace(ccodeslash_pattern, r'\1 or ', regex=True)
+
+
+df.reqs = rewrite_until_stable(df.reqs, implied_ccodes, 'implied course codes')
 
 # Encode grade requirements
 df.reqs = df.reqs.str.replace(r"""(g|G)rade "?'?([A-D][-+])'?"? or (higher|better)( in)?""", r'grade_\2_', regex=True)
@@ -167,48 +187,48 @@ grade_pattern = 'grade_[A-D][+_-]_'
 # Move restrictions from requisites to restrictions column      Todo: Cleanup and consolidation
 studentnames = ['students', 'freshmen', 'sophomores', 'juniors', 'seniors', 'majors', 'undergraduates', 'graduates',
                 'class members', 'minors']
-restricted_to_pattern = r'[^.]*restricted to [^.]*' + listtononcapture(studentnames) + r'[^.]*\.|\Z'
-restricted_from_pattern = r'[^.]*' + listtononcapture(studentnames) + r'[^.]*restricted from ' + r'[^.]*\.|\Z'
-class_standing_pattern = r'(?:junior|senior|sophomore|graduate) standing[^.]*(?:\.|\Z)'
-restrictedtos = df.reqs.str.findall(restricted_to_pattern, flags=re.IGNORECASE).str.join('').str.strip()
+restricted_to_pattern = compiled(r'[^.]*restricted to [^.]*' + listtononcapture(studentnames) + r'[^.]*\.|\Z',
+                                 re.IGNORECASE)
+restricted_from_pattern = compiled(r'[^.]*' + listtononcapture(studentnames) + r'[^.]*restricted from ' + r'[^.]*\.|\Z',
+                                   re.IGNORECASE)
+class_standing_pattern = compiled(r'(?:junior|senior|sophomore|graduate) standing[^.]*(?:\.|\Z)', re.IGNORECASE)
+restrictedtos = df.reqs.str.findall(restricted_to_pattern).str.join('').str.strip()
 df.restrictions = df.restrictions.str.strip('.').str.cat(restrictedtos, '. ').str.strip('. ') + '.'
-df.reqs = df.reqs.str.replace(restricted_to_pattern, '', regex=True, flags=re.IGNORECASE)
-restrictedfroms = df.reqs.str.findall(restricted_from_pattern, flags=re.IGNORECASE).str.join('').str.strip()
+df.reqs = df.reqs.str.replace(restricted_to_pattern, '', regex=True)
+restrictedfroms = df.reqs.str.findall(restricted_from_pattern).str.join('').str.strip()
 df.restrictions = df.restrictions.str.strip('.').str.cat(restrictedfroms, '. ').str.strip('. ') + '.'
-df.reqs = df.reqs.str.replace(restricted_from_pattern, '', regex=True, flags=re.IGNORECASE)
+df.reqs = df.reqs.str.replace(restricted_from_pattern, '', regex=True)
 df.loc[df.restrictions == '.', 'restrictions'] = ''
-classstandings = df.reqs.str.findall(class_standing_pattern, flags=re.IGNORECASE).str.join('').str.strip()
+classstandings = df.reqs.str.findall(class_standing_pattern).str.join('').str.strip()
 df.restrictions = df.restrictions.str.strip('.').str.cat(classstandings, '. ').str.strip('. ') + '.'
-df.reqs = df.reqs.str.replace(class_standing_pattern, '', regex=True, flags=re.IGNORECASE)
+df.reqs = df.reqs.str.replace(class_standing_pattern, '', regex=True)
 
 # Move recommended courses (not really requisites if they are optional)
-recommendeds_pattern = r'[^.]*recommended[^.]*\.|\Z'
-recommendeds = df.reqs.str.findall(recommendeds_pattern, flags=re.IGNORECASE).str.join('').str.strip()
+recommendeds_pattern = compiled(r'[^.]*recommended[^.]*\.|\Z', re.IGNORECASE)
+recommendeds = df.reqs.str.findall(recommendeds_pattern).str.join('').str.strip()
 df['recommendeds'] = df.recommendeds.str.strip('.').str.cat(recommendeds, '. ').str.strip('. ') + '.'
-df.reqs = df.reqs.str.replace(recommendeds_pattern, '', regex=True, flags=re.IGNORECASE).str.join('').str.strip()
+df.reqs = df.reqs.str.replace(recommendeds_pattern, '', regex=True).str.join('').str.strip()
 
 # Remove extra spaces adjacent to parentheses
 df.reqs = df.reqs.str.replace(r'\( ', r'(', regex=True)
 df.reqs = df.reqs.str.replace(r' \)', r')', regex=True)
 # Remove parentheses for singular objects in parentheses
 df.reqs = df.reqs.str.replace(r'\(((?:' + ccode_pattern + ')|(?:' + grade_pattern + ')|' +
-                              listtononcapture(df.dept.unique().tolist()) + r')\)', r'\1', regex=True)
+                              listtotrie(df.dept.unique().tolist()) + r')\)', r'\1', regex=True)
 
 # Replace commas in comma separated lists with either 'or' or 'and', depending on the context
 # First, backfill 'or' or 'and' to comma separated groups within parentheses
-or_and_parentheses_pattern = r'(?<=\()([^(]*), ?((?:\w+ )*\w+),? ?(or|and) ([^(]*)'
-oldreqs = pd.Series(['']*len(df.reqs))
-while (oldreqs != df.reqs).any():
-    oldreqs = df.reqs.copy()
-    df.reqs = df.reqs.str.replace(or_and_parentheses_pattern, r'\1 \3 \2 \3 \4', regex=True, flags=re.IGNORECASE)
+or_and_parentheses_pattern = compiled(r'(?<=\()([^(]*), ?((?:\w+ )*\w+),? ?(or|and) ([^(]*)', re.IGNORECASE)
+df.reqs = rewrite_until_stable(df.reqs, lambda reqs: reqs.str.replace(or_and_parentheses_pattern, r'\1 \3 \2 \3 \4',
+                                                                      regex=True), 'comma backfill in parentheses')
 # Second, backfill all other comma separated groups  Todo: Generalize this to nested parentheses like in delimitersplit
-oldreqs = pd.Series(['']*len(df.reqs))
-while (oldreqs != df.reqs).any():
-    oldreqs = df.reqs.copy()
-    df.reqs = df.reqs.str.replace(r', ((?:\w+ )*\w+),? (or|and)', r' \2 \1 \2', regex=True, flags=re.IGNORECASE)
+or_and_pattern = compiled(r', ((?:\w+ )*\w+),? (or|and)', re.IGNORECASE)
+df.reqs = rewrite_until_stable(df.reqs, lambda reqs: reqs.str.replace(or_and_pattern, r' \2 \1 \2', regex=True),
+                               'comma backfill')
 # Replace comma separated lists without 'or' or 'and' with '_???_'
-df.reqs = df.reqs.str.replace(r'(?<=,) ?(\w+) ?,', r'\1 _???_ ', regex=True, flags=re.IGNORECASE)
-df.reqs = df.reqs.str.replace(r'(?:\A|(?<=[;:,.\(]))( ?\w+), ?', r'\1 _???_ ', regex=True, flags=re.IGNORECASE)
+df.reqs = df.reqs.str.replace(compiled(r'(?<=,) ?(\w+) ?,', re.IGNORECASE), r'\1 _???_ ', regex=True)
+df.reqs = df.reqs.str.replace(compiled(r'(?:\A|(?<=[;:,.\(]))( ?\w+), ?', re.IGNORECASE), r'\1 _???_ ',
+                              regex=True)
 df.replace('  +', ' ', regex=True, inplace=True)
 
 # Todo: Implement this with flag for reqs that fail test
@@ -236,163 +256,13 @@ df.replace('  +', ' ', regex=True, inplace=True)
 # Delete lone periods
 df.reqs = df.reqs.str.replace(r'\A ?[.] ?\Z', '', regex=True)
 
-# Replace periods with parentheses (each individual sentence represents a separate requisite)
-df.reqs = df.reqs.str.replace(r' ?([^.]+)\.?', r'{\1}', regex=True)
-df.reqs = df.reqs.str.replace('}{', '} and {', regex=False)
-df.reqs = df.reqs.str.replace('{', '(', regex=False)
-df.reqs = df.reqs.str.replace('}', ')', regex=False)
-
-# For requisites that are not explicitly indicated as prereq or coreq (or either) we have to determine if they are
-# implicitly defined. The method that follows involves first splitting strings using parentheses into their respective
-# groupings using the function delimitersplit then broadcasting the requisite within the group using the function
-# heirarchical_fill.
-
-
-def delimitersplit(delimiter_list, method):
-    """ Converts a sentence that is split by a variety of delimiters into one that is soley split by parentheses.
-
-    Takes a sentence that is split by delimiters, either explicit (commas, semicolons, parentheses) or implicit
-    (words that imply grouping from context) into a sentence that explicitly shows separations with parentheses.
-
-    Inputs a list containing the delimiters. If the method is specified as 'keep', then the function will not delete
-    the delimiters (for instance with implied delimiters where you don't want to remove the delimiting words)
-
-    Output is None (modifies df.reqs inplace)
-
-    This works with any level or combination of delimiters, including in strings with complex nested parentheses and
-    with a combination of other delimiters, and also modifies the placement of 'and' and 'or' to account for these
-    groupings.
-
-    Example:
-    For the string "_P_requisite CSCI1300 or CSCI1310 or ECEN1310 grade_C-_ and _C_requisite MATH1300 or MATH1310", the
-    words '_P_requisite' and '_C_requisite' indicate implied groupings (CSCI1300, CSCI1310, and ECEN1310 are in the
-    prereq grouping, while MATH1300 and MATH1310 are in the coreq grouping). To split this sentence, we treat the
-    substring ' and _C_requisite' as an implied delimiter. Using delimitersplit with the 'keep' method, this transforms
-    the string to "(_P_requisite CSCI1300 or CSCI1310 or ECEN1310 grade_C-_) and (_C_requisite MATH1300 or MATH1310)"
-    """
-    olderreqs = pd.Series(['']*len(df.reqs))
-    while (olderreqs != df.reqs).any():     # Evaluate all inner parentheses on each loop
-        olderreqs = df.reqs.copy()
-        for d in delimiter_list:      # Loop through each delimiter and group with parentheses
-            olderreqs = df.reqs.copy()
-            # Group everything to the left of the first delimiter
-            if method == 'keep':
-                pattern1 = r'([({])([^{)(]+?)(' + d + ')(?=[^{(]*[)}])'
-                pattern2 = r'} ([^})]+?)(' + d + ')'
-                pattern3 = r'} ([^})]+?)([)}])'
-            else:
-                pattern1 = r'([({])([^{)(' + d + r']+)()' + d + '(?=[^{(]*[)}])'
-                pattern2 = r'} ([^})' + d + ']+)()(?:' + d + ')'
-                pattern3 = r'} ([^})' + d + ']+)([)}])'
-            df.reqs = df.reqs.str.replace(pattern1, r'\1{\2}\3', regex=True)
-            oldreqs2 = pd.Series(['']*len(df.reqs))
-            while (oldreqs2 != df.reqs).any():                   # Group all the middle delimiters
-                oldreqs2 = df.reqs.copy()
-                df.reqs = df.reqs.str.replace(pattern2, r'}{\1}\2', regex=True)
-            df.reqs = df.reqs.str.replace(pattern3, r'}{\1}\2', regex=True)
-        # Replace inner parentheses with <>    Note: changing from () to <> ensures they are ignored in subsequent loops
-        df.reqs = df.reqs.str.replace(r'\(([^(]+?)\)', r'<\1>', regex=True)
-        # Replace {} with <>
-        df.reqs = df.reqs.str.replace(r'{', r'<', regex=True)
-        df.reqs = df.reqs.str.replace(r'}', r'>', regex=True)
-    # Replace <> with ()
-    df.reqs = df.reqs.str.replace(r'<', r'(', regex=True)
-    df.reqs = df.reqs.str.replace(r'>', r')', regex=True)
-    # Move and's and or's that lead a parentheses to before (outside) the parentheses
-    df.reqs = df.reqs.str.replace(r'\)\((or|and|\?\?\?) ', r') \1 (', regex=True)
-
-
-# Apply delimitersplit to implied groupings
-delimitersplit([' and _[PCB]_requisite', ' or _[PCB]_requisite'], 'keep')
-# Apply to explicit delimiters
-delimitersplit([';', ','], 'delete')
-
-
-def heirarchical_fill(string, method, classifierexample):
-    """Appends modifier ID's to course codes according to heirarchical groupings.
-
-    For requisite groups containing complex nested parentheses, this function broadcasts modifiers (e.g. grade_C+_ or
-    _C_requisite) to those requisites within the same group, or when appropriate, a sibling group. The use of ffill or
-    bfill within groups is context dependent (grades are usually listed at the end of a group, prereq or coreq
-    indication is listed at the beginning)
-
-    Keyword arguments:
-    string -- A hierarchical grouping, where groups and subgroups are indicated by placement in parentheses.
-    method -- 'bfill' or 'ffill'
-    classiferexample -- example classifier string with a tagname (fixed) and a classifier ID (variable; fixed in length)
-
-    Modifiers must be formatted as follows:
-    For front-fill:  (underscore)(ID)(underscore)(tagname)        eg: _P_requisite
-    for back-fill:  (tagname)(underscore)(ID)(underscore)         eg: grade_C+_
-    """
-    global ccode_pattern
-    if not string:
-        return string
-    classifierlength = classifierexample.rindex('_') - classifierexample.index('_') - 1
-    taglength = len(classifierexample) - classifierlength - 2
-    if method == 'bfill':
-        tagname = classifierexample[:taglength][::-1]
-        string = string[::-1]
-        string = re.sub(r'\(', '`', string)
-        string = re.sub(r'\)', '(', string)
-        string = re.sub('`', ')', string)
-        ccode_pat = '[' + '['.join(ccode_pattern.split('[')[::-1])[:-1]
-    else:
-        tagname = classifierexample[classifierlength+2:]
-        ccode_pat = ccode_pattern
-    bracketindex = [i for i, x in enumerate(string) if x in ')(']
-    highestlevel = 10                    # Parameter that sets how many levels are possible in the heirarchy
-    reqtype = [classifierlength*'?' + '_']*highestlevel
-    level = 1
-    newstring = ''
-    # Loop through every bracket from left to right, and keep count of how many open/close brackets you've crossed
-    for bracketi, bracketstart in enumerate(bracketindex[:-1]):
-        nextbracketstart = bracketindex[bracketi+1]
-        nextbracket = string[nextbracketstart]
-        bracketstring = string[bracketstart:nextbracketstart]
-        reqstarts = [x.start()+1 for x in re.finditer('_' + tagname, bracketstring)]
-        if reqstarts:
-            newstring += re.sub('(' + ccode_pat + ')', '_' + reqtype[level] + r'\1',
-                                bracketstring[:reqstarts[0] - classifierlength-2])
-            for starti, start in enumerate(reqstarts):
-                if start == reqstarts[-1]:
-                    reqstring = bracketstring[start + taglength + 1:]
-                else:
-                    reqstring = bracketstring[start + taglength + 1:reqstarts[starti + 1] - classifierlength-2]
-                if nextbracket == '(':                          # Then save the reqtype for use in the next brackets
-                    reqtype[level:] = [bracketstring[start-(1+classifierlength):start]]*(highestlevel-level)
-                    newstring += re.sub('(' + ccode_pat + ')', '_' + reqtype[level] + r'\1', reqstring)
-                else:                                           # Just apply the current req type and forget it
-                    newstring += re.sub('(' + ccode_pat + ')', '_' + bracketstring[start-classifierlength-1:start] +
-                                        r'\1', reqstring)
-        else:
-            newstring += re.sub('(' + ccode_pat + ')', '_' + reqtype[level] + r'\1', bracketstring)
-        # Level keeps track of how deep in the bracket heirarchy you are
-        # Level=1 means you are inside one bracket, level=2 means nested in two, level=3 means nested in 3, etc...
-        if nextbracket == ')':
-            level -= 1
-            reqtype[level:] = [reqtype[level]] * (highestlevel - level)     # reset reqtype to parent group's type
-        else:
-            level += 1
-    newstring += ')'
-    if method == 'bfill':
-        newstring = newstring[::-1]
-        newstring = re.sub(r'\(', '`', newstring)
-        newstring = re.sub(r'\)', '(', newstring)
-        newstring = re.sub('`', ')', newstring)
-    return newstring
-
-
-# Run code_ffill for requisites and grades
-df.reqs = df.reqs.apply(lambda x: heirarchical_fill(x, method='ffill', classifierexample='_P_requisite'))
-df.reqs = df.reqs.apply(lambda x: heirarchical_fill(x, method='bfill', classifierexample='grade_F-_'))
+# Parse each course's requisites into a tree of sentences and groups, broadcasting the requisite type (prereq, coreq,
+# or either) and grade requirement of each group to its course codes, and serialize it (see requisiteparser.py)
+df.reqs = df.reqs.apply(serialize_requisites, args=(ccode_pattern,))
 
 # Use actual cdepts if cdept_pattern is too long (to speed things up)
-if cdept_pattern.count('?') > 3:
-    titleccodes = df.dept.str.extract('([A-Z]+)', expand=False).unique().tolist()
-    equivccodes = [x for sublist in df.equivalents.str.findall(r'(\b[A-Z]+(?=\b|\d))').to_list() for x in sublist]
-    cdept_pattern = listtononcapture(titleccodes + list(set(equivccodes)))
-    ccode_pattern = cdept_pattern + cnum_pattern
+cdept_pattern = listed_cdept_pattern(departments, cdept_pattern)
+ccode_pattern = cdept_pattern + cnum_pattern
 
 fcodeqmark_pattern = r'_[?PCB]_' + ccode_pattern + r'_[?A-D][?_+-]_'
 fcode_pattern = r'_[PCB]_' + ccode_pattern + r'_[?A-D][?_+-]_'
@@ -429,7 +299,7 @@ df.loc[~hasandor, 'reqs'] = df.reqs.str.replace(' _???_ ', ' and ', regex=False)
 df.reqs = df.reqs.str.replace(r'\A ?(or|and) ?\Z', '', regex=True)
 
 # Replace no reqs with ''
-df.reqs[df.reqs.str.fullmatch('none', flags=re.IGNORECASE)] = ''
+df.reqs[df.reqs.str.fullmatch(compiled('none', re.IGNORECASE))] = ''
 
 # Delete leading and trailing 'and' and 'or' (leftover from removing redundancies step)
 df.reqs = df.reqs.str.replace(r'\A(.*?)( and| or)+ ?\Z', r'\1', regex=True)
@@ -439,28 +309,35 @@ df.reqs = df.reqs.str.replace(r'([(]) ?(and |or )+', r'\1', regex=True)
 
 # Todo: Implement a more robust method to check if context is correct before deleting
 # Determine what's fully parsed by deleting parsed items and checking for an empty string at the end
-andorflags = pd.Series([False]*len(df))
-pcollapse = df.reqs
-pcollapse_old = pd.Series(['']*len(df.reqs))
-while (pcollapse != pcollapse_old).any():
-    pcollapse_old = pcollapse.copy()
+infcode_pattern = compiled(r'(\([^()]*)' + f_all_pattern + r'([^()]*\))')
+inandor_pattern = compiled(r'(\([^()]*)( and | or )([^()]*\))')
+inandthenor_pattern = compiled(r'\([^()]* and [^()]* or [^()]*\)')
+inorthenand_pattern = compiled(r'\([^()]* or [^()]* and [^()]*\)')
+
+
+def mixed_andor(pcollapse):
+    """Returns whether each requisite has inner parentheses with a mix of ands and ors"""
+    return pcollapse.str.contains(inandthenor_pattern) | pcollapse.str.contains(inorthenand_pattern)
+
+
+def collapse_inner_parentheses(pcollapse):
+    """Deletes the fcodes, and the ands and ors if they aren't mixed, from the innermost parentheses of each
+    requisite, and then deletes the parentheses that are left empty"""
     # Delete all fcodes from inner parentheses
-    pcollapse_oldish = pd.Series(['']*len(df.reqs))
-    while (pcollapse != pcollapse_oldish).any():
-        pcollapse_oldish = pcollapse.copy()
-        pcollapse = pcollapse.str.replace(r'(\([^()]*)' + f_all_pattern + r'([^()]*\))', r'\1\2', regex=True)
-    # Check inner parentheses to see if there are a mix of ands or ors
-    hasandor = pcollapse.str.contains(r'\([^()]* and [^()]* or [^()]*\)')
-    hasorand = pcollapse.str.contains(r'\([^()]* or [^()]* and [^()]*\)')
-    andorflags.loc[np.logical_or(hasandor, hasorand)] = True
+    pcollapse = rewrite_until_stable(pcollapse, lambda x: x.str.replace(infcode_pattern, r'\1\2', regex=True),
+                                     'delete fcodes in parentheses')
     # Delete ands and ors in inner parentheses if they don't have a mix
-    pcollapse_oldish = pd.Series(['']*len(df.reqs))
-    while (pcollapse != pcollapse_oldish).any():
-        pcollapse_oldish = pcollapse.copy()
-        pcollapse[~np.logical_or(hasandor, hasorand)] = pcollapse.str.replace(r'(\([^()]*)( and | or )([^()]*\))',
-                                                                              r'\1\3', regex=True)
-    # Delete empty parentheses
-    pcollapse.replace(r'\(\)', '')
+    unmixed = ~mixed_andor(pcollapse)
+    pcollapse[unmixed] = rewrite_until_stable(pcollapse[unmixed],
+                                              lambda x: x.str.replace(inandor_pattern, r'\1\3', regex=True),
+                                              'delete ands and ors in parentheses')
+    # Delete empty parentheses (so the parentheses around them are collapsed in the next pass)
+    return pcollapse.str.replace('()', '', regex=False)
+
+
+pcollapse = rewrite_until_stable(df.reqs, collapse_inner_parentheses, 'collapse parentheses')
+# A mix of ands and ors in parentheses is never deleted, so it's still in the collapsed requisites
+andorflags = mixed_andor(pcollapse)
 # Move reqs with mix of ands and ors in parentheses
 df['?requirements'] = df.loc[andorflags, 'reqs']
 df.loc[andorflags, 'reqs'] = ''
@@ -511,7 +388,7 @@ df = df[['dept', 'number', 'credits', 'title', 'requisites (parsed & unambiguous
 df.to_pickle('courses.pkl')
 with open('schoolname.json') as infile:
     schoolname = json.load(infile)
-schooldirectory = 'Output_dataframes/' + schoolname
+schooldirectory = os.path.join(os.environ.get('OA_OUTPUT_DIR', 'Output_dataframes'), schoolname)
 if os.path.isdir(schooldirectory):
     shutil.rmtree(schooldirectory)
 os.mkdir(schooldirectory)
@@ -526,6 +403,11 @@ nontrivialparsed = sum(noextras & isnontrivial)
 print(str(nontrivialparsed) + ' non-trivial parsed (' + str(round(100*nontrivialparsed/sum(isnontrivial), 2)) + '%)')
 print(str(sum(df['requisites (ambiguous)'].ne(''))) + ' requirements are ambiguous')
 
+# Save the parse results of each course so triage runs can project the rates above from a sample (OA_0_TriageDriver.py)
+if os.environ.get('OA_PARSE_STATS') == '1':
+    pd.DataFrame({'dept': df.dept, 'nontrivial': isnontrivial, 'parsed': noextras & isnontrivial,
+                  'ambiguous': df['requisites (ambiguous)'].ne('')}).to_pickle('courseparsestats.pkl')
+
 # # Print out a random sample for verification
 # parsed_reqs = df.loc[df['requisites (parsed & unambiguous only)'].ne('') | df['requisites (ambiguous)'].ne('')]
 # print(tabulate(df.loc[sorted(sample(parsed_reqs.index.to_list(), k=100))], headers='keys', tablefmt='psql'))
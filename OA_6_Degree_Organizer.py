@@ -15,11 +15,14 @@ Third party modules needed include Tabulate, Numpy, and Pandas.
 
 import re
 import numpy as np
-from listtopattern import listtopattern
+from listtopattern import listtopattern, compiled
+from fixedpoint import rewrite_until_stable
 import pandas as pd
 import json
 from req_encode import req_encode
 from req_encode import groupwords
+from decisionpolicy import decide
+from catalogprofile import input_fingerprint, load_profile, save_profile
 import sys
 import warnings
 warnings.filterwarnings("ignore", 'This pattern has match groups')
@@ -76,28 +79,33 @@ df = df.replace(r'\b(' + cdept_pattern + ')' + ' ?-? ?(' + cnum_pattern + r')\b'
 ccode_pattern = '_' + cdept_pattern + cnum_pattern + '_(?:<.>)*'  # ccode + superscripts
 
 # Fill in 'or' or 'and' seperated ccodes that lack either the dept or number (dept or number is implied)
-df_old = (['']*len(df.code))
-while (df.code != df_old).any():
-    df_old = df.code.copy()
-    df.code = df.code.str.replace(
-        r'\b(_' + cdept_pattern + ')(' + cnum_pattern + '_)' + or_pattern + '(' + cnum_pattern + r')\b',
-        r'\1\2 | \1\3_', regex=True)
-    df.code = df.code.str.replace(
-        r'\b(_' + cdept_pattern + ')(' + cnum_pattern + '_)' + and_pattern + '(' + cnum_pattern + r')\b',
-        r'\1\2 & \1\3_', regex=True)
-    df.code = df.code.str.replace(
-        r'\b(' + cdept_pattern + ')' + or_pattern + '(_' + cdept_pattern + ')' + '(' + cnum_pattern + r'_)\b',
-        r'_\1\3 | \2\3', regex=True)
-    df.code = df.code.str.replace(
-        r'\b(' + cdept_pattern + ')' + and_pattern + '(_' + cdept_pattern + ')' + '(' + cnum_pattern + r'_)\b',
-        r'_\1\3 & \2\3', regex=True)
+impliednum_or_re = compiled(r'\b(_' + cdept_pattern + ')(' + cnum_pattern + '_)' + or_pattern + '(' + cnum_pattern +
+                            r')\b')
+impliednum_and_re = compiled(r'\b(_' + cdept_pattern + ')(' + cnum_pattern + '_)' + and_pattern + '(' + cnum_pattern +
+                             r')\b')
+implieddept_or_re = compiled(r'\b(' + cdept_pattern + ')' + or_pattern + '(_' + cdept_pattern + ')' + '(' +
+                             cnum_pattern + r'_)\b')
+implieddept_and_re = compiled(r'\b(' + cdept_pattern + ')' + and_pattern + '(_' + cdept_pattern + ')' + '(' +
+                              cnum_pattern + r'_)\b')
+
+
+def implied_ccodes(code):
+    """Fills in one implied department or course number in each of the codes"""
+    code = code.str.replace(impliednum_or_re, r'\1\2 | \1\3_', regex=True)
+    code = code.str.replace(impliednum_and_re, r'\1\2 & \1\3_', regex=True)
+    code = code.str.replace(implieddept_or_re, r'_\1\3 | \2\3', regex=True)
+    return code.str.replace(implieddept_and_re, r'_\1\3 & \2\3', regex=True)
+
+
+df.code = rewrite_until_stable(df.code, implied_ccodes, 'implied course codes')
 
 # Convert '&' and 'or' seperated ccodes into one unit
 df = df.replace('(' + ccode_pattern + ') ?& ?', r'\1 & ', regex=True)
 
 # Merge rows that begin with 'or' and their preceding row(s) into one XOR group
-startswithor = df.code.str.match('or ', flags=re.IGNORECASE)
-df.loc[startswithor, 'code'] = df.loc[startswithor, 'code'].str.replace('or ', '', flags=re.IGNORECASE)
+or_re = compiled('or ', re.IGNORECASE)
+startswithor = df.code.str.match(or_re)
+df.loc[startswithor, 'code'] = df.loc[startswithor, 'code'].str.replace(or_re, '', regex=True)
 orgroups = (~startswithor).cumsum()
 df = df.groupby(orgroups, as_index=False).agg(
     {'code': ' | '.join, 'title': ' | '.join, 'coregroup': 'first', 'credits': 'first', 'headerflag': 'first',
@@ -142,10 +150,17 @@ iscolonheader = df.code.str.contains(r': ?\Z')
 # ID headers based on indentation
 df.html = df.html.str.replace('<br', 'Ð')         # Replace with special character so we can avoid it in next step
 isindented = df.html.str.contains(r'\A[^Ð]* style="margin-left:')
-indentlevel = df.html.str.extract(r'\A[^Ð]* style="margin-left:(\d\d?\d?)px').iloc[:, 0].fillna('0')
+# The indent levels are only checked when the tables' html differs from the last run's (see catalogprofile.py)
+if df.degree.eq('GENEDS').all():      # Gen. ed. tables only have fragment links (see script 7)
+    profilesection, fingerprint = 'geneds', input_fingerprint(df.flink, df.html)
+else:
+    profilesection, fingerprint = 'degrees', input_fingerprint(df.link, df.html)
+if not load_profile(profilesection, fingerprint):
+    indentlevel = df.html.str.extract(r'\A[^Ð]* style="margin-left:(\d\d?\d?)px').iloc[:, 0].fillna('0')
+    if len(indentlevel.unique()) > 2:
+        raise Exception('Tables have multiple levels of indent. Update table header heirarchy.')
+    save_profile(profilesection, fingerprint, {'indentlevels': sorted(indentlevel.unique().tolist())})
 df.html.str.replace('Ð', '<br')
-if len(indentlevel.unique()) > 2:
-    raise Exception('Tables have multiple levels of indent. Update table header heirarchy.')
 # group together indented objects
 indentgroups = isindented.eq(False).cumsum()
 indentgroups.loc[indentgroups.groupby(indentgroups).transform('count') == 1] = np.nan
@@ -162,7 +177,7 @@ df.drop(columns='headerflag', inplace=True)
 istermheader = df.rowclass.isin(['plangridyear', 'plangridterm'])
 
 # ID metaheaders (metaheaders indicate groups that contain sub-group requirements (eg: choose two of the groups below))
-ismetaheader = df.headercodes.str.contains('group', flags=re.IGNORECASE)
+ismetaheader = df.headercodes.str.contains(compiled('group', re.IGNORECASE))
 
 # All headers together
 isheader = isrowheader | isrowsubheader | isindentheader | iscolonheader | istableheader | istermheader | ismetaheader
@@ -177,9 +192,9 @@ isendofindent.loc[0] = False
 
 # ID tables with credit sums
 creditsumnames = [r'(\w+ )?total (program )?(credits|units|hours)( required)?:?']
-totalincode = df.code.str.fullmatch(listtopattern(creditsumnames), flags=re.IGNORECASE)
-totalintitle = df.title.str.fullmatch(listtopattern(creditsumnames), flags=re.IGNORECASE)
-alternatetotalmatch = df.title.str.fullmatch('total .+ (credits|units|hours)( required)?:?', flags=re.IGNORECASE)
+totalincode = df.code.str.fullmatch(compiled(listtopattern(creditsumnames), re.IGNORECASE))
+totalintitle = df.title.str.fullmatch(compiled(listtopattern(creditsumnames), re.IGNORECASE))
+alternatetotalmatch = df.title.str.fullmatch(compiled('total .+ (credits|units|hours)( required)?:?', re.IGNORECASE))
 creditsum_is_predefined = df.rowclass.isin(['listsum', 'plangridsum', 'plangridtotal'])
 
 iscreditssum = creditsum_is_predefined | totalincode | totalintitle | alternatetotalmatch
@@ -199,7 +214,7 @@ if (~df.containssum & isplangrid).any():                # Todo: Replace exceptio
 # Compare individual credits to program total credits
 contains_credits = df.credits.str.fullmatch(credit_pattern)
 varieswords = ['var(ies|iable)?.?']
-creditsvary = df.credits.str.fullmatch(listtopattern(varieswords), flags=re.IGNORECASE)
+creditsvary = df.credits.str.fullmatch(compiled(listtopattern(varieswords), re.IGNORECASE))
 df['maxcredits'] = df.credits.str.extract(maxcredit_pattern).iloc[:, 0].astype(float).fillna(0)
 df['mincredits'] = df.credits.str.extract(mincredit_pattern).iloc[:, 0].astype(float).fillna(0)
 
@@ -230,34 +245,28 @@ df.degreeflags = df.degreeflags + df.degreeflags.groupby(df.id).transform(lambda
 df.degreeflags = df.degreeflags + df.degreeflags.groupby(df.id).transform(lambda x: 'creditsvary '
                                                                           if not x[creditsvary].empty else '')
 
-# ID degree types       Todo: Clean this up so code isn't duplicated
-df.loc[df.degree.str.contains(r'\b(bachelor|major in|BA|BS|BM|BFA|BSN|BBA|BAS|BSME|BSRS|BSW|BME)\b',
-                              flags=re.IGNORECASE), 'degreetype'] = 'bachelor'
-df.loc[df.degree.str.contains(r'\b(associates?|AAS|AA|AS)\b', flags=re.IGNORECASE), 'degreetype'] = 'associate'
-df.loc[df.degree.str.contains(r'\b(certificate|PCT)\b', flags=re.IGNORECASE), 'degreetype'] = 'certificate'
-df.loc[df.degree.str.contains(r'\bminor\b', flags=re.IGNORECASE), 'degreetype'] = 'minor'
-df.loc[df.degree.str.contains(r'\b(masters?|MS|ME|MA|MAED|MSN|MPAS|MBA)\b', flags=re.IGNORECASE), 'degreetype'] = 'master'
-df.loc[df.degree.str.contains(r'\bdual degree\b', flags=re.IGNORECASE), 'degreetype'] = 'dual bachelor'
-df.loc[df.degree.str.contains(r'\b3\+2 \b', flags=re.IGNORECASE), 'degreetype'] = 'combined B&M'
-df.loc[df.degree.str.contains(r'\bp.?h.?d.?|doctor(ate)?\b', flags=re.IGNORECASE), 'degreetype'] = 'doctorate'
+# ID degree types (a later type wins when more than one matches)
+degreetype_res = {
+    'bachelor': compiled(r'\b(bachelor|major in|BA|BS|BM|BFA|BSN|BBA|BAS|BSME|BSRS|BSW|BME)\b', re.IGNORECASE),
+    'associate': compiled(r'\b(associates?|AAS|AA|AS)\b', re.IGNORECASE),
+    'certificate': compiled(r'\b(certificate|PCT)\b', re.IGNORECASE),
+    'minor': compiled(r'\bminor\b', re.IGNORECASE),
+    'master': compiled(r'\b(masters?|MS|ME|MA|MAED|MSN|MPAS|MBA)\b', re.IGNORECASE),
+    'dual bachelor': compiled(r'\bdual degree\b', re.IGNORECASE),
+    'combined B&M': compiled(r'\b3\+2 \b', re.IGNORECASE),
+    'doctorate': compiled(r'\bp.?h.?d.?|doctor(ate)?\b', re.IGNORECASE)}
+for degreetype, degreetype_re in degreetype_res.items():
+    df.loc[df.degree.str.contains(degreetype_re), 'degreetype'] = degreetype
 
 # If no degree types were found in degree column, look in the headertext
 if df.degreetype.isna().all():
-    df.loc[df.headertext.str.contains(r'\b(bachelor|major in|BA|BS|BM|BFA|BSN|BBA|BAS|BSME|BSRS|BSW|BME)\b',
-                                      flags=re.IGNORECASE), 'degreetype'] = 'bachelor'
-    df.loc[df.headertext.str.contains(r'\b(associates?|AAS|AA|AS)\b', flags=re.IGNORECASE), 'degreetype'] = 'associate'
-    df.loc[df.headertext.str.contains(r'\b(certificate|PCT)\b', flags=re.IGNORECASE), 'degreetype'] = 'certificate'
-    df.loc[df.headertext.str.contains(r'\bminor\b', flags=re.IGNORECASE), 'degreetype'] = 'minor'
-    df.loc[df.headertext.str.contains(r'\b(masters?|MS|ME|MA|MAED|MSN|MPAS|MBA)\b',
-                                      flags=re.IGNORECASE), 'degreetype'] = 'master'
-    df.loc[df.headertext.str.contains(r'\bdual degree\b', flags=re.IGNORECASE), 'degreetype'] = 'dual bachelor'
-    df.loc[df.headertext.str.contains(r'\b3\+2 \b', flags=re.IGNORECASE), 'degreetype'] = 'combined B&M'
-    df.loc[df.headertext.str.contains(r'\bp.?h.?d.?|doctor(ate)?\b', flags=re.IGNORECASE), 'degreetype'] = 'doctorate'
+    for degreetype, degreetype_re in degreetype_res.items():
+        df.loc[df.headertext.str.contains(degreetype_re), 'degreetype'] = degreetype
 df.loc[df.degree.eq('GENEDS'), 'degreetype'] = 'GENEDS'
 if df.degreetype.isna().any():
     print(df.degree[df.degreetype.isna()].unique())
-    print('Ignore these unidentified degrees? (y/n)')
-    if input() != 'y':
+    if not decide('ignore_unidentified_degrees', 'Ignore these unidentified degrees?',
+                  df.degree[df.degreetype.isna()].unique()):
         raise Exception('Terminated by User')
 
 # Determine if there are multiple tracks for the same degree
@@ -368,7 +377,7 @@ df['metagroup'] = ismetaheader.cumsum()
 df.loc[~ismetaheader.groupby(df.metagroup).transform('first').fillna(False), 'metagroup'] = np.NaN
 if not df.loc[df.groupby('metagroup').code.transform('count') < 2, 'metagroup'].empty:
     raise Exception('theres a metagroup with no groups')
-groupwordspresent = df.codecopy.str.findall(listtopattern(groupwords), flags=re.IGNORECASE)
+groupwordspresent = df.codecopy.str.findall(compiled(listtopattern(groupwords), re.IGNORECASE))
 groupwordspresent = groupwordspresent.apply(lambda x: list(set([string.rstrip('s').lower() for string in x])))
 metaheadergroupname = groupwordspresent.groupby(df.metagroup).transform('first')
 metaheadergroupname[metaheadergroupname.isna()] = pd.Series(
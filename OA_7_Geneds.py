@@ -7,23 +7,20 @@ are associated with the correct tables (these broken fragments are surprisingly
 The input is the dataframe from series 6 and the output is a dataframe containing the unorganized reference tables. The
 output must then be run through script 6 again before moving on to script 8 (not ideal but works for now).
 
-Chrome browser is required as a dependency.
+Pages are downloaded concurrently without a browser (see pagefetcher.py). Chrome browser is still required as a
+dependency for catalogs whose pages can't be downloaded without one.
 """
 
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from webdriver_manager.chrome import ChromeDriverManager
-import time
+from pagefetcher import iter_page_sources
+from crawljournal import load_journal, append_journal, quarantine, finish_journal
+from pageparser import parse_only, has_fragment_context, is_kept, header_tags
+from tableextractor import extract_tables
 from bs4 import BeautifulSoup as bs
 from thefuzz import process
 from thefuzz import fuzz
 import re
-import unicodedata
 
-tablerowhtml_re = re.compile(r'<tr.+?</tr>', flags=re.DOTALL)
-tablerowclass_pattern = '(?:class=")([^ "]*)'
-'(?<=class=")(.+?)(?=")'
 degreedf = pd.read_pickle('degreesorganized.pkl')
 
 baseurl = degreedf.link[0][:degreedf.link[0].index('.edu')+4]
@@ -37,53 +34,81 @@ degreedf.loc[startswithhash, 'links'] = degreedf.apply(lambda x: [x.pageurl + '/
 # List of all unique links
 alllinks = list(set([x for sublist in degreedf.links for x in sublist]))
 
-s = Service(ChromeDriverManager().install())
-driver = webdriver.Chrome(service=s)
-siblings = []
-linklist = []
-oldlinklist = []
-# Loop through each link, update it if broken, scrape page elements, and append relevant sibling elements
-for link in alllinks:
+# Links finished by an earlier run that crashed are taken from its journal (see crawljournal.py)
+urls = [link if '.edu' in link else baseurl+link for link in alllinks]
+journal = load_journal('degreetables.pkl')
+remaining = [i for i, url in enumerate(urls) if url not in journal]
+
+
+def find_group_header(soup, url, link):
+    """Finds the header of the group of requirements that a url fragment points to.
+
+    :param soup: Soup of the linked page (just the page content and named elements, or the whole page)
+    :param url: The link's full url
+    :param link: The link
+    :return: The link (with its fragment fixed if it was broken) and the group header, or None if the header can't be
+        found from the parsed part of the page (see pageparser.py)
+    """
+    groupheaderid = url[url.rindex('#')+1:]
+    linkdirectory = link[:link.rindex('#')+1]
+    headerchild = soup.find(None, {'name': groupheaderid})
+    # Fix broken links (links to right page but wrong fragment)
+    if headerchild is None:      # Means link is broken
+        # Get a list of all 'a' tags (links)
+        taglist = [tag['name'] for tag in soup.select('a[name]')]
+        # Find matches using fuzzy matching (not ideal but works in lieu of more advanced NLP)
+        match = process.extract(groupheaderid, taglist, scorer=fuzz.token_set_ratio, limit=1)
+        if match[0][1] >= 60:        # This can be tweaked but 60 seems to provide very good results
+            fixedheaderid = match[0][0]
+            link = linkdirectory + fixedheaderid
+            headerchild = soup.find(None, {'name': fixedheaderid})
+        else:
+            raise Exception('Cant find a good match for the url fragment')
+
+    # Figure out whether the group header is in the element or in one of it's next siblings (elements above the parsed
+    # part of the page aren't in the soup)
+    if not is_kept(soup, headerchild):
+        return None
+    groupheader = headerchild.parent
+    if groupheader.name not in header_tags:
+        if not is_kept(soup, groupheader):
+            return None
+        groupheader = headerchild.parent.parent
+        if groupheader.name not in header_tags:
+            if not is_kept(soup, groupheader):
+                return None
+            groupheader = headerchild.parent.parent.parent
+            if groupheader.name not in header_tags:
+                groupheader = headerchild.nextSibling
+                if groupheader.name not in header_tags:
+                    groupheader = headerchild.nextSibling.nextSibling
+                    if groupheader.name not in header_tags:
+                        raise Exception('Cant find header associated with fragment')
+    if not is_kept(soup, groupheader):
+        return None
+    return link, groupheader
+
+
+def link_siblings(link, url, sitehtml):
+    """Returns the elements of the group of requirements a link points to, along with the link (fixed if it was broken)
+
+    :param link: The link
+    :param url: The link's full url
+    :param sitehtml: The html of the linked page
+    :return: Lists of the html of each element, its fixed link, and its original link
+    """
+    siblings = []
+    linklist = []
+    oldlinklist = []
     oldlink = link
-    if '.edu' in link:
-        url = link
-    else:
-        url = baseurl+link
-    driver.get(url)
-    driver.execute_script(
-        "window.scrollTo(0, document.body.scrollHeight);var lenOfPage=document.body.scrollHeight;return lenOfPage;")
-    time.sleep(.3)
-    sitehtml = driver.page_source
-    soup = bs(sitehtml, features='lxml')
-    # Get a list of all 'a' tags (links)
-    taglist = [tag['name'] for tag in soup.select('a[name]')]
     if '#' in url:    # Hashtag indicates a fragment
-        groupheaderid = url[url.rindex('#')+1:]
-        linkdirectory = link[:link.rindex('#')+1]
-        headerchild = soup.find(None, {'name': groupheaderid})
-        # Fix broken links (links to right page but wrong fragment)
-        if headerchild is None:      # Means link is broken
-            # Find matches using fuzzy matching (not ideal but works in lieu of more advanced NLP)
-            match = process.extract(groupheaderid, taglist, scorer=fuzz.token_set_ratio, limit=1)
-            if match[0][1] >= 60:        # This can be tweaked but 60 seems to provide very good results
-                fixedheaderid = match[0][0]
-                link = linkdirectory + fixedheaderid
-                headerchild = soup.find(None, {'name': fixedheaderid})
-            else:
-                raise Exception('Cant find a good match for the url fragment')
-
-        # Figure out whether the group header is in the element or in one of it's next siblings
-        groupheader = headerchild.parent
-        if groupheader.name not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-            groupheader = headerchild.parent.parent
-            if groupheader.name not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                groupheader = headerchild.parent.parent.parent
-                if groupheader.name not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    groupheader = headerchild.nextSibling
-                    if groupheader.name not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                        groupheader = headerchild.nextSibling.nextSibling
-                        if groupheader.name not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                            raise Exception('Cant find header associated with fragment')
+        # Parse just the page content and named elements, unless the group header is outside of them
+        found = find_group_header(parse_only(sitehtml, has_fragment_context), url, link)
+        if found is None:
+            found = find_group_header(bs(sitehtml, features='lxml'), url, link)
+            if found is None:
+                raise Exception('Cant find header associated with fragment')
+        link, groupheader = found
         siblings.append(str(groupheader))           # Groupheader is the first sibling element
         linklist.append(link)                       # Linklist contains the fixed links
         oldlinklist.append(oldlink)                 # Oldlinklist contains the original links
@@ -91,14 +116,14 @@ for link in alllinks:
         for sibling in groupheader.next_siblings:
             if sibling.name is None:
                 continue
-            if sibling.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
+            if sibling.name in header_tags:
                 if int(sibling.name[1]) <= headerlevel:     # If you reach a lower-level header, no more siblings exist
                     break
             elif sibling.name == 'div':                     # Drill down into div to get more sub-elements
                 for child in sibling.children:
                     if child.name is None:
                         continue
-                    if child.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
+                    if child.name in header_tags:
                         if int(sibling.name[1]) <= headerlevel:
                             break
                     elif child.nam == 'div':
@@ -110,7 +135,31 @@ for link in alllinks:
                 siblings.append(str(sibling))
                 linklist.append(link)
                 oldlinklist.append(oldlink)
-driver.close()
+    return siblings, linklist, oldlinklist
+
+
+# Loop through each linked page as soon as it's downloaded, update the link if broken, scrape page elements, and append
+# relevant sibling elements (links whose page can't be downloaded or processed are quarantined, see crawljournal.py)
+linkelements = {url: journal[url] for url in urls if url in journal}
+for position, sitehtml, error in iter_page_sources([urls[i] for i in remaining], 'page_content', '.page_content'):
+    i = remaining[position]
+    if error is not None:       # The page couldn't be rendered or isn't in the page cache (offline mode)
+        quarantine('degreetables.pkl', urls[i], error)
+        continue
+    try:
+        linkelements[urls[i]] = link_siblings(alllinks[i], urls[i], sitehtml)
+    except Exception as e:
+        quarantine('degreetables.pkl', urls[i], e)
+        continue
+    append_journal('degreetables.pkl', urls[i], linkelements[urls[i]])
+siblings = []
+linklist = []
+oldlinklist = []
+for url in urls:
+    if url in linkelements:
+        siblings += linkelements[url][0]
+        linklist += linkelements[url][1]
+        oldlinklist += linkelements[url][2]
 
 # Make a dataframe of these elements and links and organize/clean up
 df = pd.DataFrame({'flink': linklist, 'oldlink': oldlinklist, 'html': siblings})        # 'flink' is fragment link
@@ -122,39 +171,12 @@ if not df.empty:
     df = df[df.groupby('flink').htmlclass.transform(lambda x: (x == 'sc_courselist').any())]
     df = df[df.htmlclass.eq('sc_courselist')]
 
-    tablesseries = df.html.apply(lambda x: pd.read_html(x)[0])      # Unpack tables into an exploded series
-    tablesseries.rename('tables', inplace=True)
-    tablesseries = tablesseries.apply(lambda x: x.fillna(''))
-    tablesseries = tablesseries.apply(lambda x: x.applymap(lambda y: unicodedata.normalize('NFKC', str(y).strip(' \n')).
-                                                           encode('ascii', 'ignore').decode('utf-8')))
-    # Mark current rows as not being a table header, then move column index to row and mark those as table headers
-    tablesseries = tablesseries.apply(lambda x: x.assign(headerflag=False))
-    tablesseries = tablesseries.apply(lambda x: x.T.reset_index().T.reset_index(drop=True))
-    tablesseries.apply(lambda x: x.insert(2, "coregroup", '') if len(x.columns) == 4 else None)
-    tablesseries.apply(lambda x: x.set_axis(['code', 'title', 'coregroup', 'credits', 'headerflag'], axis=1,
-                                            inplace=True))
-    tablesseries = tablesseries.apply(lambda x: x.assign(headerflag=x.headerflag.ne(False), axis=1))
-    tabledf = pd.concat([tablesseries, df], axis=1)
-
-    # Assign ID's for each unique link (not oldlink) starting at 9000 (so they are distinct to requirement df id's)
-    tabledf = tabledf.sort_values(by='flink')
-    istoprow = pd.Series([False]*len(tabledf))
-    istoprow.index = tabledf.index
-    istoprow.loc[tabledf.flink.groupby(df.flink).head(1).index] = True
-    tabledf['id'] = istoprow.cumsum() + 9000
-    tabledf = tabledf.assign(id=list(range(len(df))))  # id is a unique number for each table
-
-    # Broadcast tablewide info to tabledf
-    tabledf.tables = tabledf.apply(lambda x: x.tables.assign(flink=x.flink), axis=1)
-    tabledf.tables = tabledf.apply(lambda x: x.tables.assign(headertext=x.oldlink), axis=1)  # Todo: Fix this workaround
-    tabledf.tables = tabledf.apply(lambda x: x.tables.assign(id=x.id), axis=1)
-    # Convert entire table html into html of individual rows
-    tabledf.tables = tabledf.apply(lambda x: x.tables.assign(
-        html=[''] * (len(x.tables) - len(tablerowhtml_re.findall(x.html))) + tablerowhtml_re.findall(x.html)), axis=1)
-    tabledf.tables = tabledf.apply(lambda x: x.tables.assign(rowclass=x.tables.html.str.extract(tablerowclass_pattern)),
-                                   axis=1)
-    # Convert series containing dataframes into one big dataframe and clean up
-    geneddf = pd.concat(tabledf.tables.to_list())
+    # Assign ID's for each table, sorted by link (not oldlink)
+    df = df.sort_values(by='flink')
+    # Convert the tables straight into one long dataframe with a row for each table row (see tableextractor.py)
+    geneddf = extract_tables(df.html.to_list(), {
+        'flink': df.flink.to_list(), 'headertext': df.oldlink.to_list(),     # Todo: Fix this workaround
+        'id': list(range(len(df)))})   # id is a unique number for each table
     # Make id unique from degree df id's
     geneddf.id = geneddf.id + 9000
 
@@ -175,4 +197,5 @@ olddf = pd.read_pickle('degreesorganized.pkl')
 olddf.to_pickle('actualdegreesorganized.pkl')
 # Save as degreetable
 geneddf.to_pickle('degreetables.pkl')
+finish_journal('degreetables.pkl')
 
@@ -64,7 +64,7 @@ from verticalprinter import v
 import re
 import os
 import numpy as np
-from listtopattern import listtopattern
+from listtopattern import listtopattern, listtotrie, compiled
 import pandas as pd
 import json
 from thefuzz import fuzz
@@ -78,6 +78,8 @@ pd.set_option('display.max_columns', 10)
 
 # Path to SQL database config file (update to match your own path)
 config_path = "C:\config_files\settings.json"
+push_to_sql = os.environ.get('OA_PUSH_SQL', '1') == '1'    # Triage runs don't push their samples (OA_0_TriageDriver.py)
+save_parse_stats = os.environ.get('OA_PARSE_STATS') == '1'     # Only triage runs save them (OA_0_TriageDriver.py)
 
 df = pd.read_pickle('actualdegreesorganized.pkl')           # Output from first run of script 6
 coursedf = pd.read_pickle('courses.pkl')                    # Output from script 5
@@ -105,12 +107,12 @@ df.codecopy = df.codecopy.str.replace('<.>', '', regex=True)
 # Link elective tables to their degree plans
 df['tableheader'] = df.headertext.apply(lambda x: x[x.rindex(' : ') + 3:].strip() if ' : ' in x else x)
 df.tableheader = df.tableheader.str.replace('<..?>|[(][^()]*[)]', '', regex=True)  # Remove superscripts and parentheses
-df.tableheader = df.tableheader.str.replace(r'\b((select |choose )?\d\d? )?credits?\b', '',
-                                            regex=True, flags=re.IGNORECASE)  # Remove credit requirements too
+df.tableheader = df.tableheader.str.replace(compiled(r'\b((select |choose )?\d\d? )?credits?\b', re.IGNORECASE), '',
+                                            regex=True)  # Remove credit requirements too
 # Cleancode is the original plaintext without redundancies or other superlatives that may interfere with name matching
 df['cleancode'] = df.codecopy.str.replace('<..?>|[(][^()]*[)]', '', regex=True)
 not_names_pattern = r'\b((see )?(lists? |electives? |groups? |courses? |requirements? |listed |see )below)|((select |choose )?\d\d? )?credits?\b'
-df.cleancode = df.cleancode.str.replace(not_names_pattern, '', regex=True, flags=re.IGNORECASE)
+df.cleancode = df.cleancode.str.replace(compiled(not_names_pattern, re.IGNORECASE), '', regex=True)
 df['cleancodecopy'] = df.codecopy
 df['matchscore'] = 0
 
@@ -147,7 +149,7 @@ gdf = pd.DataFrame()
 gdf = gdf.append({'group': 'electives', 'id': '_0000_', 'code': np.nan}, ignore_index=True)
 # Fix variations of electives
 electivewords = [r'((department )?approved |selected |required |free |general )?electives?( or \w+\Z)?']
-df.cleancode = df.cleancode.str.replace(listtopattern(electivewords), 'electives', regex=True, flags=re.IGNORECASE)
+df.cleancode = df.cleancode.str.replace(compiled(listtopattern(electivewords), re.IGNORECASE), 'electives', regex=True)
 df.loc[df.cleancode.str.fullmatch('electives'), 'unknownreq'] = False
 df.loc[df.cleancode.str.fullmatch('electives'), 'code'] = '_0000_'
 df.loc[df.cleancode.str.fullmatch('electives'), 'cleancode'] = '_0000_'
@@ -157,7 +159,8 @@ df.cleancode = df.cleancode.str.replace(r'([*][*][*][*]?|XXXX?|xxxx?|____?)', r'
 df.cleancode = df.cleancode.str.replace(r'(\d)(?:\*\*\*?|XXX?|xxx?|___?)', r'_cnum_\1xxx_', regex=True)
 # Standardize general department code requirements (e.g. MAT _cnum_3xxx_ --> _dept_MAT_ _cnum_3xxx_)
 departmentlist = coursedf.dept.unique().tolist()
-df.cleancode = df.cleancode.str.replace(listtopattern(departmentlist), r'_dept_\1_', regex=True)
+department_re = compiled(r'\b(' + listtotrie(departmentlist) + r')\b')
+df.cleancode = df.cleancode.str.replace(department_re, r'_dept_\1_', regex=True)
 # Combine general depts and nums (e.g. _dept_MAT_ _cnum_3xxx_ --> _MAT_3xxx_)
 df.cleancode = df.cleancode.str.replace(r'\b_dept_([A-Z]+)_ ?-? ?_cnum_([x\d]+)_\b', r'_\1_\2_', regex=True)
 gencode_pattern = r'\b_[A-Z]+_[x\d]+_\b'
@@ -273,6 +276,10 @@ totalheaderreqs = sum(df.headerlevel.notna() & df.headercodes.ne(''))
 # Calculate ratio of unknown requirements
 totalunknowns = sum(df.unknownreq)
 unknownratio = totalunknowns/totalreqs
+# Save whether each requirement is unknown so the parse rate can be projected from a sample (see OA_0_TriageDriver.py)
+if save_parse_stats:
+    df.loc[df.headerlevel.isna(), ['link', 'unknownreq']].rename(columns={'unknownreq': 'unknown'}).to_pickle(
+        'degreeparsestats.pkl')
 
 df = df.reset_index(drop=True)
 
@@ -338,7 +345,7 @@ df = df[['tableclass', 'track', 'link', 'code', 'superscripts', 'degreeflags', '
          'maxdegreecredits', 'mindegreecredits', 'id']]
 with open('schoolname.json') as infile:
     schoolname = json.load(infile)
-schooldirectory = 'Output_dataframes/' + schoolname
+schooldirectory = os.path.join(os.environ.get('OA_OUTPUT_DIR', 'Output_dataframes'), schoolname)
 if os.path.isfile(schooldirectory + '/degreesserialized.pkl'):
     os.remove(schooldirectory + '/degreesserialized.pkl')
 df.to_pickle(schooldirectory + '/degreesserialized.pkl')
@@ -349,15 +356,16 @@ df.to_pickle('degreesserialized.pkl')
 gdf.to_pickle('groupsserialized.pkl')
 
 # Push to PostgreSQL Amazon RDB
-with open(config_path) as infile:
-    sql_config = json.load(infile)
-connection = sqlalchemy.create_engine(sql_config)
+if push_to_sql:
+    with open(config_path) as infile:
+        sql_config = json.load(infile)
+    connection = sqlalchemy.create_engine(sql_config)
 
-df.to_sql(schoolname + '_df', con=connection, index=False, if_exists='replace')
-gdf.to_sql(schoolname + '_gdf', con=connection, index=False, if_exists='replace')
+    df.to_sql(schoolname + '_df', con=connection, index=False, if_exists='replace')
+    gdf.to_sql(schoolname + '_gdf', con=connection, index=False, if_exists='replace')
 
 # Print out 10 random degree requirements / elective tables
-v(df.loc[sorted(sample(df.index.to_list(), k=10))])
+v(df.loc[sorted(sample(df.index.to_list(), k=min(10, len(df))))])
 print(str(totalreqs) + ' total degree requirements')
 print(str(totalreqs - totalunknowns) + ' degree requirements parsed (' + str(round((1-unknownratio) * 100, 2)) + ')%')
 
@@ -0,0 +1,129 @@
+""" Benchmark of the course description text conversion in script 2 (see coursetext.py).
+
+Converts the elements of course blocks (split at '<br/><strong>' the same way script 2 splits them) with both html2text
+and coursetext.element_plaintext, checks that every element gets identical text, and times both. The blocks are the
+courseblock snippets below, taken from CourseLeaf catalogs (paragraphs, nested inline tags, entities, lists, and inline
+styles), followed by synthetic blocks that mix the markup found in course blocks with text that html2text treats
+specially (entities, runs of whitespace, and text that looks like markdown lists or escapes), plus markup that has to
+fall back to html2text (lists, tables, <pre>).
+
+Usage:
+    python benchmark_coursetext.py
+"""
+
+import time
+import random
+import unicodedata
+import html2text
+from bs4 import BeautifulSoup as bs
+import coursetext
+
+blocks = 5000       # Number of synthetic course blocks
+courseblocks = [
+    '''<div class="courseblock">
+<p class="courseblocktitle noindent"><strong>ACCT&#160;2010  Principles of Financial Accounting  (3 Credits)  </strong></p>
+<p class="courseblockdesc noindent">Introduces the accounting cycle &amp; the preparation of financial statements
+ for sole proprietorships and corporations.</p>
+<p class="courseblockextra noindent"><strong>Prerequisite(s):</strong> <a href="/search/?P=MATH%201050" title="MATH&#160;1050" class="bubblelink code" onclick="return showCourse(this, 'MATH 1050');">MATH&#160;1050</a> or <a href="/search/?P=MATH%201070" title="MATH&#160;1070" class="bubblelink code">MATH&#160;1070</a> with a grade of C&#8211; or better.</p>
+</div>''',
+    '''<div class="courseblock">
+<p class="courseblocktitle"><strong><span class="text courseblockcode">BIOL 1610</span> <span class="text courseblocktitle">
+College Biology I</span> <span class="text courseblockhours">4 Units</span></strong></p>
+<p class="courseblockdesc">Covers cells, genetics &mdash; and evolution.<br/><strong>Lecture/Lab:</strong> 3/3<br/>
+<strong>Prerequisite:</strong> <strong><em>Either</em></strong> <a href="/search/?P=CHEM%201110" class="bubblelink code">CHEM&nbsp;1110</a>
+ or placement.<br/><strong>Typically Offered:</strong> Fall,  Spring &amp; Summer.</p>
+</div>''',
+    '''<div class="courseblock">
+<p class="courseblocktitle"><strong>CS 3500. Software Practice. 4 Hours.</strong></p>
+<p class="courseblockdesc">Practical software engineering: <em>testing</em>, version control,
+ and teamwork.&nbsp; Students will:</p>
+<ul><li>1. design &amp; build a project;</li><li>- present it.</li></ul>
+<p class="courseblockextra"><strong>Enrollment Requirement:</strong> &lsquo;C&rsquo; or better in <a href="/search/?P=CS%202420">CS 2420</a>
+ &amp; <a href="/search/?P=CS%202100">CS 2100</a>.</p>
+</div>''',
+    '''<div class="courseblock">
+<p class="courseblocktitle"><strong>HIST&#160;1700.  American Civilization.  3 Credit Hours.</strong></p>
+<p class="courseblockdesc">Surveys U.S. history\u2014from colonization to the present.
+<span style="display:none">Hidden note</span></p>
+<div class="courseblockextra"><strong>Fulfills:</strong> <span class="courseblockattr"><a href="/gened/">AI</a>
+ &#x2022; <a href="/gened/#hf">HF</a></span></div>
+<p class="courseblockextra"><strong>Grading Basis:</strong> Graded<br/><strong>Repeatable:</strong> No<br/>
+<strong>Notes:</strong> 2. Not open to students with credit for HIST 2700 &amp; 2710.</p>
+</div>''',
+]
+words = ['Prerequisite:', 'MATH 101', 'or', 'CS&amp;E 2', '3 Units.', '1. ', '- ', '+ ', '2.5', '\\', '\\_', '&lt;b&gt;',
+         '&#160;', '&nbsp;', '&rsquo;', '&copy;', '&#x41;', '&eacute;', 'caf\xe9', '\xa0', '\n', '  ', '\t', '*', '#',
+         '[1]', '(see below)', '-- ', '\n- ', '\n1. x', 'Fall,\n Spring']
+inline = ['strong', 'b', 'em', 'a', 'span', 'sup']
+
+
+def make_inline(depth=0):
+    """Returns text in an inline tag (sometimes nested in another one)"""
+    tag = random.choice(inline)
+    attrs = ' href="/search/?P=MATH%20101" title="MATH 101"' if tag == 'a' else ''
+    text = make_inline(depth + 1) if depth < 2 and random.random() < 0.3 else random.choice(words)
+    return '<' + tag + attrs + '>' + text + '</' + tag + '>'
+
+
+def make_text():
+    """Returns random text with entities and inline tags"""
+    parts = []
+    for _ in range(random.randint(1, 8)):
+        if random.random() < 0.2:
+            parts.append(make_inline())
+        elif random.random() < 0.05:
+            parts.append('<br/>')
+        else:
+            parts.append(random.choice(words))
+    return ''.join(parts)
+
+
+def make_block():
+    """Returns the html of a course block"""
+    block = '<div class="courseblock">\n<p class="courseblocktitle"><strong>' + make_text() + '</strong></p>\n'
+    block += '<p class="courseblockdesc">' + make_text() + '<br/><strong>' + make_text() + '</strong> ' + \
+             make_text() + '</p>\n'
+    if random.random() < 0.02:      # Markup that needs html2text
+        block += random.choice(['<ul><li>' + make_text() + '</li></ul>', '<table><tr><td>a</td><td>b</td></tr></table>',
+                                '<pre>' + make_text() + '</pre>', '<p><!-- note -->' + make_text() + '</p>'])
+    block += '<div class="courseblockextra">' + make_text() + '</div>\n</div>'
+    return block
+
+
+def original_plaintexts(htmls):
+    """The original conversion (html2text on every element)"""
+    h2t = html2text.HTML2Text()
+    h2t.ignore_links = True
+    h2t.ignore_emphasis = True
+    h2t.body_width = 0
+    return [unicodedata.normalize('NFKC', h2t.handle(x)).strip('\n') for x in htmls]
+
+
+def separate_plaintexts(htmls):
+    """html2text on each element with a new converter (the original one converter carries state from some elements,
+    e.g. tables, into the next one, which coursetext doesn't)"""
+    return [original_plaintexts([x])[0] for x in htmls]
+
+
+if __name__ == '__main__':
+    random.seed(0)
+    soup = bs('\n'.join(courseblocks + [make_block() for _ in range(blocks)]), 'html.parser')
+    htmls = [html for block in soup.find_all('div', {'class': 'courseblock'}) for element in block.children
+             if element != '\n' for html in str(element).split('<br/><strong>')]
+
+    start = time.perf_counter()
+    original = original_plaintexts(htmls)
+    originaltime = time.perf_counter() - start
+    expected = separate_plaintexts(htmls)
+    start = time.perf_counter()
+    result = [coursetext.element_plaintext(x) for x in htmls]
+    newtime = time.perf_counter() - start
+
+    for html, text, expectedtext in zip(htmls, result, expected):
+        if text != expectedtext:
+            raise Exception('Text differs for ' + repr(html) + ':\n' + repr(text) + '\n' + repr(expectedtext))
+    fallbacks = sum(coursetext.tokenize(x) is None for x in htmls)
+    carried = sum(x != y for x, y in zip(original, expected))
+    print(str(len(htmls)) + ' elements identical (' + str(fallbacks) + ' converted with html2text, ' + str(carried) +
+          ' differed in the original from state carried over from the previous element)')
+    print(f'html2text: {originaltime:.2f} s  specialized: {newtime:.2f} s  speedup: {originaltime / newtime:.1f}x')
@@ -0,0 +1,88 @@
+""" Benchmark of the department code patterns of scripts 5, 6 and 8 (see listtopattern.listtotrie).
+
+Compares the trie-shaped pattern of the department codes against the original alternation of every code (longest
+first), on synthetic requisites with an increasing number of departments. Each pattern is used the way the scripts use
+cdept_pattern: joining the department and number of each course code (script 5), filling in implied departments in
+'or' lists (script 6), and marking general department requirements (script 8). Both patterns have to produce
+byte-identical output. Also checks the edge cases the trie has to match exactly (codes that are prefixes of other codes,
+codes that only match when a shorter one is tried, and the empty code).
+
+Usage:
+    python benchmark_departmentcodes.py
+"""
+
+import time
+import random
+import string
+import pandas as pd
+from listtopattern import listtononcapture, listtotrie
+
+department_counts = [30, 200, 800]
+courses = 20000
+cnum_pattern = '[0-9][0-9][0-9][A-Z]?'
+edge_cases = [(['MATH', 'MAT', 'MA', 'ME'], 'MATH151 or MAT 152, MA-153 and MATH 2 MEME154 MATHS155'),
+              (['AB', 'ABC', 'ABCD', 'B'], 'ABCD101 ABCE102 ABC103 ABB104 AB105 ABCDB106 B107'),
+              (['CS', 'CSE', ''], 'CS101 CSE102 103 CSX104 C105 or 106'),
+              (['A'], 'A101 AA102 A 103 or A-104')]
+
+
+def rewrite(reqs, cdept_pattern):
+    """Rewrites the requisites with the department code pattern the way scripts 5, 6 and 8 use it"""
+    reqs = reqs.str.replace('(' + cdept_pattern + ') ?-? ?(' + cnum_pattern + ')', r'\1\2', regex=True)
+    reqs = reqs.str.replace(r'\b(' + cdept_pattern + ')(' + cnum_pattern + r')(,? or )(' + cnum_pattern + r')\b',
+                            r'\1\2\3\1\4', regex=True)
+    return reqs.str.replace(r'\b(' + cdept_pattern + r')\b', r'_dept_\1_', regex=True)
+
+
+def make_requisites(departments):
+    """Returns a series of random requisites that mention the departments' courses"""
+    words = ['junior standing', 'consent of instructor', 'or', 'and', 'grade of C or better in', ';']
+    reqs = []
+    for _ in range(courses):
+        items = []
+        for _ in range(random.randint(1, 6)):
+            chance = random.random()
+            if chance < 0.5:
+                items.append(random.choice(departments) + random.choice(['', ' ', '-', ' - ']) +
+                             str(random.randint(100, 499)))
+            elif chance < 0.6:
+                items.append(random.choice(departments))
+            else:
+                items.append(random.choice(words))
+        reqs.append(' '.join(items))
+    return pd.Series(reqs)
+
+
+def make_departments(count):
+    """Returns a list of random department codes of 2-6 letters"""
+    departments = set()
+    while len(departments) < count:
+        departments.add(''.join(random.choice(string.ascii_uppercase) for _ in range(random.randint(2, 6))))
+    return list(departments)
+
+
+def timed(reqs, cdept_pattern):
+    """Returns the rewritten requisites and how long it took in seconds"""
+    start = time.perf_counter()
+    result = rewrite(reqs, cdept_pattern)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    for departments, reqs in edge_cases:
+        expected = rewrite(pd.Series([reqs]), listtononcapture(departments))[0]
+        result = rewrite(pd.Series([reqs]), listtotrie(departments))[0]
+        if result != expected:
+            raise Exception('Output differs for ' + repr(reqs) + ': ' + repr(expected) + ' != ' + repr(result))
+    print(str(len(edge_cases)) + ' edge cases identical')
+
+    random.seed(0)
+    print('  departments  alternation (s)  trie (s)  speedup')
+    for count in department_counts:
+        departments = make_departments(count)
+        reqs = make_requisites(departments)
+        expected, originaltime = timed(reqs, listtononcapture(departments))
+        result, newtime = timed(reqs, listtotrie(departments))
+        if not result.equals(expected):
+            raise Exception(str(sum(result.ne(expected))) + ' of ' + str(len(reqs)) + ' requisites differ')
+        print(f'{count:>13}  {originaltime:>15.3f}  {newtime:>8.3f}  {originaltime / newtime:>7.1f}x')
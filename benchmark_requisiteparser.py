@@ -0,0 +1,187 @@
+""" Benchmark of the requisite parsing in script 5 (see requisiteparser.py).
+
+Compares the single-pass parser against the original approach, which split the groups by rewriting the whole column of
+requisites with regexes until it stopped changing (delimitersplit) and then filled in the requisite types and grades by
+scanning each requisite forwards and then reversed (heirarchical_fill), on synthetic requisites of increasing number.
+The requisites mix course codes, requisite and grade markers, conjunctions, delimiters, sentences, and nested brackets
+the way they look after script 5 standardizes their wording, and both approaches have to produce byte-identical output.
+Also checks the edge cases that the parser has to match exactly (trailing delimiters, conjunctions at the start of a
+group, markers followed by brackets, periods that don't end a sentence, etc.).
+
+Usage:
+    python benchmark_requisiteparser.py
+"""
+
+import re
+import time
+import random
+import pandas as pd
+from fixedpoint import rewrite_until_stable
+from requisiteparser import serialize_requisites
+
+ccode_pattern = '[A-Z][A-Z][A-Z][A-Z]?[0-9][0-9][0-9][A-Z]?'
+course_counts = [1000, 10000, 50000]
+edge_cases = ['_P_requisite MATH151 or MATH213 grade_C+_; _C_requisite MATH251.',
+              'MATH151, MATH213;', 'MATH151;. CS101', 'MATH151.. CS101', '. MATH151', ' .MATH151. ',
+              'Pre- or _C_requisite MATH151 or MATH213 and CS101.',
+              '_P_requisite MATH151 and _C_requisite MATH251 or _B_requisite CS101 grade_B-_',
+              '(MATH151)(or MATH213); or CS101, and CS102', '_P_requisite (MATH151 or (CS101 grade_C__)) and CS102',
+              '(_C_requisite (MATH151; CS101) grade_A-_, CS102) MATH213', 'junior standing _???_ MATH151; ??? CS101',
+              '_P_requisite _C_requisite MATH151 grade_C+_ grade_D-_ CS101', 'MATH151  ;  CS101 ,  CS102']
+words = ['MATH151', 'CS2270', 'BIO101L', 'junior standing', 'consent', '_???_', 'CHEM 1', 'Pre-']
+markers = ['_P_requisite', '_C_requisite', '_B_requisite']
+grades = ['grade_C+_', 'grade_C__', 'grade_B-_']
+separators = [' or ', ' and ', ', ', '; ', ' or ', ' and ', '  ', ' ', '. ', '.', ' _???_ ']
+
+
+def original_serialize_requisites(reqs):
+    """The original implementation (rewrites the whole column until it stops changing, then scans each requisite)"""
+    reqs = reqs.str.replace(r' ?([^.]+)\.?', r'{\1}', regex=True)
+    reqs = reqs.str.replace('}{', '} and {', regex=False)
+    reqs = reqs.str.replace('{', '(', regex=False)
+    reqs = reqs.str.replace('}', ')', regex=False)
+
+    def delimitersplit(reqs, delimiter_list, method):
+        def split_inner_parentheses(reqs):
+            for d in delimiter_list:
+                if method == 'keep':
+                    pattern1 = r'([({])([^{)(]+?)(' + d + ')(?=[^{(]*[)}])'
+                    pattern2 = r'} ([^})]+?)(' + d + ')'
+                    pattern3 = r'} ([^})]+?)([)}])'
+                else:
+                    pattern1 = r'([({])([^{)(' + d + r']+)()' + d + '(?=[^{(]*[)}])'
+                    pattern2 = r'} ([^})' + d + ']+)()(?:' + d + ')'
+                    pattern3 = r'} ([^})' + d + ']+)([)}])'
+                reqs = reqs.str.replace(pattern1, r'\1{\2}\3', regex=True)
+                reqs = rewrite_until_stable(reqs, lambda x: x.str.replace(pattern2, r'}{\1}\2', regex=True),
+                                            'delimitersplit middle delimiters')
+                reqs = reqs.str.replace(pattern3, r'}{\1}\2', regex=True)
+            reqs = reqs.str.replace(r'\(([^(]+?)\)', r'<\1>', regex=True)
+            reqs = reqs.str.replace(r'{', r'<', regex=True)
+            return reqs.str.replace(r'}', r'>', regex=True)
+
+        reqs = rewrite_until_stable(reqs, split_inner_parentheses, 'delimitersplit')
+        reqs = reqs.str.replace(r'<', r'(', regex=True)
+        reqs = reqs.str.replace(r'>', r')', regex=True)
+        return reqs.str.replace(r'\)\((or|and|\?\?\?) ', r') \1 (', regex=True)
+
+    def heirarchical_fill(string, method, classifierexample):
+        if not string:
+            return string
+        classifierlength = classifierexample.rindex('_') - classifierexample.index('_') - 1
+        taglength = len(classifierexample) - classifierlength - 2
+        if method == 'bfill':
+            tagname = classifierexample[:taglength][::-1]
+            string = string[::-1]
+            string = re.sub(r'\(', '`', string)
+            string = re.sub(r'\)', '(', string)
+            string = re.sub('`', ')', string)
+            ccode_pat = '[' + '['.join(ccode_pattern.split('[')[::-1])[:-1]
+        else:
+            tagname = classifierexample[classifierlength+2:]
+            ccode_pat = ccode_pattern
+        bracketindex = [i for i, x in enumerate(string) if x in ')(']
+        highestlevel = 10
+        reqtype = [classifierlength*'?' + '_']*highestlevel
+        level = 1
+        newstring = ''
+        for bracketi, bracketstart in enumerate(bracketindex[:-1]):
+            nextbracketstart = bracketindex[bracketi+1]
+            nextbracket = string[nextbracketstart]
+            bracketstring = string[bracketstart:nextbracketstart]
+            reqstarts = [x.start()+1 for x in re.finditer('_' + tagname, bracketstring)]
+            if reqstarts:
+                newstring += re.sub('(' + ccode_pat + ')', '_' + reqtype[level] + r'\1',
+                                    bracketstring[:reqstarts[0] - classifierlength-2])
+                for starti, start in enumerate(reqstarts):
+                    if start == reqstarts[-1]:
+                        reqstring = bracketstring[start + taglength + 1:]
+                    else:
+                        reqstring = bracketstring[start + taglength + 1:reqstarts[starti + 1] - classifierlength-2]
+                    if nextbracket == '(':
+                        reqtype[level:] = [bracketstring[start-(1+classifierlength):start]]*(highestlevel-level)
+                        newstring += re.sub('(' + ccode_pat + ')', '_' + reqtype[level] + r'\1', reqstring)
+                    else:
+                        newstring += re.sub('(' + ccode_pat + ')', '_' + bracketstring[start-classifierlength-1:start] +
+                                            r'\1', reqstring)
+            else:
+                newstring += re.sub('(' + ccode_pat + ')', '_' + reqtype[level] + r'\1', bracketstring)
+            if nextbracket == ')':
+                level -= 1
+                reqtype[level:] = [reqtype[level]] * (highestlevel - level)
+            else:
+                level += 1
+        newstring += ')'
+        if method == 'bfill':
+            newstring = newstring[::-1]
+            newstring = re.sub(r'\(', '`', newstring)
+            newstring = re.sub(r'\)', '(', newstring)
+            newstring = re.sub('`', ')', newstring)
+        return newstring
+
+    reqs = delimitersplit(reqs, [' and _[PCB]_requisite', ' or _[PCB]_requisite'], 'keep')
+    reqs = delimitersplit(reqs, [';', ','], 'delete')
+    reqs = reqs.apply(lambda x: heirarchical_fill(x, method='ffill', classifierexample='_P_requisite'))
+    return reqs.apply(lambda x: heirarchical_fill(x, method='bfill', classifierexample='grade_F-_'))
+
+
+def make_group(depth):
+    """Returns the requisites of a random group (with up to two levels of brackets inside it)"""
+    items = []
+    for _ in range(random.randint(1, 4)):
+        chance = random.random()
+        if chance < 0.15 and depth < 2:
+            item = '(' + make_group(depth + 1) + ')'
+        elif chance < 0.3:
+            item = random.choice(markers) + ' ' + random.choice(words)
+        else:
+            item = random.choice(words)
+        if random.random() < 0.15:
+            item += ' ' + random.choice(grades)
+        if random.random() < 0.05:
+            item = random.choice(['or ', 'and ', '??? ']) + item
+        items.append(item)
+    reqs = items[0]
+    for item in items[1:]:
+        reqs += random.choice(separators) + item
+    if random.random() < 0.1:
+        reqs += random.choice([';', ',', ' '])
+    return reqs
+
+
+def make_requisites(courses):
+    """Returns a series of random requisites (without brackets that only contain a period, which the original
+    implementation can't pair with the right closing bracket)"""
+    reqs = pd.Series([make_group(0) + random.choice(['', '.', '. ']) for _ in range(courses)])
+    return reqs[~reqs.str.contains(r'\( ?\.', regex=True) & ~reqs.str.contains(r'\.\)', regex=True)]
+
+
+def timed(func, reqs):
+    """Returns the result of func(reqs) and how long it took in seconds"""
+    start = time.perf_counter()
+    result = func(reqs)
+    return result, time.perf_counter() - start
+
+
+def parse_column(reqs):
+    """Parses a column of requisites the way script 5 does"""
+    return reqs.apply(serialize_requisites, args=(ccode_pattern,))
+
+
+if __name__ == '__main__':
+    expected = original_serialize_requisites(pd.Series(edge_cases))
+    result = parse_column(pd.Series(edge_cases))
+    for reqs, old, new in zip(edge_cases, expected, result):
+        if new != old:
+            raise Exception('Output differs for ' + repr(reqs) + ': ' + repr(old) + ' != ' + repr(new))
+    print(str(len(edge_cases)) + ' edge cases identical')
+
+    random.seed(0)
+    print('  courses  original (s)  single pass (s)  speedup')
+    for courses in course_counts:
+        reqs = make_requisites(courses)
+        expected, originaltime = timed(original_serialize_requisites, reqs)
+        result, newtime = timed(parse_column, reqs)
+        if not result.equals(expected):
+            raise Exception(str(sum(result.ne(expected))) + ' of ' + str(len(reqs)) + ' requisites differ')
+        print(f'{len(reqs):>9}  {originaltime:>12.3f}  {newtime:>15.3f}  {originaltime / newtime:>7.1f}x')
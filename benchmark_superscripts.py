@@ -0,0 +1,79 @@
+""" Benchmark of the superscript rewriting in script 3 (see degreepage.replace_superscripts).
+
+Compares the single-pass rewrite against the original approach, which re-scanned and re-copied the whole page once per
+superscript, on synthetic degree pages of increasing size (a four year plan grid with a superscript on most rows), and
+checks that both produce byte-identical output. Also checks the edge cases that the single pass has to match exactly
+(empty, nested, and multi-line superscripts, and superscripts containing backslashes or group references).
+
+Usage:
+    python benchmark_superscripts.py
+"""
+
+import re
+import time
+import random
+from degreepage import replace_superscripts
+
+page_sizes = [100, 1000, 5000, 20000]      # Number of superscripts per page
+edge_cases = ['<p>a<sup></sup>b<sup>1</sup>c<sup>2</sup></p>',
+              '<sup><a href="#f1">1</a></sup><sup>2</sup><sup>3</sup>',
+              '<sup>1\n</sup><sup>2</sup><sup>3</sup>',
+              '<sup>1,2 ,3</sup><sup>a b</sup><sup>&#160;</sup><sup> </sup>',
+              r'<sup>\g<0></sup><sup>2</sup>',
+              '<sup>1</sup><sup>2</sup></sup><sup>']
+
+
+def original_replace_superscripts(sitehtml):
+    """The original implementation (quadratic in the number of superscripts)"""
+    for superscript in re.findall(r'(?<=<sup>)[^<]+', sitehtml):
+        if ',' in superscript:  # For comma separated lists of superscripts
+            replacements = ' _SUPERSCRIPT_' + '_ _SUPERSCRIPT_'.join(re.findall(r'[^ ,]+', superscript)) + '_'
+            sitehtml = re.sub(r'<sup>.+?</sup>', replacements, sitehtml, count=1)
+        elif ' ' in superscript:  # For space separated lists of superscripts (this is rare)
+            replacements = ' _SUPERSCRIPT_' + '_ _SUPERSCRIPT_'.join(re.findall(r'[^ ]+', superscript)) + '_'
+            sitehtml = re.sub(r'<sup>.+?</sup>', replacements, sitehtml, count=1)
+        else:
+            sitehtml = re.sub(r'<sup>.+?</sup>', (' _SUPERSCRIPT_' + superscript + '_'), sitehtml, count=1)
+    return sitehtml
+
+
+def make_page(superscripts):
+    """Returns the html of a plan grid table with the given number of superscripts"""
+    rows = []
+    for i in range(superscripts):
+        sup = random.choice(['1', '2', '1,2', '3, 4', 'a b', '&#160;'])
+        rows.append('<tr class="even"><td class="codecol"><a href="/search/?P=CS%20' + str(i) + '">CS&#160;' + str(i) +
+                    '</a><sup>' + sup + '</sup></td><td>Course title</td><td class="hourscol">3</td></tr>\n')
+    return '<table class="sc_plangrid"><tbody>' + ''.join(rows) + '</tbody></table>'
+
+
+def timed(func, sitehtml):
+    """Returns the result of func(sitehtml) and how long it took in seconds"""
+    start = time.perf_counter()
+    result = func(sitehtml)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    for sitehtml in edge_cases:
+        for func in [original_replace_superscripts, replace_superscripts]:
+            try:
+                result = func(sitehtml)
+            except re.error as e:
+                result = 're.error: ' + str(e)
+            if func is original_replace_superscripts:
+                expected = result
+            elif result != expected:
+                raise Exception('Output differs for ' + repr(sitehtml))
+    print(str(len(edge_cases)) + ' edge cases identical')
+
+    random.seed(0)
+    print('superscripts  page size (kB)  original (s)  single pass (s)  speedup')
+    for superscripts in page_sizes:
+        sitehtml = make_page(superscripts)
+        expected, originaltime = timed(original_replace_superscripts, sitehtml)
+        result, newtime = timed(replace_superscripts, sitehtml)
+        if result != expected:
+            raise Exception('Output differs for a page with ' + str(superscripts) + ' superscripts')
+        print(f'{superscripts:>12}  {len(sitehtml) / 1000:>14.0f}  {originaltime:>12.3f}  {newtime:>15.4f}  '
+              f'{originaltime / newtime:>7.0f}x')
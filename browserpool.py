@@ -0,0 +1,181 @@
+"""Pool of long-lived headless Chrome sessions for the pages that truly need a browser.
+
+Sessions are started the first time they're needed and reused by every later call until the script exits. Each call
+to browser_imap or browser_map puts its URLs on a shared work queue that all the sessions pull from. browser_imap yields
+each result as soon as it's done and browser_map returns them in the same order as the input URLs. A URL that raises an
+exception doesn't stop the others; its exception is returned with it, so the caller can quarantine the page. The
+number of sessions defaults to the number of cores (up to 16) and can be changed with the OA_BROWSERS environment
+variable.
+
+Resolving the chromedriver executable with ChromeDriverManager is slow, so the resolved path is saved to
+chromedriver_path.json (next to this file) and reused by every script until the executable disappears.
+"""
+
+import os
+import json
+import queue
+import atexit
+import threading
+import ratelimiter
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions
+from selenium.common.exceptions import TimeoutException
+from webdriver_manager.chrome import ChromeDriverManager
+
+pool_size = int(os.environ.get('OA_BROWSERS', min(16, os.cpu_count() or 1)))
+ready_timeout = 10          # Seconds to wait for a page's content to appear
+driverpath_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chromedriver_path.json')
+
+_idledrivers = queue.LifoQueue()
+_alldrivers = []
+_lock = threading.Lock()
+_driverpath = None
+
+
+def chromedriver_path():
+    """Returns the path to the chromedriver executable (only runs ChromeDriverManager if no valid path is saved)"""
+    global _driverpath
+    with _lock:
+        if _driverpath is None and os.path.isfile(driverpath_file):
+            with open(driverpath_file) as infile:
+                _driverpath = json.load(infile)
+        if _driverpath is None or not os.path.isfile(_driverpath):
+            _driverpath = ChromeDriverManager().install()
+            with open(driverpath_file, 'w') as outfile:
+                json.dump(_driverpath, outfile)
+        return _driverpath
+
+
+def new_driver():
+    """Starts a new headless Chrome session"""
+    options = webdriver.ChromeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    return webdriver.Chrome(service=Service(chromedriver_path()), options=options)
+
+
+def _take_driver():
+    """Returns an idle Chrome session, starting a new one if they're all busy"""
+    try:
+        return _idledrivers.get_nowait()
+    except queue.Empty:
+        driver = new_driver()
+        with _lock:
+            _alldrivers.append(driver)
+        return driver
+
+
+def wait_until_ready(driver, ready_selector=None):
+    """Waits until the page has finished loading and, if given, an element matching the css selector is present.
+
+    Pages that never show the selector (e.g. a department without any courses) are returned after ready_timeout.
+    """
+    WebDriverWait(driver, ready_timeout).until(
+        lambda x: x.execute_script('return document.readyState') == 'complete')
+    if ready_selector:
+        try:
+            WebDriverWait(driver, ready_timeout).until(
+                expected_conditions.presence_of_element_located((By.CSS_SELECTOR, ready_selector)))
+        except TimeoutException:
+            pass
+
+
+def load_page(driver, url, ready_selector=None):
+    """Loads a page in a Chrome session (within the host's rate limit) and returns its page source"""
+    def load(url):
+        driver.get(url)
+        driver.execute_script(
+            "window.scrollTo(0, document.body.scrollHeight);var lenOfPage=document.body.scrollHeight;return lenOfPage;")
+        wait_until_ready(driver, ready_selector)
+        return driver.page_source
+    return ratelimiter.call(url, load)
+
+
+def browser_imap(func, urls, size=None):
+    """Calls func(driver, url) on every url using the pool of Chrome sessions, yielding each result when it's done.
+
+    A url whose call raises an exception doesn't stop the rest, and its exception is yielded in place of its result.
+
+    :param func: Function that takes a Chrome session and a URL (e.g. load_page)
+    :param urls: Iterable of URLs
+    :param size: Maximum number of sessions to use (defaults to pool_size)
+    :return: Generator of (position in urls, result, exception) tuples (the exception is None if the call succeeded)
+    """
+    urls = list(urls)
+    workqueue = queue.Queue()
+    for i, url in enumerate(urls):
+        workqueue.put((i, url))
+    resultqueue = queue.Queue()
+
+    def worker():
+        try:
+            driver = _take_driver()
+        except Exception as e:
+            resultqueue.put(e)          # The session couldn't be started
+            return
+        try:
+            while True:
+                try:
+                    i, url = workqueue.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    resultqueue.put((i, func(driver, url), None))
+                except Exception as e:
+                    resultqueue.put((i, None, e))
+        finally:
+            _idledrivers.put(driver)
+            resultqueue.put(None)
+
+    threads = [threading.Thread(target=worker) for _ in range(min(size or pool_size, len(urls)))]
+    for thread in threads:
+        thread.start()
+    running = len(threads)
+    startuperror = None
+    while running:
+        result = resultqueue.get()
+        if result is None or isinstance(result, Exception):
+            running -= 1
+            startuperror = result or startuperror
+        else:
+            yield result
+    # Urls left over because none of the sessions could be started
+    while not workqueue.empty():
+        i, url = workqueue.get_nowait()
+        yield i, None, startuperror
+
+
+def browser_map(func, urls, size=None):
+    """Calls func(driver, url) on every url using the pool of Chrome sessions (see browser_imap).
+
+    :param func: Function that takes a Chrome session and a URL (e.g. load_page)
+    :param urls: Iterable of URLs
+    :param size: Maximum number of sessions to use (defaults to pool_size)
+    :return: Lists of the function's results and the exception each call raised (None if it didn't) in the same order
+        as urls
+    """
+    urls = list(urls)
+    results = [None]*len(urls)
+    errors = [None]*len(urls)
+    for i, result, error in browser_imap(func, urls, size):
+        results[i], errors[i] = result, error
+    return results, errors
+
+
+def close_browsers():
+    """Closes every Chrome session in the pool"""
+    with _lock:
+        for driver in _alldrivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        _alldrivers.clear()
+    while not _idledrivers.empty():
+        _idledrivers.get_nowait()
+
+
+atexit.register(close_browsers)
@@ -0,0 +1,174 @@
+"""Per-school catalog profile of the layout decisions of scripts 4, 5 and 6, so re-runs don't detect them again.
+
+Scripts 4, 5 and 6 decide some things from the statistics of every course or table at once: which credits pattern 80%
+of the first lines match, whether each course is a single block, where the descriptions and requisites are, which
+punctuation splits the course groups (script 4), the structure of the course codes, i.e. the shortest and longest
+department codes and course numbers, and the department codes themselves (script 5), and the indent levels of the
+degree tables (script 6). The first run saves them to the school's profile, catalog_profile.json in its work directory
+(or the path in the OA_PROFILE environment variable), and later runs reuse them, so a school is organized and parsed
+the same way from run to run.
+
+Each script's section of the profile is saved with the profile_version and a fingerprint of the pages the input came
+from and their content (the elements of script 2's coursedescriptions.pkl for scripts 4 and 5, and the html of the
+degree tables or the gen. ed. tables for the two runs of script 6). A section is detected again when any of the
+school's pages change, or when profile_version is raised because the detection changed. The checks that the decisions
+are based on (e.g. 80% of the first lines contain the credits) are still made when the decisions are reused, and when
+one fails the decisions are detected again (see redetect). Script 6's indent levels only depend on the tables' html, so
+they're not checked again while its fingerprint matches. Delete the profile to detect everything again.
+
+When the OA_PARTIAL environment variable is 1, the input is only part of a school (e.g. one batch of the streaming
+driver, see OA_0_StreamDriver.py), so its content can't match the fingerprint. The saved decisions are reused as long
+as they were saved for the same pages, i.e. the links in the whole school's coursedescriptionsites.pkl from script 1.
+A partial run never writes the profile itself: the decisions it detects are saved in its own work directory, and the
+driver saves the ones it chooses for the whole school. Writes to the profile are locked (see filelock.py), so
+processes that share it don't lose each other's sections.
+"""
+
+import os
+import json
+import hashlib
+import pandas as pd
+from listtopattern import listtotrie
+from filelock import locked
+
+profile_path = os.environ.get('OA_PROFILE', 'catalog_profile.json')
+partial = os.environ.get('OA_PARTIAL', '0') == '1'
+partial_profile_path = 'partial_profile.json'      # Decisions detected from part of a school (in its work directory)
+profile_version = 3     # Raise when a script's detection changes, so every saved profile is detected again
+
+
+def input_fingerprint(links, contents):
+    """Returns the fingerprint of the pages an input came from and their content (the same whatever the order or
+    repetition of its rows)"""
+    fingerprint = hashlib.sha1()
+    for link, content in sorted(set(zip(links, contents))):
+        fingerprint.update((link + '\n' + content + '\0').encode())
+    return fingerprint.hexdigest()
+
+
+def pages_fingerprint(pages_pickle):
+    """Returns the fingerprint of the course description elements in script 2's pickle (None if there isn't one)"""
+    if not os.path.isfile(pages_pickle):
+        return None
+    blocksdf = pd.read_pickle(pages_pickle)
+    return input_fingerprint(blocksdf.link, blocksdf.html)
+
+
+def sites_fingerprint(sites_pickle):
+    """Returns the fingerprint of the pages listed in one of script 1's pickles, without their content (None if there
+    isn't one)"""
+    if not os.path.isfile(sites_pickle):
+        return None
+    return hashlib.sha1('\n'.join(sorted(set(pd.read_pickle(sites_pickle).link))).encode()).hexdigest()
+
+
+def load_profile(section, fingerprint, sites=None, partial=partial):
+    """Returns the decisions saved in a section of the profile (empty if they have to be detected).
+
+    :param section: Name of the script's section of the profile (e.g. 'organizer' or 'parser')
+    :param fingerprint: Fingerprint of the current input (see input_fingerprint)
+    :param sites: Fingerprint of the whole school's pages (see sites_fingerprint), used instead when the input is only
+        part of the school
+    :param partial: Whether the input is only part of the school (OA_PARTIAL by default)
+    :return: Dictionary of decisions
+    """
+    if not os.path.isfile(profile_path):
+        return {}
+    with open(profile_path) as infile:
+        saved = json.load(infile).get(section)
+    if saved is None or saved['version'] != profile_version:
+        return {}
+    if partial:
+        if sites is None or saved['sites'] != sites:
+            return {}
+    elif fingerprint is None or saved['fingerprint'] != fingerprint:
+        return {}
+    return saved['decisions']
+
+
+def _write_section(path, section, entry):
+    """Replaces a section of a profile file, keeping the other sections (processes that share the file take turns)"""
+    with locked(path):
+        profile = {}
+        if os.path.isfile(path):
+            with open(path) as infile:
+                profile = json.load(infile)
+        profile[section] = entry
+        temppath = path + '.' + str(os.getpid())        # Readers only ever see a complete file
+        with open(temppath, 'w') as outfile:
+            json.dump(profile, outfile, indent=2)
+        os.replace(temppath, path)
+
+
+def save_profile(section, fingerprint, decisions, sites=None):
+    """Saves a script's decisions to its section of the profile (the other sections are kept).
+
+    Part of a school (OA_PARTIAL) can't decide for the whole school, so its decisions are saved to
+    partial_profile_path in its work directory instead, where the driver can take them from (see partial_decisions).
+    """
+    entry = {'version': profile_version, 'fingerprint': fingerprint, 'sites': sites, 'decisions': decisions}
+    _write_section(partial_profile_path if partial else profile_path, section, entry)
+
+
+def partial_decisions(workdir, section):
+    """Returns the decisions a partial run detected and saved in its work directory (empty if it reused the profile's)
+
+    :param workdir: The partial run's work directory
+    :param section: Name of the script's section of the profile
+    :return: Dictionary of decisions
+    """
+    path = os.path.join(workdir, partial_profile_path)
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as infile:
+        saved = json.load(infile).get(section)
+    return {} if saved is None else saved['decisions']
+
+
+def redetect(section, decision):
+    """Reports that a saved decision failed its check on the current input, and returns no decisions so the rest of
+    the section's decisions are detected again (and saved, see save_profile)"""
+    print('The saved ' + decision + ' decision (' + section + ' section of ' + profile_path + ") doesn't fit this "
+          'input, detecting the decisions again')
+    return {}
+
+
+def course_code_patterns(df):
+    """Returns the regex patterns of the department and number parts of the course codes (e.g. '[A-Z][A-Z][A-Z]?[A-Z]?'
+    and '[0-9][0-9][0-9][A-Z]?'), which match every length between the shortest and the longest codes.
+
+    :param df: Dataframe of courses with dept and number columns (from script 4)
+    :return: cdept_pattern, cnum_pattern
+    """
+    cdeptrange = (df.dept.apply(len).min(), df.dept.apply(len).max())
+    course_numbers = df.number.str.extract('([0-9]+)', expand=False).fillna('')
+    cnumrange = (course_numbers.apply(len).min(), course_numbers.apply(len).max())
+    course_letters = df.number.str.extract('([A-Z]+)', expand=False).fillna('')  # Optional letters after course num.
+    cletrange = (course_letters.apply(len).min(), course_letters.apply(len).max())
+    cdept_pattern = '[A-Z]'*cdeptrange[0] + '[A-Z]?'*(cdeptrange[1]-cdeptrange[0])
+    cnum_pattern = '[0-9]'*cnumrange[0] + '[0-9]?'*(cnumrange[1]-cnumrange[0]) + '[A-Z]'*cletrange[0] + \
+        '[A-Z]?'*(cletrange[1]-cletrange[0])
+    return cdept_pattern, cnum_pattern
+
+
+def department_codes(df):
+    """Returns the department codes of the courses and of their equivalent courses (sorted).
+
+    :param df: Dataframe of courses with dept and equivalents columns (from script 4)
+    :return: List of department codes
+    """
+    titleccodes = df.dept.str.extract('([A-Z]+)', expand=False).dropna().tolist()
+    equivccodes = [x for sublist in df.equivalents.str.findall(r'(\b[A-Z]+(?=\b|\d))').to_list() for x in sublist]
+    return sorted(set(titleccodes + equivccodes))
+
+
+def listed_cdept_pattern(departments, cdept_pattern):
+    """Replaces cdept_pattern with a trie of the actual department codes if it's too long (to speed things up).
+
+    :param departments: List of the school's department codes (see department_codes)
+    :param cdept_pattern: Department code pattern from course_code_patterns
+    :return: The department code pattern
+    """
+    if cdept_pattern.count('?') <= 3:
+        return cdept_pattern
+    return listtotrie(departments)
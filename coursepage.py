@@ -0,0 +1,113 @@
+"""Extracts the course description elements of a single department's course description page.
+
+This is the per-page part of script 2 and its scrape loop, kept in their own module so the streaming driver (see
+OA_0_StreamDriver.py) can extract each department as soon as its page arrives.
+"""
+
+import pandas as pd
+from coursetext import element_plaintext
+from pageparser import parse_only, is_courseblock
+from pagefetcher import iter_page_sources
+from crawlmanifest import is_unchanged, record
+from crawljournal import load_journal, append_journal, quarantine
+
+columnnames = ['html', 'plaintext', 'blockid', 'department', 'link', 'blockindex']
+
+
+def new_columns():
+    """Returns empty column lists for the rows of course description pages"""
+    return {name: [] for name in columnnames}
+
+
+def extract_page(columns, sitehtml, department, link):
+    """Appends a row to the column lists for every element of every course block on a page.
+
+    :param columns: Dictionary of column lists (see new_columns)
+    :param sitehtml: The page's html
+    :param department: Name of the page's department
+    :param link: URL of the page
+    :return: None (modifies columns inplace)
+    """
+    # Courseblock is the html container for each individual course description (only these are parsed, see pageparser.py)
+    soup = parse_only(sitehtml, is_courseblock, 'html.parser')
+    courseblocks = soup.find_all('div', {'class': 'courseblock'})
+    for blocki, block in enumerate(courseblocks):
+        # Block index counts the rows within each block (blockid is the block's number within the page)
+        blockindex = 0
+        # Elements contains every html element within courseblock
+        for element in block.children:
+            if element == '\n':
+                continue
+            # An html break followed by bold text is likely a header (TODO test if splitting at every break & \n is valid)
+            for html in str(element).split('<br/><strong>'):
+                plaintext = element_plaintext(html)
+                if plaintext == '':
+                    continue
+                columns['html'].append(html)
+                columns['plaintext'].append(plaintext)
+                columns['blockid'].append(blocki)
+                columns['department'].append(department)
+                columns['link'].append(link)
+                columns['blockindex'].append(blockindex)
+                blockindex += 1
+
+
+def scrape_pages(sitesdf, manifest, previousdf, newmanifest):
+    """Yields the position and column lists of each course description page as soon as it's scraped.
+
+    Pages finished by an earlier run that crashed are taken from its journal first, and the rest are extracted and
+    journaled as they download (each page contains an entire department's courses), so a crash only loses the pages
+    that were still downloading. Pages that can't be downloaded or whose extraction raises an exception are quarantined
+    (see crawljournal.py).
+
+    :param sitesdf: Dataframe of course description pages (script 1)
+    :param manifest: Manifest of the pages scraped in the previous run (see crawlmanifest.py)
+    :param previousdf: Dataframe saved by the previous run (None if there's no manifest)
+    :param newmanifest: Manifest of this run (modified inplace)
+    :return: Generator of (position in sitesdf, column lists) tuples
+    """
+    journal = load_journal('coursedescriptions.pkl')
+    remaining = []
+    for i, link in enumerate(sitesdf.link):
+        if link in journal:
+            pagecolumns, newmanifest[link] = journal[link]
+            yield i, pagecolumns
+        else:
+            remaining.append(i)
+    for position, sitehtml, error in iter_page_sources(sitesdf.link.iloc[remaining], 'courseblock', 'div.courseblock'):
+        i = remaining[position]
+        department, link = sitesdf.department.iloc[i], sitesdf.link.iloc[i]
+        if error is not None:       # The page couldn't be rendered or isn't in the page cache (offline mode)
+            quarantine('coursedescriptions.pkl', link, error)
+            continue
+        record(newmanifest, link, sitehtml)
+        pagecolumns = new_columns()
+        # Carry forward the rows of pages that haven't changed since they were last scraped
+        if is_unchanged(manifest, link, sitehtml):
+            keptrows = previousdf.loc[previousdf.link.eq(link)].assign(department=department)
+            for column, values in pagecolumns.items():
+                values += keptrows[column].to_list()
+        else:
+            try:
+                extract_page(pagecolumns, sitehtml, department, link)
+            except Exception as e:
+                quarantine('coursedescriptions.pkl', link, e)
+                del newmanifest[link]
+                continue
+        append_journal('coursedescriptions.pkl', link, (pagecolumns, newmanifest[link]))
+        yield i, pagecolumns
+
+
+def courseblocks_dataframe(pages):
+    """Makes the dataframe of course description elements from the column lists of each page (in page order).
+
+    Block index resets for every block, blockid resets for every department, while df.index doesn't reset (it's the
+    course's number)
+    """
+    columns = new_columns()
+    for pagecolumns in pages:
+        for column, values in columns.items():
+            values += pagecolumns[column]
+    courseblocks_df = pd.DataFrame(columns)
+    courseblocks_df.index = courseblocks_df.groupby(['department', 'blockid'], sort=False).ngroup()
+    return courseblocks_df
@@ -0,0 +1,161 @@
+"""Converts the html of course description elements (script 2) to plain text.
+
+Course blocks only use a handful of tags (<p>, <strong>, <br/>, <a>, etc.), so instead of running html2text's general
+purpose markdown conversion on every element, the elements are converted by a small version of it that only handles
+those tags. The text is the same as html2text gives with links and emphasis ignored: whitespace is collapsed, entities
+are decoded, paragraphs and breaks become newlines, and text that would start a markdown list is escaped (e.g. '1.'
+becomes '1\\.').
+
+Whether an element can be converted this way is decided from its markup alone: it may only contain the tags and
+attributes listed below, text, and entities. Elements with anything else (lists, tables, images, comments, inline
+styles, etc.) are converted by html2text, which is only used as a whole (a new converter for each element, so a tag
+left open in one element can't change the text of the next).
+"""
+
+import re
+import unicodedata
+from html.entities import html5, name2codepoint
+import html2text
+
+# Tags and attributes that are converted without html2text (html2text ignores these tags with its settings below,
+# except for the block tags, which start a new paragraph)
+block_tags = {'p', 'div'}
+inline_tags = {'br', 'a', 'span', 'strong', 'b', 'em', 'i', 'u', 'sup', 'sub', 'small'}
+plain_attributes = {'class', 'id', 'href', 'title', 'target', 'rel', 'name'}
+
+# Entities that html2text writes as plain ascii (html2text's UNIFIABLE table)
+unifiable = {'rsquo': "'", 'lsquo': "'", 'rdquo': '"', 'ldquo': '"', 'copy': '(C)', 'mdash': '--', 'nbsp': ' ',
+             'rarr': '->', 'larr': '<-', 'middot': '*', 'ndash': '-', 'oelig': 'oe', 'aelig': 'ae', 'agrave': 'a',
+             'aacute': 'a', 'acirc': 'a', 'atilde': 'a', 'auml': 'a', 'aring': 'a', 'egrave': 'e', 'eacute': 'e',
+             'ecirc': 'e', 'euml': 'e', 'igrave': 'i', 'iacute': 'i', 'icirc': 'i', 'iuml': 'i', 'ograve': 'o',
+             'oacute': 'o', 'ocirc': 'o', 'otilde': 'o', 'ouml': 'o', 'ugrave': 'u', 'uacute': 'u', 'ucirc': 'u',
+             'uuml': 'u', 'lrm': '', 'rlm': ''}
+unifiable_codes = {name2codepoint[name]: text for name, text in unifiable.items() if name != 'nbsp'}  # Not &#160;
+
+token_re = re.compile(r'(?P<text>[^<&]+)'
+                      r'|<(?P<end>/)?(?P<tag>[a-zA-Z][a-zA-Z0-9]*)'
+                      r'(?P<attributes>(?:\s+[a-zA-Z_:][-a-zA-Z0-9_:.]*(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'))?)*)'
+                      r'\s*(?P<selfclosing>/)?>'
+                      r'|&#(?P<charref>[0-9]+|[xX][0-9a-fA-F]+);'
+                      r'|&(?P<entityref>[a-zA-Z][a-zA-Z0-9]*);')
+attributename_re = re.compile(r'\s+([a-zA-Z_:][-a-zA-Z0-9_:.]*)(?:\s*=\s*(?:"[^"]*"|\'[^\']*\'))?')
+whitespace_re = re.compile(r'\s+')
+# Markdown that html2text escapes in text: backslashes before markdown characters, and text that would start a list
+backslash_re = re.compile(r'(\\)(?=[\\`*_{}\[\]()#+\-.!])')
+listdot_re = re.compile(r'^(\s*\d+)(\.)(?=\s)', flags=re.MULTILINE)
+listplus_re = re.compile(r'^(\s*)(\+)(?=\s)', flags=re.MULTILINE)
+listdash_re = re.compile(r'^(\s*)(-)(?=\s|-)', flags=re.MULTILINE)
+
+
+def escape_markdown(text):
+    """Escapes the text that html2text escapes so it isn't read as markdown (e.g. '1. ' becomes '1\\. ')"""
+    text = backslash_re.sub(r'\\\1', text)
+    text = listdot_re.sub(r'\1\\\2', text)
+    text = listplus_re.sub(r'\1\\\2', text)
+    return listdash_re.sub(r'\1\\\2', text)
+
+
+def charref_text(code):
+    """Returns the text html2text writes for a numeric character reference (e.g. '#160' or '#xA0' without the #)"""
+    code = int(code[1:], 16) if code[0] in 'xX' else int(code)
+    if code in unifiable_codes:
+        return unifiable_codes[code]
+    try:
+        return chr(code)
+    except ValueError:      # Invalid unicode
+        return ''
+
+
+def entityref_text(name):
+    """Returns the text html2text writes for a named entity (e.g. 'amp')"""
+    if name in unifiable:
+        return unifiable[name]
+    return html5.get(name + ';', '&' + name + ';')
+
+
+def tokenize(html):
+    """Splits an element's html into text, tags, and entities (None if it contains anything else)"""
+    tokens = []
+    position = 0
+    for match in token_re.finditer(html):
+        if match.start() != position:
+            return None
+        position = match.end()
+        first = html[match.start()]
+        if first == '<':
+            end, tag, attributes, selfclosing = match.group('end', 'tag', 'attributes', 'selfclosing')
+            tag = tag.lower()
+            if tag not in block_tags and tag not in inline_tags or end and selfclosing:
+                return None
+            if any(x.lower() not in plain_attributes for x in attributename_re.findall(attributes)):
+                return None
+            if not end:
+                tokens.append(('starttag', tag))
+            if end or selfclosing:
+                tokens.append(('endtag', tag))
+        elif first != '&':
+            tokens.append(('text', match.group()))
+        elif html[match.start() + 1] == '#':
+            tokens.append(('data', charref_text(match.group('charref'))))
+        else:
+            tokens.append(('data', entityref_text(match.group('entityref'))))
+    if position != len(html):
+        return None
+    return tokens
+
+
+def convert_tokens(tokens):
+    """Returns the markdown html2text makes from the tokens of an element (see HTML2Text.o and handle_tag)"""
+    out = []
+    newlines = 0        # Newlines to output before the next text (html2text's p_p)
+    space = False       # Whether a space is owed before the next text
+    start = True
+    for kind, data in tokens:
+        if kind in ['starttag', 'endtag']:
+            if data in block_tags:
+                newlines = 2
+            if data != 'br' or kind == 'endtag':
+                continue
+            data = '  \n'
+        else:
+            if kind == 'text':
+                data = escape_markdown(data)
+            data = whitespace_re.sub(' ', data)
+            if data[:1] == ' ':
+                space = True
+                data = data[1:]
+            if not data:
+                continue
+        if start:
+            space = False
+            newlines = 0
+            start = False
+        if newlines:
+            out.append('\n' * newlines)
+            space = False
+        if space:
+            if not out[-1].endswith('\n'):
+                out.append(' ')
+            space = False
+        newlines = 0
+        out.append(data)
+    out.append('\n')
+    return ''.join(out)
+
+
+def element_plaintext(html):
+    """Returns the plain text of a course description element.
+
+    :param html: The element's html
+    :return: The element's text with unicode normalized and leading and trailing newlines removed
+    """
+    tokens = tokenize(html)
+    if tokens is None:      # Markup that needs html2text
+        h2t = html2text.HTML2Text()
+        h2t.ignore_links = True
+        h2t.ignore_emphasis = True
+        h2t.body_width = 0
+        text = h2t.handle(html)
+    else:
+        text = convert_tokens(tokens)
+    return unicodedata.normalize('NFKC', text).strip('\n')
@@ -0,0 +1,85 @@
+"""Write-ahead journal of the pages a scraper has finished, so a run that crashes can resume where it stopped.
+
+The scrapers only save their output pickle once every page is done, so a crash or network failure near the end of a
+large school used to lose hours of work. Now the rows extracted from each page are appended to a journal next to the
+output pickle (e.g. coursedescriptions_journal.dat) as soon as the page is done, and flushed to disk. When the scraper
+is run again, the pages in the journal are neither downloaded nor extracted again and their rows are taken from the
+journal instead. The journal is deleted once the output pickle is saved. A record that was only partly written when
+the run crashed is dropped (its page is scraped again). Delete the journal to start a scrape over from the beginning.
+
+An exception while extracting a single page (or rendering it in Chrome) doesn't stop the run. The page is quarantined
+instead: it's skipped and listed with its error and traceback in a report next to the output pickle (e.g.
+coursedescriptions_quarantine.json). Quarantined pages aren't journaled, so they're tried again the next time the
+scraper is run.
+"""
+
+import os
+import json
+import pickle
+import traceback
+
+_quarantined = {}       # Quarantined pages of each output pickle in this run
+
+
+def journal_path(pickle_name):
+    """Returns the filename of the journal that belongs to an output pickle"""
+    return os.path.splitext(pickle_name)[0] + '_journal.dat'
+
+
+def quarantine_path(pickle_name):
+    """Returns the filename of the quarantine report that belongs to an output pickle"""
+    return os.path.splitext(pickle_name)[0] + '_quarantine.json'
+
+
+def load_journal(pickle_name):
+    """Returns the records of the pages finished by an earlier run that didn't complete.
+
+    :param pickle_name: Filename of the scraper's output pickle
+    :return: Dictionary of each finished page's url and record (empty if the last run completed)
+    """
+    path = journal_path(pickle_name)
+    records = {}
+    if not os.path.isfile(path):
+        return records
+    with open(path, 'r+b') as journal:
+        end = 0
+        while True:
+            try:
+                url, record = pickle.load(journal)
+            except Exception:       # End of the journal, or a record that was cut off by a crash
+                break
+            records[url] = record
+            end = journal.tell()
+        journal.truncate(end)
+    print('Resuming from ' + path + ' (' + str(len(records)) + ' pages already scraped)')
+    return records
+
+
+def append_journal(pickle_name, url, record):
+    """Appends a finished page's record (e.g. its extracted rows) to the journal and flushes it to disk"""
+    with open(journal_path(pickle_name), 'ab') as journal:
+        pickle.dump((url, record), journal, protocol=pickle.HIGHEST_PROTOCOL)
+        journal.flush()
+        os.fsync(journal.fileno())
+
+
+def quarantine(pickle_name, url, error):
+    """Records a page whose extraction raised an exception, so the rest of the pages can still be scraped"""
+    print('Quarantined ' + url + ' (' + repr(error) + ')')
+    _quarantined.setdefault(pickle_name, []).append({
+        'url': url, 'error': repr(error),
+        'traceback': ''.join(traceback.format_exception(type(error), error, error.__traceback__))})
+
+
+def finish_journal(pickle_name):
+    """Deletes the journal once the output pickle is saved, and saves the quarantine report (if any pages were
+    quarantined)"""
+    if os.path.isfile(journal_path(pickle_name)):
+        os.remove(journal_path(pickle_name))
+    if os.path.isfile(quarantine_path(pickle_name)):
+        os.remove(quarantine_path(pickle_name))
+    if _quarantined.get(pickle_name):
+        with open(quarantine_path(pickle_name), 'w') as outfile:
+            json.dump(_quarantined[pickle_name], outfile, indent=2)
+        print(str(len(_quarantined[pickle_name])) + ' pages were quarantined (see ' + quarantine_path(pickle_name) +
+              ')')
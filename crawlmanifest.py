@@ -0,0 +1,49 @@
+"""Per-URL manifest of the pages a scraper extracted, used to only re-scrape catalog pages that changed.
+
+The manifest is saved next to the scraper's output pickle (e.g. coursedescriptions_manifest.json) and records, for
+every page, the content hash of the html the rows were extracted from, the http validators (ETag/Last-Modified), and
+when the page was last fetched. Incremental mode is switched on with the environment variable OA_INCREMENTAL=1: pages
+are revalidated through the page cache (unchanged pages come back as cheap 304 responses) and pages whose content hash
+matches the manifest have their previously extracted rows carried forward instead of being parsed again.
+
+Delete the manifest to force a full re-scrape (e.g. after changing how a scraper extracts rows).
+"""
+
+import os
+import json
+import time
+import pagecache
+
+incremental = os.environ.get('OA_INCREMENTAL', '0') == '1'
+
+
+def manifest_path(pickle_name):
+    """Returns the filename of the manifest that belongs to an output pickle"""
+    return os.path.splitext(pickle_name)[0] + '_manifest.json'
+
+
+def load_manifest(pickle_name):
+    """Returns the manifest of the previous run (empty unless running incrementally and the previous output exists)"""
+    path = manifest_path(pickle_name)
+    if not incremental or not os.path.isfile(path) or not os.path.isfile(pickle_name):
+        return {}
+    with open(path) as infile:
+        return json.load(infile)
+
+
+def is_unchanged(manifest, url, sitehtml):
+    """Checks whether a page has the same content it had when its rows were last extracted"""
+    return url in manifest and manifest[url]['hash'] == pagecache.content_hash(sitehtml)
+
+
+def record(manifest, url, sitehtml):
+    """Adds a page's content hash, validators, and fetch time to a manifest"""
+    entry = pagecache.lookup(url) or {}
+    manifest[url] = {'hash': pagecache.content_hash(sitehtml), 'etag': entry.get('etag'),
+                     'last_modified': entry.get('last_modified'), 'fetched': entry.get('fetched', time.time())}
+
+
+def save_manifest(pickle_name, manifest):
+    """Saves a manifest next to its output pickle"""
+    with open(manifest_path(pickle_name), 'w') as outfile:
+        json.dump(manifest, outfile)
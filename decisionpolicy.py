@@ -0,0 +1,88 @@
+"""Answers the yes/no checks in the organizer scripts from a per-school policy file instead of waiting on input().
+
+The policy file (decision_policy.json in the working directory, or the path in the OA_POLICY environment variable)
+maps each decision's name to true, false, or "ask", e.g. {"ignore_unidentified_degrees": false}. Decisions that aren't
+in the policy file are asked on the terminal when there is one, and otherwise take the default answer below, so a
+batch of schools can run unattended. The safety checks that stop a bad parse (e.g. whether the first lines of the
+course blocks are just descriptions) don't have a default: without a policy entry or a terminal they're recorded as
+unresolved and the script stops, until they're answered in the policy file.
+
+Every decision is appended to decision_review.json along with the sample that would have been shown on screen, so the
+answers can be reviewed afterwards.
+"""
+
+import os
+import sys
+import json
+import time
+
+policy_path = os.environ.get('OA_POLICY', 'decision_policy.json')
+report_path = 'decision_review.json'
+sample_limit = 500          # Maximum number of sample items saved to the review report per decision
+
+# Answers used when a decision isn't in the policy file and there's nobody to ask (None for the safety checks, which
+# stop the script instead)
+default_answers = {
+    'delete_parentheses': True,             # Script 4: delete parentheses items from the course titles
+    'descriptions_ok': None,                # Script 4: the first lines of the remaining blocks are just descriptions
+    'move_unparsed': None,                  # Script 4: move the unparsed items to the description
+    'ignore_ids': None,                     # Script 4: ignore the remaining unrecognized headers (e.g. "Note:")
+    'ignore_unidentified_degrees': True,    # Script 6: ignore degrees whose type couldn't be identified
+}
+
+_policy = None
+
+
+def load_policy():
+    """Returns the policy file's decisions (empty if there isn't one)"""
+    global _policy
+    if _policy is None:
+        _policy = {}
+        if os.path.isfile(policy_path):
+            with open(policy_path) as infile:
+                _policy = json.load(infile)
+        for name, answer in _policy.items():
+            if name not in default_answers or answer not in [True, False, 'ask']:
+                raise Exception(policy_path + ': ' + name + ' must be a decision name with a value of true, false, '
+                                'or "ask"')
+    return _policy
+
+
+def record(name, question, answer, source, sample):
+    """Appends a decision and its sample to the review report"""
+    report = []
+    if os.path.isfile(report_path):
+        with open(report_path) as infile:
+            report = json.load(infile)
+    report.append({'script': os.path.basename(sys.argv[0]), 'decision': name, 'question': question, 'answer': answer,
+                   'source': source, 'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'sample': [str(x) for x in sample][:sample_limit]})
+    with open(report_path, 'w') as outfile:
+        json.dump(report, outfile, indent=2)
+
+
+def decide(name, question, sample):
+    """Answers a yes/no check using the policy file, the terminal, or the default answer (in that order). Raises an
+    exception for a safety check that can't be answered (see above).
+
+    :param name: Name of the decision (one of the keys of default_answers)
+    :param question: The question that's asked on the terminal
+    :param sample: List of the items the question is about (saved to the review report)
+    :return: True for yes, False for no
+    """
+    answer = load_policy().get(name, 'ask')
+    source = 'policy'
+    if answer == 'ask':
+        if sys.stdin is not None and sys.stdin.isatty():
+            print(question + ' (y/n)')
+            answer = input() == 'y'
+            source = 'user'
+        elif default_answers[name] is None:
+            record(name, question, None, 'unresolved', sample)
+            raise Exception(name + ' is a safety check without a default answer. Review its sample in ' + report_path +
+                            ' and set it to true or false in ' + policy_path)
+        else:
+            answer = default_answers[name]
+            source = 'default'
+    record(name, question, answer, source, sample)
+    return answer
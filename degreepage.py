@@ -0,0 +1,194 @@
+"""Extracts the html elements of a single degree requirement page along with their headers and superscripts.
+
+This is the per-page part of script 3, kept in its own module so the pages can be processed in parallel by worker
+processes while the rest of the pages are still downloading.
+"""
+
+import re
+import pandas as pd
+from pageparser import parse_only, is_page_content
+
+# Set regex definitions
+htmltext_re = re.compile(r'(?<=>)[^<]+')
+sscript_pattern = r'(?<=_SUPERSCRIPT_).+?(?=_)'     # sscript is abbreviation for superscript
+superscripttext_re = re.compile(r'(?<=<sup>)[^<]+')
+superscripttag_re = re.compile(r'<sup>.+?</sup>')
+elementtag_re = re.compile('(?<=<)(.+?)(?=( |>))')
+tableclass_re = re.compile('(?:class=")(.+?)(?:")')
+headerlevel_re = re.compile(r'(?<=h)([1-6])(?=\Z)')
+
+
+def superscript_code(superscript):
+    """Returns the plain text code that replaces a superscript (e.g. '1,2' -> ' _SUPERSCRIPT_1_ _SUPERSCRIPT_2_')"""
+    if ',' in superscript:  # For comma separated lists of superscripts
+        return ' _SUPERSCRIPT_' + '_ _SUPERSCRIPT_'.join(re.findall(r'[^ ,]+', superscript)) + '_'
+    elif ' ' in superscript:  # For space separated lists of superscripts (this is rare)
+        return ' _SUPERSCRIPT_' + '_ _SUPERSCRIPT_'.join(re.findall(r'[^ ]+', superscript)) + '_'
+    else:
+        return ' _SUPERSCRIPT_' + superscript + '_'
+
+
+def replace_superscripts(sitehtml):
+    """Replaces every html superscript with plain text code in a single pass over the page.
+
+    The nth <sup>...</sup> tag is replaced with the code for the nth superscript text, the same as replacing the first
+    remaining tag once for each superscript text in turn.
+    """
+    codes = [superscript_code(x) for x in superscripttext_re.findall(sitehtml)]
+    if not codes:       # count=0 would replace every tag
+        return sitehtml
+    nextcode = iter(codes).__next__
+    return superscripttag_re.sub(lambda match: match.expand(nextcode()), sitehtml, count=len(codes))
+
+
+def page_elements(tabpage):
+    """Yields the html of every element in a page's content, looking inside divs at any depth (divs aren't yielded)"""
+    children = [iter(tabpage.children)]
+    while children:
+        child = next(children[-1], None)
+        if child is None:
+            children.pop()
+        elif child.name == 'div':
+            children.append(iter(child.children))
+        elif str(child) != '\n':
+            yield str(child)
+
+
+def element_class(html):
+    """Returns the html class of an element (its class name for tables and its tagname for all other elements)"""
+    match = elementtag_re.search(html)
+    if match is None:       # Text between elements
+        return None
+    if match.group(1) != 'table':
+        return match.group(1)
+    match = tableclass_re.search(html)
+    if match is None or not match.group(1).split():
+        return None
+    return match.group(1).split()[0]
+
+
+def header_level(htmlclass):
+    """Returns the importance of a header element (1-7) or 8 if the element isn't a header"""
+    if htmlclass == 'pre':      # Preformatted text is sometimes table header
+        return 7
+    match = headerlevel_re.search(htmlclass)
+    return int(match.group(1)) if match else 8
+
+
+def extract_page(sitehtml, url, pagei, page):
+    """Returns a dataframe of the html elements on a degree page (None if the page doesn't have any).
+
+    :param sitehtml: The page's html
+    :param url: URL of the page
+    :param pagei: The page's number (its index in degreesites.pkl)
+    :param page: The page's row in degreesites.pkl (program, degree, and school)
+    :return: Dataframe with one row per element
+    """
+    # Replace html superscripts with plain text code so they don't lose their superscript designation when decoded
+    sitehtml = replace_superscripts(sitehtml)
+
+    # Remove invisible superscripts (these are errors from the webdeveloper)
+    sitehtml = re.sub(r'_SUPERSCRIPT_ *_', '', sitehtml)
+
+    # Parse just the page content and title (see pageparser.py)
+    soup = parse_only(sitehtml, is_page_content)
+
+    # Extract elements from main page content
+    pagecontent = soup.find_all(None, {'class': 'page_content tab_content'})
+    if not pagecontent:       # Not a page with sub-pages on tabs
+        pagecontent = soup.find_all(None, {'class': 'page_content'})
+
+    # Walk through the elements of every tab in order, keeping a stack of the headers that apply to the current element
+    # (one per header importance, most important first). Each element is saved with its tab number, html class, header
+    # importance, and the headers it falls under (the same tuple is shared by every element under the same headers)
+    siblings = []
+    tabnumber = []
+    htmlclasses = []
+    headerlevels = []
+    headerpaths = []
+    headerstack = []
+    headerpath = ()
+    for tabi, tabpage in enumerate(pagecontent):
+        for html in page_elements(tabpage):
+            htmlclass = element_class(html)
+            if htmlclass is None or htmlclass == 'hr/':
+                continue
+            h = header_level(htmlclass)
+            if h < 8:       # A header replaces any header of the same or lesser importance
+                while headerstack and headerstack[-1][0] >= h:
+                    headerstack.pop()
+                headerstack.append((h, ''.join(htmltext_re.findall(html))))
+                headerpath = tuple(headerstack)
+            siblings.append(html)               # Save each html element
+            tabnumber.append(tabi)              # Save the tab number too
+            htmlclasses.append(htmlclass)
+            headerlevels.append(h)
+            headerpaths.append(headerpath)
+    if not siblings:
+        return None
+
+    # Save elements to a dataframe
+    siblingsdf = pd.DataFrame({'tabnumber': tabnumber, 'html': siblings, 'htmlclass': htmlclasses, 'h': headerlevels})
+    siblingsdf['string'] = siblingsdf.html.apply(lambda x: ''.join(htmltext_re.findall(x)))
+
+    # Join the headers of each element into its headertext (once for each distinct set of headers)
+    headertexts = {}
+    for headerpath in headerpaths:
+        if headerpath not in headertexts:
+            headertexts[headerpath] = ''.join(text + ' : ' for _, text in headerpath).strip(' :')
+    siblingsdf['headertext'] = [headertexts[headerpath] for headerpath in headerpaths]
+
+    # Delete header elements (their text is saved in headertext)
+    siblingsdf = siblingsdf.loc[siblingsdf.h.eq(8)].reset_index(drop=True)
+    siblingsdf.drop(columns="h", inplace=True)
+
+    # Change htmlclass for elemnents to 'sc_footnotes' if they contain superscript definition   todo: clarify naming
+    siblingsdf.loc[siblingsdf.string.str.match('_SUPERSCRIPT_'), 'htmlclass'] = 'sc_footnotes'
+
+    # Merge adjacent text blocks with matching headers (but don't merge for tables)
+    dontmerge = siblingsdf.html.str.match('<table ')
+    groupedbyheader = (
+                siblingsdf.headertext.ne(siblingsdf.headertext.shift()) | dontmerge | dontmerge.shift(1)).cumsum()
+    siblingsdf = siblingsdf.groupby(groupedbyheader, as_index=False).agg(
+        {'tabnumber': 'first', 'html': ' /n '.join, 'htmlclass': 'first', 'string': ' ; '.join, 'headertext': 'first'})
+
+    # Get headers of siblings that precede tables (may contain degree name)
+    siblingsdf.loc[
+        ~siblingsdf.htmlclass.isin(['sc_plangrid', 'sc_courselist']), 'siblingheaders'] = siblingsdf.headertext
+    tablegroups = siblingsdf[::-1].siblingheaders.isna().cumsum()[::-1]
+    siblingsdf.siblingheaders = siblingsdf.siblingheaders.groupby(tablegroups).transform(lambda x: ' : '.join(x[:-1]))
+
+    # Assign superscript definitions to the tables that reference them
+    siblingsdf.loc[siblingsdf.htmlclass.eq('sc_footnotes'), 'sscripts'] = siblingsdf.string
+    siblingsdf.loc[siblingsdf.html.str.match('<p> _SUPERSCRIPT_'), 'sscripts'] = siblingsdf.string
+    siblingsdf.sscripts = siblingsdf.sscripts.bfill()     # Sometimes definitions are listed under a later element
+    siblingsdf.sscripts = siblingsdf.sscripts.ffill()     # or before the element
+    has_sscripts = siblingsdf.html.str.contains(sscript_pattern) | siblingsdf.headertext.str.contains(sscript_pattern)
+    needs_sstable = has_sscripts & siblingsdf.htmlclass.ne('sc_footnotes')
+    # if (siblingsdf.sscripts.isna() & siblingsdf.htmlclass.isin(['sc_courselist', 'sc_plangrid']) & needs_sstable).any():
+    #     print('There is a table that contains superscripts but does not have superscript definitions. Ignore? (y/n)')
+    #     if input() != 'y':
+    #         raise Exception('Terminated by User')
+
+    # Remove definitions if the table doesn't have any superscripts
+    siblingsdf.loc[~needs_sstable & siblingsdf.htmlclass.isin(['sc_courselist', 'sc_plangrid']), 'sscripts'] = ''
+    siblingsdf = siblingsdf[siblingsdf.htmlclass.ne('sc_footnotes')]
+    if siblingsdf.empty:
+        return None
+    siblingsdf = siblingsdf.reset_index(drop=True)
+
+    # Assign all the page-wide properties
+    siblingsdf = siblingsdf.assign(link=url)
+    siblingsdf = siblingsdf.assign(pagenumber=pagei)
+    siblingsdf.loc[:, ['program', 'degree', 'school']] = pd.concat([page] * siblingsdf.index.size,
+                                                                   axis=1, ignore_index=True).T
+    # Extract the page title (it's usually the degree name)
+    if soup.find(None, {'id': 'page-title'}) is None:
+        if soup.find(None, {'class': 'page-title'}) is None:
+            siblingsdf['pagetitle'] = soup.find(None, {'class': 'page-header'}).text
+        else:
+            siblingsdf['pagetitle'] = soup.find(None, {'class': 'page-title'}).text
+    else:
+        siblingsdf['pagetitle'] = soup.find(None, {'id': 'page-title'}).text
+
+    return siblingsdf
@@ -0,0 +1,39 @@
+"""Lock for files that several processes read, update, and write back (e.g. a profile or page cache index shared by
+the batches of a driver).
+
+The lock is a <file>.lock file that only one process can create at a time. A lock that's older than stale_seconds was
+left by a process that crashed while holding it, so it's removed.
+"""
+
+import os
+import time
+from contextlib import contextmanager
+
+stale_seconds = 60          # Age of a lock file that's assumed to be left by a crashed process
+poll_seconds = 0.05         # Time between attempts to take the lock
+
+
+@contextmanager
+def locked(path):
+    """Holds the lock of a file while the block runs.
+
+    :param path: Path of the file
+    """
+    lockpath = path + '.lock'
+    while True:
+        try:
+            lockfile = os.open(lockpath, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lockpath) > stale_seconds:
+                    os.remove(lockpath)
+                    continue
+            except OSError:         # The lock was released in the meantime
+                continue
+            time.sleep(poll_seconds)
+    try:
+        yield
+    finally:
+        os.close(lockfile)
+        os.remove(lockpath)
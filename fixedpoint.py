@@ -0,0 +1,68 @@
+"""Rewrites a column of strings until it stops changing, rewriting only the rows that are still changing.
+
+Scripts 5 and 6 expand some patterns by applying the same replacements over and over until no row changes (e.g. filling
+in the implied department of 'MATH241 or 243' one course code at a time). Each row is rewritten on its own, so a row
+that didn't change in a pass won't change in any later pass. rewrite_until_stable only passes the rows that changed in
+the previous pass to the next one, instead of the whole column, and stops with a warning after OA_MAX_PASSES passes
+(100 by default) if some rows are still changing.
+
+Set the OA_FIXEDPOINT_STATS environment variable to 1 to print the passes of each loop when the script ends (see
+fixedpoint_stats).
+"""
+
+import os
+import time
+import atexit
+import numpy as np
+import pandas as pd
+
+max_passes = int(os.environ.get('OA_MAX_PASSES', 100))
+_stats = {}         # Rows rewritten, rows changed, and seconds of every pass of each loop
+
+
+def rewrite_until_stable(series, rewrite, name):
+    """Returns a series after rewriting it until none of its rows change.
+
+    :param series: Series of strings
+    :param rewrite: Function that takes and returns a series of strings (with the same index), rewriting each row on
+        its own
+    :param name: Name of the loop (for the statistics and warnings)
+    :return: The rewritten series (the input series isn't modified)
+    """
+    values = series.to_numpy(dtype=object, copy=True)
+    positions = np.arange(len(values))      # Rows that are still changing
+    passes = _stats.setdefault(name, [])
+    for _ in range(max_passes):
+        if not len(positions):
+            break
+        started = time.perf_counter()
+        active = values[positions]
+        rewritten = rewrite(pd.Series(active, index=series.index[positions])).to_numpy(dtype=object)
+        changed = (rewritten != active) & ~(pd.isna(rewritten) & pd.isna(active))
+        positions = positions[changed]
+        values[positions] = rewritten[changed]
+        passes.append((len(active), len(positions), time.perf_counter() - started))
+    else:
+        if len(positions):
+            print(name + ' stopped after ' + str(max_passes) + ' passes with ' + str(len(positions)) +
+                  ' rows still changing')
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def fixedpoint_stats():
+    """Returns the number of passes, rows rewritten, rows changed, and seconds of each loop (the slowest first)"""
+    stats = [{'loop': name, 'passes': len(passes), 'rows rewritten': sum(x[0] for x in passes),
+              'rows changed': sum(x[1] for x in passes), 'seconds': sum(x[2] for x in passes)}
+             for name, passes in _stats.items()]
+    return sorted(stats, key=lambda x: x['seconds'], reverse=True)
+
+
+def _print_fixedpoint_stats():
+    for x in fixedpoint_stats():
+        print(x['loop'].ljust(40) + str(x['passes']).rjust(5) + ' passes' + str(x['rows rewritten']).rjust(9) +
+              ' rows rewritten' + str(x['rows changed']).rjust(9) + ' changed' + str(round(x['seconds'], 3)).rjust(9) +
+              ' s')
+
+
+if os.environ.get('OA_FIXEDPOINT_STATS', '0') == '1':
+    atexit.register(_print_fixedpoint_stats)
@@ -1,31 +1,156 @@
+"""Builds regex patterns from lists of keywords/phrases, and keeps a registry of compiled patterns.
+
+Each pattern is only built once for the same keywords (the caller's list isn't changed) and compiled patterns are kept
+by pattern and flags, so loops that run the same replacements over and over don't rebuild or recompile them. The
+scripts pass every keyword pattern, every pattern used with flags, and the patterns of their loops through compiled;
+short literal patterns without flags are given to pandas as strings and left to the re module's own cache.
+
+Set the OA_PATTERN_STATS environment variable to 1 to print, when the script ends, how often each compiled pattern was
+reused, how long it took to compile, and how many matching calls (search, sub, findall, etc.) were made with it and how
+long they took in total (see pattern_stats). The matching calls are timed with a profiler hook, which slows the script
+down, so it's only installed when the statistics are asked for. It only sees the calls made from python code, so calls
+that pandas makes straight from its compiled code (str.findall) aren't counted.
+
+Long lists of codes (e.g. the hundreds of department codes of some schools) are built into a trie-shaped pattern by
+listtotrie, e.g. ['MATH', 'MAT', 'ME'] becomes '(?:M(?:ATH?|E))', so the regex only tries the codes that share the
+characters it has already matched, instead of every code at every position. It matches the same as the alternation of
+the codes (longest first), since the only codes that can match at a position are prefixes of each other and the trie
+tries them from the longest to the shortest.
+"""
+
+import os
+import re
+import sys
+import time
+import atexit
+import threading
+
+_built = {}         # Patterns built from keywords, by the kind of pattern and the keywords
+_compiled = {}      # Compiled patterns, by pattern and flags
+_keys = {}          # Pattern and flags of each compiled pattern
+_stats = {}         # Reuses, compile time, matching calls, and matching time of each compiled pattern
+_lock = threading.Lock()        # The scrapers' thread pools share the registry
+_timing = threading.local()     # The matching call being timed in each thread
+
+
+def _alternation(plist, start, end):
+    """Returns the 'or'-seperated pattern of a list of strings between start and end (longest phrases first)"""
+    key = (start, end, tuple(plist))
+    if key not in _built:
+        if not plist:       # The pattern would match the empty string everywhere
+            raise Exception('Cannot build a pattern from an empty list')
+        # Sort so longest phrases are evaluated first (sub-phrases last)
+        _built[key] = start + '|'.join(sorted(plist, key=len, reverse=True)) + end
+    return _built[key]
+
+
 def listtopattern(plist):
     """Converts a list of strings to an 'or'-seperated regex pattern (includes word breaks at the ends)"""
-    plist.sort(key=len, reverse=True)       # Sort so longest phrases are evaluated first (sub-phrases last)
-    pattern = r'' + plist[0]
-    if len(plist) != 1:
-        for x in plist[1:]:
-            pattern = pattern + '|' + x
-    pattern = r'\b(' + pattern + r')\b'
-    return pattern
+    return _alternation(plist, r'\b(', r')\b')
 
 
 def listtopatternraw(plist):
     """Converts a list of strings to an 'or'-seperated regex pattern """
-    plist.sort(key=len, reverse=True)
-    pattern = r'' + plist[0]
-    if len(plist) != 1:
-        for x in plist[1:]:
-            pattern = pattern + '|' + x
-    pattern = r'(' + pattern + r')'
-    return pattern
+    return _alternation(plist, r'(', r')')
 
 
 def listtononcapture(plist):
     """Converts a list of strings to a non-capturing 'or'-seperated regex pattern"""
-    plist.sort(key=len, reverse=True)
-    pattern = r'' + plist[0]
-    if len(plist) != 1:
-        for x in plist[1:]:
-            pattern = pattern + '|' + x
-    pattern = r'(?:' + pattern + r')'
-    return pattern
+    return _alternation(plist, r'(?:', r')')
+
+
+def _trie_pattern(trie):
+    """Returns the pattern of the strings in a trie (a dict of each next character's trie, with '' for the end of a
+    string)"""
+    branches = [(re.escape(char), _trie_pattern(child)) for char, child in sorted(trie.items()) if char]
+    if not branches:
+        return ''
+    if len(branches) > 1:
+        pattern = '(?:' + '|'.join(char + rest for char, rest in branches) + ')'
+    elif branches[0][1] and '' in trie:     # More than one character has to be grouped to be optional
+        pattern = '(?:' + branches[0][0] + branches[0][1] + ')'
+    else:
+        pattern = branches[0][0] + branches[0][1]
+    return pattern + '?' if '' in trie else pattern
+
+
+def listtotrie(plist):
+    """Converts a list of strings to a non-capturing trie-shaped regex pattern that matches the same as
+    listtononcapture (the strings are matched literally)"""
+    key = ('trie', tuple(plist))
+    if key not in _built:
+        if not plist:       # The pattern would match the empty string everywhere
+            raise Exception('Cannot build a pattern from an empty list')
+        trie = {}
+        for phrase in plist:
+            node = trie
+            for char in phrase:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        pattern = _trie_pattern(trie)
+        # The pattern is already in a non-capturing group if the strings start with more than one character
+        _built[key] = pattern if pattern.startswith('(?:') and pattern.endswith(')') else '(?:' + pattern + ')'
+    return _built[key]
+
+
+def compiled(pattern, flags=0):
+    """Returns the compiled regex of a pattern, compiling it only the first time it's used with these flags.
+
+    The compiled pattern is passed to pandas instead of the pattern string (e.g. df.reqs.str.replace(compiled(pattern,
+    re.IGNORECASE), '', regex=True)), and the flags are given here rather than to pandas.
+    """
+    key = (pattern, flags)
+    with _lock:
+        regex = _compiled.get(key)
+        if regex is None:
+            started = time.perf_counter()
+            regex = _compiled[key] = re.compile(pattern, flags)
+            _keys.setdefault(regex, key)
+            _stats[key] = [0, time.perf_counter() - started, 0, 0.0]
+        else:
+            _stats[key][0] += 1
+    return regex
+
+
+def _time_matching(frame, event, arg):
+    """Profiler hook that adds the time of each matching call made with a compiled pattern to its statistics"""
+    if event == 'c_call':
+        regex = getattr(arg, '__self__', None)
+        if isinstance(regex, re.Pattern) and regex in _keys:
+            _timing.call = (arg, _keys[regex], time.perf_counter())
+    elif event in ['c_return', 'c_exception']:
+        call = getattr(_timing, 'call', None)
+        if call is not None and call[0] is arg:
+            elapsed = time.perf_counter() - call[2]
+            _timing.call = None
+            with _lock:
+                stats = _stats[call[1]]
+                stats[2] += 1
+                stats[3] += elapsed
+
+
+def pattern_stats():
+    """Returns a list of the compiled patterns with the number of times each was reused, the seconds it took to
+    compile, and the number and seconds of the matching calls made with it (the slowest first)"""
+    with _lock:
+        stats = [{'pattern': pattern, 'flags': flags, 'reuses': reuses, 'seconds': seconds, 'matches': matches,
+                  'match seconds': matchseconds}
+                 for (pattern, flags), (reuses, seconds, matches, matchseconds) in _stats.items()]
+    return sorted(stats, key=lambda x: x['seconds'] + x['match seconds'], reverse=True)
+
+
+def _print_pattern_stats():
+    stats = pattern_stats()
+    print(str(len(stats)) + ' patterns compiled in ' + str(round(sum(x['seconds'] for x in stats), 3)) + ' s, reused ' +
+          str(sum(x['reuses'] for x in stats)) + ' times, and matched in ' +
+          str(round(sum(x['match seconds'] for x in stats), 3)) + ' s')
+    for x in stats[:20]:
+        print(str(round(x['seconds'] * 1000, 2)).rjust(9) + ' ms' + str(x['reuses']).rjust(7) + ' reuses' +
+              str(round(x['match seconds'], 3)).rjust(9) + ' s' + str(x['matches']).rjust(9) + ' matches   ' +
+              (x['pattern'] if len(x['pattern']) <= 80 else x['pattern'][:77] + '...'))
+
+
+if os.environ.get('OA_PATTERN_STATS', '0') == '1':
+    sys.setprofile(_time_matching)
+    threading.setprofile(_time_matching)
+    atexit.register(_print_pattern_stats)
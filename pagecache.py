@@ -0,0 +1,128 @@
+"""Compressed on-disk cache of raw catalog html shared by all the scraper scripts.
+
+Pages are stored once per unique content (objects/<hash>.html.gz) and an index maps each URL to the hash of its latest
+content along with its http validators (ETag/Last-Modified). The cache mode is chosen with the OA_CACHE_MODE
+environment variable:
+
+    off         - Always download, never read or write the cache (the default, except in incremental mode)
+    use         - Serve pages from the cache when present, download and store them otherwise
+    revalidate  - Ask the server whether each cached page has changed (conditional request) and only download if it has
+                  (the default in incremental mode, OA_INCREMENTAL=1, see crawlmanifest.py)
+    offline     - Only serve pages from the cache (replays a frozen crawl without touching the network)
+
+The cache directory defaults to ./page_cache and can be changed with OA_CACHE_DIR. Nothing is ever evicted from it, so
+delete the directory to reclaim its space. Processes can share a cache directory (e.g. the batch workers of a driver), so
+the index is merged with the one on disk whenever it's saved.
+"""
+
+import os
+import gzip
+import json
+import hashlib
+import threading
+import time
+from filelock import locked
+
+modes = ['off', 'use', 'revalidate', 'offline']
+mode = os.environ.get('OA_CACHE_MODE', 'revalidate' if os.environ.get('OA_INCREMENTAL', '0') == '1' else 'off')
+cache_dir = os.environ.get('OA_CACHE_DIR', 'page_cache')
+if mode not in modes:
+    raise Exception('OA_CACHE_MODE must be one of ' + ', '.join(modes))
+
+_lock = threading.Lock()
+_index = None
+
+
+def _indexpath():
+    return os.path.join(cache_dir, 'index.json')
+
+
+def _objectpath(contenthash):
+    return os.path.join(cache_dir, 'objects', contenthash[:2], contenthash + '.html.gz')
+
+
+def _load_index():
+    """Returns the url index, reading it from disk the first time it's needed"""
+    global _index
+    if _index is None:
+        if os.path.isfile(_indexpath()):
+            with open(_indexpath()) as infile:
+                _index = json.load(infile)
+        else:
+            _index = {}
+    return _index
+
+
+def content_hash(sitehtml):
+    """Returns the sha256 hex digest of a page's html"""
+    return hashlib.sha256(sitehtml.encode('utf-8')).hexdigest()
+
+
+def lookup(url):
+    """Returns the index entry for a url (hash, validators, and fetch time) or None if it isn't cached"""
+    with _lock:
+        return _load_index().get(url)
+
+
+def read(url):
+    """Returns the cached html for a url or None if it isn't cached"""
+    entry = lookup(url)
+    if entry is None or not os.path.isfile(_objectpath(entry['hash'])):
+        return None
+    with gzip.open(_objectpath(entry['hash']), 'rt', encoding='utf-8') as infile:
+        return infile.read()
+
+
+def store(url, sitehtml, etag=None, last_modified=None, source='http'):
+    """Saves a page's html to the cache and points the url at it. Returns the content hash."""
+    contenthash = content_hash(sitehtml)
+    path = _objectpath(contenthash)
+    if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temppath = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'  # Batch workers share caches
+        with gzip.open(temppath, 'wt', encoding='utf-8') as outfile:
+            outfile.write(sitehtml)
+        os.replace(temppath, path)
+    with _lock:
+        _load_index()[url] = {'hash': contenthash, 'etag': etag, 'last_modified': last_modified,
+                              'fetched': time.time(), 'source': source}
+    return contenthash
+
+
+def touch(url):
+    """Updates the fetch time of a cached page that was confirmed unchanged by the server"""
+    with _lock:
+        entry = _load_index().get(url)
+        if entry is not None:
+            entry['fetched'] = time.time()
+
+
+def conditional_headers(url):
+    """Returns the http headers that ask the server to only send the page if it changed since it was cached"""
+    entry = lookup(url)
+    headers = {}
+    if entry is None or not os.path.isfile(_objectpath(entry['hash'])):
+        return headers
+    if entry['etag']:
+        headers['If-None-Match'] = entry['etag']
+    if entry['last_modified']:
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+def save_index():
+    """Writes the url index to disk, merged with the entries other processes sharing the cache directory saved since it
+    was read (the newest fetch of each url is kept)"""
+    if _index is None or mode == 'off':
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    temppath = _indexpath() + '.' + str(os.getpid()) + '.tmp'
+    with _lock, locked(_indexpath()):
+        if os.path.isfile(_indexpath()):
+            with open(_indexpath()) as infile:
+                for url, entry in json.load(infile).items():
+                    if url not in _index or entry['fetched'] > _index[url]['fetched']:
+                        _index[url] = entry
+        with open(temppath, 'w') as outfile:
+            json.dump(_index, outfile)
+        os.replace(temppath, _indexpath())
@@ -0,0 +1,187 @@
+"""Downloads catalog pages concurrently over plain http, falling back to Chrome only when a page needs a browser.
+
+CourseLeaf catalogs are rendered on the server, so a plain GET returns the same html that Chrome reports as
+driver.page_source once both are parsed. Pages are downloaded by a bounded pool of threads, each holding a keep-alive
+session, and any page whose static html is missing the content the scraper is looking for (its marker) is rendered in
+Chrome instead. All requests go through a per-host adaptive rate limiter (see ratelimiter.py).
+
+Every page that is downloaded or rendered is saved to the page cache (see pagecache.py), which can also serve pages
+without touching the network.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import codecs
+import re
+import threading
+import requests
+import pagecache
+import ratelimiter
+from browserpool import browser_imap
+from browserpool import load_page
+
+max_workers = 16            # Maximum number of simultaneous http connections
+request_timeout = 30        # Seconds
+probe_size = 5              # Number of pages checked before deciding whether a school needs the browser for everything
+index_interval = 50         # Pages downloaded between saves of the page cache index
+retry_statuses = [429, 500, 502, 503, 504]     # Responses that mean the server is overloaded and should be retried
+user_agent = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/96.0 Safari/537.36'
+
+charset_re = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+meta_charset_re = re.compile(rb'<meta[^>]+charset=["\']?([\w.:-]+)', re.IGNORECASE)
+meta_search_size = 4096     # Bytes at the start of a page that are searched for a <meta> charset
+
+_threadlocal = threading.local()
+
+
+def _session():
+    """Returns the keep-alive http session belonging to the current thread"""
+    if not hasattr(_threadlocal, 'session'):
+        session = requests.Session()
+        session.headers['User-Agent'] = user_agent
+        _threadlocal.session = session
+    return _threadlocal.session
+
+
+def _get(url, headers):
+    """Requests a page, raising an exception for responses that should be retried"""
+    response = _session().get(url, headers=headers, timeout=request_timeout)
+    if response.status_code in retry_statuses:
+        raise requests.HTTPError(str(response.status_code) + ' response from ' + url, response=response)
+    return response
+
+
+def _charset(name):
+    """Returns the name of a charset if Python can decode it (None otherwise)"""
+    try:
+        return codecs.lookup(name).name if name else None
+    except LookupError:
+        return None
+
+
+def decode(response):
+    """Returns the html of a response decoded with the charset of its Content-Type header, its <meta> charset, or the
+    charset guessed from its content (in that order, defaulting to UTF-8).
+
+    requests assumes ISO-8859-1 when the header has no charset, which garbles UTF-8 catalogs (e.g. a non-breaking space
+    becomes 'Â ') so they no longer match the page source that Chrome decodes.
+    """
+    header = charset_re.search(response.headers.get('Content-Type', ''))
+    meta = meta_charset_re.search(response.content[:meta_search_size])
+    encoding = (_charset(header and header.group(1)) or _charset(meta and meta.group(1).decode('ascii')) or
+                _charset(response.apparent_encoding) or 'utf-8')
+    return response.content.decode(encoding, errors='replace')
+
+
+def fetch_static(url):
+    """Returns the html of a page using a plain http request or the page cache (None if the page can't be found)"""
+    if pagecache.mode in ['use', 'offline']:
+        sitehtml = pagecache.read(url)
+        if sitehtml is not None or pagecache.mode == 'offline':
+            return sitehtml
+    headers = pagecache.conditional_headers(url) if pagecache.mode == 'revalidate' else {}
+    try:
+        response = ratelimiter.call(url, lambda x: _get(x, headers))
+    except requests.RequestException:
+        return None
+    if response.status_code == 304:         # Not modified since it was cached
+        pagecache.touch(url)
+        return pagecache.read(url)
+    if response.status_code != 200:
+        return None
+    sitehtml = decode(response)
+    if pagecache.mode != 'off':
+        pagecache.store(url, sitehtml, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+    return sitehtml
+
+
+def _load_and_cache(driver, url, ready_selector):
+    """Loads a page in Chrome and saves its page source to the page cache"""
+    sitehtml = load_page(driver, url, ready_selector)
+    if pagecache.mode != 'off':
+        pagecache.store(url, sitehtml, source='browser')
+    return sitehtml
+
+
+def iter_browser_sources(urls, ready_selector=None):
+    """Yields the page source of each url as soon as it's rendered by the pool of Chrome sessions (see browserpool.py).
+
+    :return: Generator of (position in urls, html, exception) tuples (the exception is None if the page was rendered)
+    """
+    if pagecache.mode == 'offline':
+        for i, url in enumerate(urls):
+            yield i, pagecache.read(url), None
+        return
+    yield from browser_imap(lambda driver, url: _load_and_cache(driver, url, ready_selector), urls)
+
+
+def is_complete(sitehtml, marker):
+    """Checks whether a downloaded page contains the content the scraper is looking for"""
+    return sitehtml is not None and marker in sitehtml
+
+
+def iter_page_sources(urls, marker, ready_selector=None):
+    """Yields the position and html of every url as soon as it's downloaded (see get_page_sources).
+
+    Pages downloaded without a browser are yielded in order while the rest are still downloading, and pages that need
+    the browser are yielded as they're rendered after that. A page that can't be rendered (or, in offline mode, isn't
+    in the page cache) is yielded with the exception instead of its html, so the caller can quarantine it. The page
+    cache index is saved every index_interval pages and when the generator stops, so an interrupted run keeps the
+    pages it cached.
+
+    :param urls: Iterable of page URLs
+    :param marker: Substring that is present in the html of every fully loaded page
+    :param ready_selector: CSS selector of the content Chrome should wait for (e.g. 'div.courseblock')
+    :return: Generator of (position in urls, html, exception) tuples (the html is None if the exception isn't)
+    """
+    urls = list(urls)
+    probe = urls[:probe_size]
+    incomplete = []
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            sources = list(executor.map(fetch_static, probe))
+            if probe and not any(is_complete(x, marker) for x in sources):
+                incomplete = list(range(len(urls)))
+            else:
+                for i, sitehtml in enumerate(chain(sources, executor.map(fetch_static, urls[len(probe):]))):
+                    if is_complete(sitehtml, marker):
+                        yield i, sitehtml, None
+                    else:
+                        incomplete.append(i)        # Re-fetch with the browser
+                    if (i + 1) % index_interval == 0:
+                        pagecache.save_index()
+        for count, (j, sitehtml, error) in enumerate(iter_browser_sources([urls[i] for i in incomplete],
+                                                                          ready_selector)):
+            if sitehtml is None and error is None:
+                error = Exception('The page is missing from the page cache (offline mode)')
+            yield incomplete[j], sitehtml, error
+            if (count + 1) % index_interval == 0:
+                pagecache.save_index()
+    finally:
+        pagecache.save_index()
+
+
+def get_page_sources(urls, marker, ready_selector=None):
+    """Returns a list containing the html of every url (in the same order as urls).
+
+    Pages are downloaded concurrently without a browser. The first few pages are used as a probe: if none of them
+    contain the marker (e.g. 'courseblock' for course description pages) the school's catalog needs javascript, so
+    every page is rendered in Chrome. Otherwise only the individual pages that are missing the marker are re-fetched in
+    Chrome.
+
+    :param urls: Iterable of page URLs
+    :param marker: Substring that is present in the html of every fully loaded page
+    :param ready_selector: CSS selector of the content Chrome should wait for (e.g. 'div.courseblock')
+    :return: List of html strings
+    """
+    urls = list(urls)
+    sources = [None]*len(urls)
+    errors = []
+    for i, sitehtml, error in iter_page_sources(urls, marker, ready_selector):
+        sources[i] = sitehtml
+        if error is not None:
+            errors.append((urls[i], error))
+    if errors:
+        raise Exception(str(len(errors)) + ' pages could not be downloaded (' + errors[0][0] + ': ' +
+                        repr(errors[0][1]) + ')')
+    return sources
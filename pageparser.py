@@ -0,0 +1,75 @@
+"""Parses only the parts of a catalog page that the scrapers use.
+
+BeautifulSoup spends most of its time building an object for every tag and string on a page, while the scrapers only
+look at a few containers (the course blocks, the page content and title, and the named anchors), and catalog pages
+carry large navigation menus and headers around them. These functions build the soup from just the matching elements
+and everything inside them. The parser still reads the whole page, so every element that is kept (and everything in it)
+is exactly the same as in a soup of the whole page. Only the relations above the kept elements differ: their parent is
+the soup itself and their siblings are the other kept elements.
+"""
+
+from bs4 import BeautifulSoup as bs
+from bs4 import SoupStrainer
+
+header_tags = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+
+
+class ElementStrainer(SoupStrainer):
+    """SoupStrainer that keeps the elements that matches(tagname, attrs) is true for.
+
+    The tag's attributes are the raw strings from the parser (the class attribute isn't split yet). Both the parse hook
+    of beautifulsoup4 < 4.13 (search_tag) and of later versions (allow_tag_creation) are implemented.
+    """
+
+    def __init__(self, matches):
+        super().__init__()
+        self.matches = matches
+
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return self.matches(markup_name, markup_attrs or {})
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.matches(name, attrs or {})
+
+    def allow_string_creation(self, string):
+        return False
+
+
+def classes(attrs):
+    """Returns the list of classes in a tag's attributes"""
+    value = attrs.get('class') or ''
+    return value.split() if isinstance(value, str) else list(value)
+
+
+def is_courseblock(name, attrs):
+    """Course description container (script 2)"""
+    return name == 'div' and 'courseblock' in classes(attrs)
+
+
+def is_page_content(name, attrs):
+    """Main page content and the page title (script 3)"""
+    return attrs.get('id') == 'page-title' or \
+        not {'page_content', 'page-title', 'page-header'}.isdisjoint(classes(attrs))
+
+
+def has_fragment_context(name, attrs):
+    """Main page content and every element with a name attribute, such as the anchors that url fragments point to
+    (script 7)"""
+    return is_page_content(name, attrs) or 'name' in attrs
+
+
+def parse_only(sitehtml, matches, features='lxml'):
+    """Returns a soup of just the elements of a page that matches(tagname, attrs) is true for (along with everything
+    inside them).
+
+    :param sitehtml: The page's html
+    :param matches: Function that takes a tag's name and its attribute dictionary
+    :param features: The parser BeautifulSoup uses
+    :return: BeautifulSoup object
+    """
+    return bs(sitehtml, features=features, parse_only=ElementStrainer(matches))
+
+
+def is_kept(soup, tag):
+    """Returns whether a tag's parent and siblings are the same as in the full page (i.e. it's inside a kept element)"""
+    return tag.parent is not None and tag.parent is not soup
@@ -0,0 +1,105 @@
+"""Adaptive per-host rate limiter with retries, exponential backoff, and a circuit breaker.
+
+Every request to a catalog host has to take a token from that host's token bucket. The bucket's refill rate adapts to
+how the server is coping: it climbs steadily while responses are fast and successful, and is cut back when responses
+slow down or fail (additive increase, multiplicative decrease). Failed requests are retried with exponential backoff,
+and a host that keeps failing has its circuit opened: all requests to it pause for a cooldown that doubles every time
+it trips, and the scrape is stopped if the host still isn't responding after max_trips cooldowns.
+"""
+
+import time
+import random
+import threading
+from urllib.parse import urlsplit
+
+initial_rate = 4.0          # Requests per second per host
+min_rate = .5
+max_rate = 32.0
+rate_increase = .5          # Added to the rate after each fast, successful response
+slow_decrease = .75         # Multiplies the rate after each slow response
+error_decrease = .5         # Multiplies the rate after each failed response
+target_latency = 2.0        # Seconds. Responses slower than this mean the server is struggling
+max_retries = 4
+backoff_base = 1.0          # Seconds. Doubles on every retry
+failure_threshold = 5       # Consecutive failures before the circuit opens
+cooldown = 30.0             # Seconds. Doubles every time the circuit opens again without a success in between
+max_trips = 4
+
+_hosts = {}
+_lock = threading.Lock()
+
+
+def _host(url):
+    """Returns the rate limiter state for a url's host"""
+    host = urlsplit(url).netloc
+    if host not in _hosts:
+        _hosts[host] = {'name': host, 'rate': initial_rate, 'tokens': 1.0, 'updated': time.time(), 'failures': 0,
+                        'trips': 0, 'openuntil': 0.0}
+    return _hosts[host]
+
+
+def acquire(url):
+    """Blocks until a request to the url's host is allowed"""
+    while True:
+        with _lock:
+            state = _host(url)
+            now = time.time()
+            if state['trips'] > max_trips:
+                raise Exception(state['name'] + ' is not responding (circuit breaker tripped ' + str(max_trips) +
+                                ' times)')
+            if now < state['openuntil']:
+                wait = state['openuntil'] - now
+            else:
+                burst = max(1.0, state['rate'])
+                state['tokens'] = min(burst, state['tokens'] + (now - state['updated']) * state['rate'])
+                state['updated'] = now
+                if state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    return
+                wait = (1 - state['tokens']) / state['rate']
+        time.sleep(wait)
+
+
+def report(url, latency, success):
+    """Adjusts the url's host request rate based on how long a request took and whether it succeeded"""
+    with _lock:
+        state = _host(url)
+        if success:
+            state['failures'] = 0
+            state['trips'] = 0
+            if latency < target_latency:
+                state['rate'] = min(max_rate, state['rate'] + rate_increase)
+            else:
+                state['rate'] = max(min_rate, state['rate'] * slow_decrease)
+            return
+        state['failures'] += 1
+        state['rate'] = max(min_rate, state['rate'] * error_decrease)
+        if state['failures'] >= failure_threshold:      # Open the circuit
+            state['openuntil'] = time.time() + cooldown * 2**state['trips']
+            state['trips'] += 1
+            state['failures'] = 0
+            state['rate'] = min_rate
+            state['tokens'] = 0.0
+
+
+def call(url, func):
+    """Calls func(url) within the url's host rate limit, retrying failures with exponential backoff.
+
+    :param url: URL being requested
+    :param func: Function that requests the url. It should raise an exception for anything worth retrying (connection
+        errors, timeouts, 429 and 5xx responses)
+    :return: The function's result
+    """
+    for attempt in range(max_retries + 1):
+        acquire(url)
+        start = time.time()
+        try:
+            result = func(url)
+        except Exception:
+            report(url, time.time() - start, False)
+            if attempt == max_retries:
+                raise
+            time.sleep(backoff_base * 2**attempt * random.uniform(.5, 1.5))
+            continue
+        report(url, time.time() - start, True)
+        return result
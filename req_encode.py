@@ -1,4 +1,4 @@
-from listtopattern import listtopattern
+from listtopattern import listtopattern, compiled
 import re
 
 reqcode_pattern = r'_\d\d?\d?(?:-\d\d?\d?)?_[a-z_]+_(?<!__)'
@@ -25,22 +25,21 @@ def req_encode(series):
         raise Exception('Special characters are present in the code column')
 
     # Replace synonyms
-    series = series.str.replace(listtopattern(coursewords), 'courses', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(groupwords), 'groups', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(creditswords), 'credits', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(twowords), 'two', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(fourwords), 'four', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(perwords), 'per', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(fromwords), ' from ', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(labwords), 'labs', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(maxwords), 'max', regex=True, flags=re.IGNORECASE)
-    series = series.str.replace(listtopattern(upperdivwords), 'upperdiv', regex=True, flags=re.IGNORECASE)
+    series = series.str.replace(compiled(listtopattern(coursewords), re.IGNORECASE), 'courses', regex=True)
+    series = series.str.replace(compiled(listtopattern(groupwords), re.IGNORECASE), 'groups', regex=True)
+    series = series.str.replace(compiled(listtopattern(creditswords), re.IGNORECASE), 'credits', regex=True)
+    series = series.str.replace(compiled(listtopattern(twowords), re.IGNORECASE), 'two', regex=True)
+    series = series.str.replace(compiled(listtopattern(fourwords), re.IGNORECASE), 'four', regex=True)
+    series = series.str.replace(compiled(listtopattern(perwords), re.IGNORECASE), 'per', regex=True)
+    series = series.str.replace(compiled(listtopattern(fromwords), re.IGNORECASE), ' from ', regex=True)
+    series = series.str.replace(compiled(listtopattern(labwords), re.IGNORECASE), 'labs', regex=True)
+    series = series.str.replace(compiled(listtopattern(maxwords), re.IGNORECASE), 'max', regex=True)
+    series = series.str.replace(compiled(listtopattern(upperdivwords), re.IGNORECASE), 'upperdiv', regex=True)
 
     # Convert number words to digits
-    numbers = [r'(?i)\bone\b', r'(?i)\btwo\b', r'(?i)\bthree\b', r'(?i)\bfour\b', r'(?i)\bfive\b', r'(?i)\bsix\b',
-               r'(?i)\bseven\b', r'(?i)\beight\b', r'(?i)\bnine\b', r'(?i)\bten\b', r'(?i)\beleven\b',
-               r'(?i)\btwelve\b', r'(?i)\bthirteen\b', r'(?i)\bfourteen\b', r'(?i)\bfifteen\b', r'(?i)\bsixteen\b',
-               r'(?i)\bseventeen\b', r'(?i)\beighteen\b', r'(?i)\bnineteen\b', r'(?i)\btwenty\b', r'(?i)\bthirty\b']
+    numbers = [compiled(r'\b' + x + r'\b', re.IGNORECASE) for x in [
+        'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten', 'eleven', 'twelve', 'thirteen',
+        'fourteen', 'fifteen', 'sixteen', 'seventeen', 'eighteen', 'nineteen', 'twenty', 'thirty']]
     digits = ['1', '2', '3', '4', '5', '6', '7', '8', '9', '10', '11', '12', '13', '14', '15', '16', '17', '18', '19',
               '20', '30']
     series = series.replace(numbers, digits, regex=True)
@@ -49,8 +48,8 @@ def req_encode(series):
 
     # Get rid of course and credit values that merely reference the total number of options in the group
     noncodewords = [r'(of|from) the following', r'the']  # Todo: test to make sure 'the' isn't too general
-    series = series.str.replace(listtopattern(noncodewords) + r' \d\d?\b( (credits|courses|groups))?', '', regex=True,
-                                flags=re.IGNORECASE)
+    series = series.str.replace(compiled(listtopattern(noncodewords) + r' \d\d?\b( (credits|courses|groups))?',
+                                         re.IGNORECASE), '', regex=True)
 
     # Get rid of noun keywords immediately followed by numbers (eg. group 1, lab 4, course 3)
     series = series.str.replace(r'\b(groups|labs|courses) \d\d?:?\b', '', regex=True)
@@ -0,0 +1,294 @@
+"""Parses the requisites of a course into an AND/OR tree and serializes it in script 5's requisite code format.
+
+Script 5 first standardizes the wording of the requisites (e.g. 'Prerequisites:' becomes '_P_requisite' and 'grade of C
+or better in' becomes 'grade_C__'), and then each course's requisites are parsed in one pass:
+
+    tokenize        Splits the requisites into course codes, requisite markers (_P_requisite, _C_requisite and
+                    _B_requisite), grade markers (e.g. grade_C+_), conjunctions (and, or, ???), delimiters (; and ,),
+                    periods, and brackets, keeping the text between them
+    group tree      Each sentence is a group (sentences are joined with 'and'), and so is each pair of brackets
+    splitting       Groups are split into parts where a conjunction is followed by a requisite marker (e.g.
+                    'MATH151 and _C_requisite MATH251' becomes '(MATH151) and (_C_requisite MATH251)'), then each part
+                    is split at semicolons and then at commas, which are deleted
+    filling         Each course code gets the requisite type of the last requisite marker before it in its group or the
+                    groups containing it, and the grade of the first grade marker after it, and the markers are deleted
+    typing          Each group becomes a node of the conjunction between its items: 'and' or 'or' when all its
+                    conjunctions are the same, 'ambiguous' when they're mixed or '???', and 'group' when it has none
+                    (e.g. a single course, or the parts of a comma-separated list that has no conjunction)
+    serializing     Course codes are written as _P_MATH151_C+_ (? for an unknown requisite type or grade) and the
+                    groups as parentheses, e.g. '(_C_MATH251_??_) and (_P_MATH151_C+_ or _P_MATH213_C+_)'
+
+The output is the same as rewriting the whole column of requisites with regexes until the groups stop changing and then
+filling the markers by scanning each requisite forwards and backwards, which is how script 5 used to do it (see
+benchmark_requisiteparser.py), except where the regexes went wrong:
+
+    - A requisite marker directly followed by a course code (e.g. '_P_requisiteMATH151', which filling in implied
+      departments can leave) no longer deletes the first letter of the code
+    - Delimiters that aren't followed by a space (e.g. 'MATH151;CS101') split the group like any other delimiter, and
+      empty parts are dropped, instead of stopping the group from being split any further
+    - Empty groups (e.g. from a period right before a closing bracket) are kept as groups, instead of their opening
+      bracket being paired with a later closing bracket
+    - Unmatched brackets are kept as text, requisites without any sentences (e.g. '..') are emptied, and groups nested
+      more than 9 deep don't raise an IndexError
+
+Tokens are tuples of their kind and text, except course codes, which also hold their requisite type and grade, e.g.
+('code', 'MATH151', 'P', 'C+'). Until they're typed, groups are ('group', list of tokens and groups), and nodes are
+(conjunction, list of tokens and nodes), e.g. ('or', [('code', 'MATH151', 'P', 'C+'), ('text', ' '), ('conjunction',
+'or'), ('text', ' '), ('code', 'MATH213', 'P', 'C+')]). Nodes keep their conjunctions and the text between their
+operands, so the tree serializes to the same requisite code as the groups.
+"""
+
+from listtopattern import compiled
+
+# Conjunctions that split a group when they're followed by a requisite marker (the first splits the group and the
+# second splits each part), and delimiters that split the parts after them (and are deleted)
+marker_conjunctions = ['and', 'or']
+delimiters = [';', ',']
+node_kinds = ['and', 'or', 'ambiguous', 'group']
+
+
+def tokenize(reqs, ccode_pattern):
+    """Splits a course's requisites into tokens (see above).
+
+    :param reqs: The course's requisites (after script 5 standardizes their wording)
+    :param ccode_pattern: Regex pattern of the course codes
+    :return: List of tokens
+    """
+    token_re = compiled(r'(?P<requisite>_[PCB]_requisite)|(?P<grade>grade_[A-D][-+_]_)|(?P<code>' + ccode_pattern +
+                        r')|(?P<conjunction>\b(?:and|or)\b|\?\?\?)|(?P<delimiter>[;,])|(?P<period>\.)|(?P<open>[({])'
+                        r'|(?P<close>[)}])')
+    tokens = []
+    position = 0
+    for match in token_re.finditer(reqs):
+        if match.start() != position:
+            tokens.append(('text', reqs[position:match.start()]))
+        position = match.end()
+        if match.lastgroup == 'code':
+            tokens.append(('code', match.group(), '?', '??'))
+        else:
+            tokens.append((match.lastgroup, match.group()))
+    if position != len(reqs):
+        tokens.append(('text', reqs[position:]))
+    return tokens
+
+
+def _text(text):
+    """Returns a list of the text token of text (empty if there's no text)"""
+    return [('text', text)] if text else []
+
+
+def _sentences(tokens):
+    """Brackets each sentence, joining sentences that follow each other with 'and' (periods that don't end a sentence
+    are kept as text)"""
+    stream = []
+    sentence = []
+    joined = False          # Whether the last token in the stream ends a sentence
+    for token in tokens + [('period', '')]:
+        if token[0] != 'period':
+            sentence.append(token)
+        elif sentence:
+            # A space at the start of a sentence belongs to the period before it (unless it's the whole sentence)
+            if sentence[0][0] == 'text' and sentence[0][1][0] == ' ' and (len(sentence[0][1]) > 1 or len(sentence) > 1):
+                sentence = _text(sentence[0][1][1:]) + sentence[1:]
+            if joined:
+                stream += [('text', ' '), ('conjunction', 'and'), ('text', ' ')]
+            stream += [('open', '(')] + sentence + [('close', ')')]
+            sentence = []
+            joined = True
+        elif token[1]:
+            stream.append(('text', '.'))
+            joined = False
+    return stream
+
+
+def _group_tree(stream):
+    """Nests the tokens between each pair of brackets into a group (unmatched brackets are kept as text)"""
+    stack = [[]]
+    for token in stream:
+        if token[0] == 'open':
+            group = []
+            stack[-1].append(('group', group))
+            stack.append(group)
+        elif token[0] == 'close' and len(stack) > 1:
+            stack.pop()
+        elif token[0] in ['open', 'close']:
+            stack[-1].append(('text', token[1]))
+        else:
+            stack[-1].append(token)
+    while len(stack) > 1:       # Groups that were never closed
+        group = stack.pop()
+        stack[-1][-1:] = [('text', '(')] + group
+    return stack[0]
+
+
+def _split_at_markers(items, conjunction):
+    """Splits the items of a group before each ' <conjunction> _X_requisite', keeping the conjunction and marker at the
+    start of the next part (the first part can't be empty).
+
+    :return: List of the parts (None if the group isn't split)
+    """
+    starts = [i for i in range(1, len(items) - 2) if items[i] == ('conjunction', conjunction) and
+              items[i - 1][0] == 'text' and items[i - 1][1][-1] == ' ' and items[i + 1] == ('text', ' ') and
+              items[i + 2][0] == 'requisite']
+    if starts and starts[0] == 1 and items[0][1] == ' ':
+        starts = starts[1:]
+    if not starts:
+        return None
+    parts = []
+    begin = 0
+    for start in starts:
+        parts.append(items[begin:start - 1] + _text(items[start - 1][1][:-1]))
+        begin = start
+    parts.append(items[begin:])
+    return parts
+
+
+def _split_at_delimiter(items, delimiter):
+    """Splits the items of a group at each delimiter, deleting the delimiters and the space after them (empty parts are
+    dropped).
+
+    :return: List of the parts (None if the group isn't split)
+    """
+    if ('delimiter', delimiter) not in items:
+        return None
+    parts = [[]]
+    afterdelimiter = False
+    for item in items:
+        if item == ('delimiter', delimiter):
+            parts.append([])
+            afterdelimiter = True
+            continue
+        if afterdelimiter and item[0] == 'text' and item[1][0] == ' ':
+            parts[-1] += _text(item[1][1:])
+        else:
+            parts[-1].append(item)
+        afterdelimiter = False
+    return [part for part in parts if part]
+
+
+def _split(items, splitters):
+    """Splits the items of a group with the first splitter that splits them, and each part with the splitters after it.
+
+    :param items: The group's items
+    :param splitters: List of (split function, conjunction or delimiter)
+    :return: The group's new items
+    """
+    for i, (split, separator) in enumerate(splitters):
+        parts = split(items, separator)
+        if parts is not None:
+            return [('group', _split(part, splitters[i + 1:])) for part in parts]
+    return items
+
+
+def _split_groups(items, splitters):
+    """Splits every group inside the items (the innermost first)"""
+    return [('group', _split(_split_groups(item[1], splitters), splitters)) if item[0] == 'group' else item
+            for item in items]
+
+
+def _move_conjunctions(items):
+    """Moves a conjunction that starts a group right after another group to between them (e.g. '(a)(or b)' becomes
+    '(a) or (b)')"""
+    moved = []
+    for item in items:
+        if item[0] == 'group':
+            group = _move_conjunctions(item[1])
+            if moved and moved[-1][0] == 'group' and len(group) > 1 and group[0][0] == 'conjunction' and \
+                    group[1][0] == 'text' and group[1][1][0] == ' ':
+                moved += [('text', ' '), group[0], ('text', ' ')]
+                group = _text(group[1][1][1:]) + group[2:]
+            item = ('group', group)
+        moved.append(item)
+    return moved
+
+
+def _fill_requisites(items, requisite):
+    """Gives each course code the requisite type of the last requisite marker before it in its group or the groups
+    containing it (deleting the markers and the space after them)"""
+    filled = []
+    aftermarker = False
+    for item in items:
+        if item[0] == 'requisite':
+            requisite = item[1][1]
+            aftermarker = True
+            continue
+        if item[0] == 'group':
+            item = ('group', _fill_requisites(item[1], requisite))
+        elif item[0] == 'code':
+            item = ('code', item[1], requisite, item[3])
+        elif item[0] == 'text' and aftermarker and item[1][0] == ' ':
+            aftermarker = False
+            if len(item[1]) == 1:
+                continue
+            item = ('text', item[1][1:])
+        aftermarker = False
+        filled.append(item)
+    return filled
+
+
+def _fill_grades(items, grade):
+    """Gives each course code the grade of the first grade marker after it in its group or the groups containing it
+    (deleting the markers and the space before them)"""
+    filled = []
+    aftermarker = False
+    for item in reversed(items):
+        if item[0] == 'grade':
+            grade = item[1][6:8]
+            aftermarker = True
+            continue
+        if item[0] == 'group':
+            item = ('group', _fill_grades(item[1], grade))
+        elif item[0] == 'code':
+            item = ('code', item[1], item[2], grade)
+        elif item[0] == 'text' and aftermarker and item[1][-1] == ' ':
+            aftermarker = False
+            if len(item[1]) == 1:
+                continue
+            item = ('text', item[1][:-1])
+        aftermarker = False
+        filled.append(item)
+    return filled[::-1]
+
+
+def _conjunction(items):
+    """Returns the kind of node of a group's items (see above)"""
+    conjunctions = set(item[1] for item in items if item[0] == 'conjunction')
+    if not conjunctions:
+        return 'group'
+    if len(conjunctions) == 1 and '???' not in conjunctions:
+        return conjunctions.pop()
+    return 'ambiguous'
+
+
+def _typed(items):
+    """Replaces every group inside the items with a node of its conjunction"""
+    return [(_conjunction(item[1]), _typed(item[1])) if item[0] == 'group' else item for item in items]
+
+
+def parse_requisites(reqs, ccode_pattern):
+    """Parses a course's requisites into an AND/OR tree whose course codes have their requisite types and grades.
+
+    :param reqs: The course's requisites (after script 5 standardizes their wording)
+    :param ccode_pattern: Regex pattern of the course codes
+    :return: The root node, whose items are the sentence nodes and the text between them (sentences are joined with
+        'and')
+    """
+    tree = _group_tree(_sentences(tokenize(reqs, ccode_pattern)))
+    tree = _move_conjunctions(_split_groups(tree, [(_split_at_markers, x) for x in marker_conjunctions]))
+    tree = _move_conjunctions(_split_groups(tree, [(_split_at_delimiter, x) for x in delimiters]))
+    tree = _fill_grades(_fill_requisites(tree, '?'), '??')
+    groups = [i for i, item in enumerate(tree) if item[0] == 'group']
+    tree = tree[groups[0]:groups[-1] + 1] if groups else []
+    return _conjunction(tree), _typed(tree)
+
+
+def serialize(items):
+    """Returns the requisite code of a list of tokens and nodes (e.g. '(_P_MATH151_C+_ or _P_MATH213_C+_)')"""
+    return ''.join('(' + serialize(item[1]) + ')' if item[0] in node_kinds else
+                   '_' + item[2] + '_' + item[1] + '_' + item[3] + '_' if item[0] == 'code' else item[1]
+                   for item in items)
+
+
+def serialize_requisites(reqs, ccode_pattern):
+    """Parses a course's requisites and returns their requisite code (the root node's items, see parse_requisites)"""
+    return serialize(parse_requisites(reqs, ccode_pattern)[1])
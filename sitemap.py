@@ -0,0 +1,70 @@
+"""Discovers catalog pages from the sitemap a catalog publishes instead of crawling its directories.
+
+CourseLeaf catalogs list every page in a sitemap (announced in robots.txt, or at /sitemap.xml). The sitemap is
+downloaded once (following sitemap indexes), and its URLs are matched against the directory structure inferred from a
+school's example URLs, so the pages can be found without visiting every directory page along the way.
+"""
+
+import re
+import html
+from urllib.parse import urlsplit
+from pagefetcher import fetch_static
+
+
+def sitemap_locations(siteurl):
+    """Returns the sitemap URLs announced in a site's robots.txt (or the default /sitemap.xml if there are none)"""
+    parts = urlsplit(siteurl)
+    root = parts.scheme + '://' + parts.netloc
+    robots = fetch_static(root + '/robots.txt') or ''
+    locations = re.findall(r'(?im)^\s*sitemap\s*:\s*(\S+)', robots)
+    return locations or [root + '/sitemap.xml']
+
+
+def get_sitemap_urls(siteurl):
+    """Returns every page URL listed in a site's sitemaps (empty if the site doesn't publish one)"""
+    pending = sitemap_locations(siteurl)
+    visited = set()
+    urls = []
+    while pending:
+        location = pending.pop()
+        if location in visited:
+            continue
+        visited.add(location)
+        sitemapxml = fetch_static(location)
+        if not sitemapxml:
+            continue
+        locs = [html.unescape(x).strip() for x in re.findall(r'<loc>(.*?)</loc>', sitemapxml, re.S)]
+        if '<sitemapindex' in sitemapxml:     # Index of other sitemaps
+            pending += locs
+        else:
+            urls += locs
+    return urls
+
+
+def match_structure(urls, parentdirectories):
+    """Finds the URLs that match the directory structure of a school's example URLs.
+
+    A URL matches if it's of the form parentdirectories[0]/*parentdirectories[1]/*...parentdirectories[-1]/*, where
+    each "*" is a single directory name.
+
+    :param urls: List of URLs (e.g. from get_sitemap_urls)
+    :param parentdirectories: List of the shared directories (the first is a full URL, the rest are paths)
+    :return: Dictionary of each matching URL (in the same format as the example URLs) and its list of directory names
+    """
+    base = urlsplit(parentdirectories[0])
+    basepath = base.path.rstrip('/')
+    pattern = re.escape(basepath)
+    for directory in parentdirectories[1:]:
+        pattern += '/([^/]+)' + re.escape(directory)
+    pattern = re.compile(pattern + '/([^/]+)')
+    matches = {}
+    for url in urls:
+        parts = urlsplit(url)
+        if parts.netloc.lower() != base.netloc.lower():
+            continue
+        path = parts.path.rstrip('/')
+        match = pattern.fullmatch(path)
+        if match:
+            link = parentdirectories[0] + path[len(basepath):]
+            matches.setdefault(link, list(match.groups()))
+    return matches
@@ -0,0 +1,140 @@
+"""Converts degree requirement tables (sc_courselist & sc_plangrid) straight into one long-format dataframe.
+
+Each table is walked once with lxml: the text of every row's cells is read and appended to flat column lists (code,
+title, coregroup, credits, headerflag, the table-wide info, and the html and class of each row), instead of converting
+every table to its own dataframe with pd.read_html and broadcasting the table-wide info into each of them.
+
+The cells' text is read the way pd.read_html reads it (colspans and rowspans are copied into the cells they cover,
+whitespace is collapsed, and hidden elements are skipped), but every cell is kept as plain text: no column types are
+inferred, so e.g. a credits cell of '3' stays '3'. Every table starts with its header row(s) (marked with headerflag).
+Tables without a header row get one of column numbers, which has no html.
+"""
+
+import re
+import unicodedata
+import pandas as pd
+from lxml.html import HTMLParser, fromstring, tostring
+
+whitespace_re = re.compile(r'[\r\n]+|\s{2,}')
+columnnames = ['code', 'title', 'coregroup', 'credits', 'headerflag']
+
+_parser = HTMLParser(recover=True)
+
+
+def clean_text(value):
+    """Removes unicode junk from a table cell"""
+    return unicodedata.normalize('NFKC', str(value).strip(' \n')).encode('ascii', 'ignore').decode('utf-8')
+
+
+def _is_hidden(element):
+    return 'display:none' in element.get('style', '').replace(' ', '')
+
+
+def _cell_text(cell):
+    return whitespace_re.sub(' ', cell.text_content()).strip()
+
+
+def _row_class(row):
+    """Returns the first class name in a row's html (NaN if it has none)"""
+    classed = row.xpath('(descendant-or-self::*[@class])[1]')
+    return classed[0].get('class').split(' ')[0] if classed else float('nan')
+
+
+def _read_rows(rows):
+    """Returns the cells' text, html, and class of each displayed row, with colspans and rowspans copied into the cells
+    they cover"""
+    readrows = []
+    remainder = []      # (column, text, rows left) of cells spanning down from previous rows
+    for row in rows:
+        if _is_hidden(row):
+            continue
+        html = tostring(row, encoding='unicode', with_tail=False).strip()
+        rowclass = _row_class(row)
+        for hidden in row.xpath('.//*[@style]'):
+            if _is_hidden(hidden) and hidden.getparent() is not None:
+                hidden.drop_tree()
+        for br in row.xpath('.//br'):
+            br.tail = '\n' + (br.tail or '')
+        rowtexts = []
+        nextremainder = []
+        index = 0
+        for cell in row.xpath('./td|./th'):
+            while remainder and remainder[0][0] <= index:
+                previ, prevtext, prevrowspan = remainder.pop(0)
+                rowtexts.append(prevtext)
+                if prevrowspan > 1:
+                    nextremainder.append((previ, prevtext, prevrowspan - 1))
+                index += 1
+            text = _cell_text(cell)
+            rowspan = int(cell.get('rowspan') or 1)
+            colspan = int(cell.get('colspan') or 1)
+            for _ in range(colspan):
+                rowtexts.append(text)
+                if rowspan > 1:
+                    nextremainder.append((index, text, rowspan - 1))
+                index += 1
+        for previ, prevtext, prevrowspan in remainder:
+            rowtexts.append(prevtext)
+            if prevrowspan > 1:
+                nextremainder.append((previ, prevtext, prevrowspan - 1))
+        readrows.append((rowtexts, html, rowclass))
+        remainder = nextremainder
+    return readrows
+
+
+def table_rows(tablehtml):
+    """Returns the rows of a table as lists of code, title, coregroup, credits, headerflag, html, and rowclass (header
+    row(s) first)"""
+    doc = fromstring(tablehtml, parser=_parser)
+    table = doc if doc.tag == 'table' else doc.find('.//table')
+    if table is None or _is_hidden(table):
+        return []
+
+    # Split rows into header and body (footer rows go last), like pd.read_html
+    headerrows = table.xpath('./thead/tr')
+    bodyrows = table.xpath('./tr|./tbody/tr')
+    if not headerrows:      # Rows of only <th> cells at the top are the header
+        while bodyrows and all(x.tag == 'th' for x in bodyrows[0].xpath('./td|./th')):
+            headerrows.append(bodyrows.pop(0))
+    # Rowspans don't cross between the header, body, and footer, like in pd.read_html
+    header = _read_rows(headerrows)
+    if len(header) > 1:     # Header rows without any text aren't part of the column names
+        header = [x for x in header if any(x[0])]
+    body = _read_rows(bodyrows) + _read_rows(table.xpath('./tfoot/tr'))
+    if not header and not body:
+        return []
+    width = max(len(texts) for texts, _, _ in header + body)
+    if width not in [3, 4]:
+        raise ValueError('Table has ' + str(width) + ' columns instead of code, title, (coregroup,) and credits')
+    if not header:      # Tables without a header row get one of column numbers
+        header = [([str(i) for i in range(width)], '', float('nan'))]
+
+    rows = [texts + [''] * (width - len(texts)) + [True, html, rowclass] for texts, html, rowclass in header]
+    rows += [[clean_text(x) for x in texts] + [''] * (width - len(texts)) + [False, html, rowclass]
+             for texts, html, rowclass in body]
+    if width == 3:      # 'coregroup' is an optional column sometimes present in course tables
+        for row in rows:
+            row.insert(2, '')
+    return rows
+
+
+def extract_tables(tablehtmls, tablefields):
+    """Converts html tables into one dataframe with a row for each table row (including each table's header row).
+
+    :param tablehtmls: List of the html of each table
+    :param tablefields: Dictionary of column names and lists with a value for each table, which is copied to every row
+        of the table (e.g. {'id': [0, 1, 2]})
+    :return: Dataframe with the columns code, title, coregroup, credits, headerflag, the table-wide columns, html
+        (html of each row) and rowclass, indexed by the row number within each table
+    """
+    rowcolumns = columnnames + ['html', 'rowclass']
+    columns = {name: [] for name in rowcolumns + list(tablefields)}
+    index = []
+    for tablei, tablehtml in enumerate(tablehtmls):
+        rows = table_rows(tablehtml)
+        for name, values in zip(rowcolumns, zip(*rows)):
+            columns[name] += values
+        for name, values in tablefields.items():
+            columns[name] += [values[tablei]] * len(rows)
+        index += range(len(rows))
+    return pd.DataFrame(columns, index=index)